@@ -9,17 +9,194 @@ SCOPE = 'user-read-private playlist-read-private playlist-read-collaborative pla
 
 load_dotenv()
 
+def init_redis(app, redis_client):
+    '''Share the feature cache, cover computations, and login sessions of every worker through Redis.'''
+    from app.utils.shared_cache import RedisFeatureCache, TieredFeatureCache, SingleFlight
+    from app.api.tokens import TokenStore
+    from app.routes.auth import refresh_access_token
+
+    prefix = app.config['REDIS_PREFIX']
+    local_cache = app.extensions['feature_cache']
+    app.extensions['redis'] = redis_client
+
+    shared_cache = RedisFeatureCache(
+        redis_client, version=local_cache.version, prefix=prefix, ttl=app.config['REDIS_FEATURE_TTL']
+    )
+    app.extensions['feature_cache'] = TieredFeatureCache(local_cache, shared_cache)
+    app.extensions['metrics'].watch_cache('feature', app.extensions['feature_cache'])
+    app.extensions['metrics'].watch_cache('shared_feature', shared_cache)
+
+    # Locks are per feature version, like the cached vectors they guard
+    app.extensions['single_flight'] = SingleFlight(
+        redis_client, prefix=f'{prefix}:features:{local_cache.version}', timeout=app.config['SINGLE_FLIGHT_TIMEOUT']
+    )
+
+    app.extensions['token_store'] = TokenStore(
+        redis_client, refresh=refresh_access_token, prefix=prefix, ttl=app.config['SESSION_TTL'],
+        single_flight=SingleFlight(redis_client, prefix=f'{prefix}:refresh', timeout=10)
+    )
+
 def create_app():
     app = Flask(__name__)
 
+    from app.utils.feature_cache import FeatureCache, feature_version
+    from app.utils.jobs import JobManager
+    from app.utils.sort_state import SortStateStore
+    from app.utils.metrics import AppMetrics
+    from app.utils.extraction import FeatureExtractor
+    from app.utils.prefetch import Prefetcher
+    from app.api import client
+    from app.api.cache import ResponseCache
+
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
     app.config['CLIENT_ID'] = os.getenv('CLIENT_ID')
     app.config['CLIENT_SECRET'] = os.getenv('CLIENT_SECRET')
 
+    # Base URL of the Spotify Web API and URL of the token endpoint, e.g. pointed at a local stand-in for benchmarking
+    app.config['SPOTIFY_API_URL'] = os.getenv('SPOTIFY_API_URL', 'https://api.spotify.com/v1')
+    app.config['SPOTIFY_TOKEN_URL'] = os.getenv('SPOTIFY_TOKEN_URL', 'https://accounts.spotify.com/api/token')
+
+    # Sort stage timings, Spotify API latency, throttling, and cache effectiveness, served on '/metrics'
+    metrics = AppMetrics()
+    app.extensions['metrics'] = metrics
+
+    # Shared HTTP client: keep-alive connections per host, and an adaptive per-host rate limit in requests/second
+    app.config['HTTP_POOL_SIZE'] = int(os.getenv('HTTP_POOL_SIZE', 16))
+    app.config['HTTP_RATE_LIMIT'] = float(os.getenv('HTTP_RATE_LIMIT', 20))
+    app.config['HTTP_IMAGE_RATE_LIMIT'] = float(os.getenv('HTTP_IMAGE_RATE_LIMIT', 100))
+    app.config['HTTP_MAX_RETRIES'] = int(os.getenv('HTTP_MAX_RETRIES', 3))
+
+    client.init_app(
+        app,
+        pool_size=app.config['HTTP_POOL_SIZE'],
+        rate=app.config['HTTP_RATE_LIMIT'],
+        burst=int(app.config['HTTP_RATE_LIMIT']),
+        host_rates={'i.scdn.co': app.config['HTTP_IMAGE_RATE_LIMIT']},
+        max_retries=app.config['HTTP_MAX_RETRIES'],
+        metrics=metrics
+    )
+
+    # Cache of Spotify profile and playlist listing responses, per user, revalidated after RESPONSE_CACHE_TTL seconds
+    app.config['RESPONSE_CACHE_TTL'] = float(os.getenv('RESPONSE_CACHE_TTL', 300))
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2000))
+    app.extensions['response_cache'] = ResponseCache(
+        ttl=app.config['RESPONSE_CACHE_TTL'],
+        max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES']
+    )
+    metrics.watch_cache('response', app.extensions['response_cache'])
+
+    # Maximum number of pages of a playlist (or playlist listing) requested concurrently
+    app.config['API_PAGE_WORKERS'] = int(os.getenv('API_PAGE_WORKERS', 4))
+
+    # Maximum number of album covers downloaded concurrently per sort
+    app.config['DOWNLOAD_WORKERS'] = int(os.getenv('DOWNLOAD_WORKERS', 8))
+
+    # Streaming pipeline from playlist pages to color vectors: at most PIPELINE_QUEUE_SIZE cover URLs and as many
+    # downloaded covers wait between its stages, and covers are extracted in batches of up to PIPELINE_BATCH_SIZE
+    app.config['PIPELINE_QUEUE_SIZE'] = int(os.getenv('PIPELINE_QUEUE_SIZE', 64))
+    app.config['PIPELINE_BATCH_SIZE'] = int(os.getenv('PIPELINE_BATCH_SIZE', 32))
+
+    # Smallest album cover variant (in pixels per side) downloaded for color extraction
+    app.config['IMAGE_MIN_SIZE'] = int(os.getenv('IMAGE_MIN_SIZE', 300))
+
+    # Settings for the color vector of each album cover. Changing them invalidates the feature cache
+    app.config['PALETTE_SIZE'] = int(os.getenv('PALETTE_SIZE', 16))
+    app.config['TOP_COLORS'] = int(os.getenv('TOP_COLORS', 3))
+
+    # How the dominant colors of each cover are found: 'adaptive' (Pillow's adaptive palette), or the faster
+    # NumPy 'histogram' and 'kmeans' engines (see app/utils/image_processing.py and benchmarks/color_engines.py)
+    app.config['COLOR_ENGINE'] = os.getenv('COLOR_ENGINE', 'adaptive')
+
+    # Worker processes for decoding album covers and extracting their colors, which is CPU-bound.
+    # 0 extracts in the sorting thread, as do sorts with fewer than FEATURE_PROCESS_MIN_COVERS covers to process
+    app.config['FEATURE_PROCESS_WORKERS'] = int(os.getenv('FEATURE_PROCESS_WORKERS', 0))
+    app.config['FEATURE_PROCESS_MIN_COVERS'] = int(os.getenv('FEATURE_PROCESS_MIN_COVERS', 64))
+    app.extensions['feature_extractor'] = FeatureExtractor(
+        max_workers=app.config['FEATURE_PROCESS_WORKERS'],
+        min_covers=app.config['FEATURE_PROCESS_MIN_COVERS']
+    )
+
+    # Default ordering strategy (see app/utils/ordering.py) and the wall-clock budget in seconds for path refinement
+    app.config['SORT_STRATEGY'] = os.getenv('SORT_STRATEGY', 'reference')
+    app.config['SORT_TIME_BUDGET'] = float(os.getenv('SORT_TIME_BUDGET', 2.0))
+
+    # How sorted playlists are written back: 'reorder' moves tracks in place with as few requests as possible,
+    # 'replace' clears the playlist and adds every track back in chunks of 100. Playlists with local files or
+    # repeated tracks are always reordered, since replacing them would drop those entries
+    app.config['WRITE_BACK_MODE'] = os.getenv('WRITE_BACK_MODE', 'reorder')
+
+    # Playlists needing more reorder requests than REORDER_MOVE_FACTOR times the requests of replacing them
+    # (one to clear it, plus one per 100 tracks), or more than REORDER_MAX_MOVES at most, are replaced instead
+    # (e.g. the first sort of a shuffled playlist), unless they have local files or repeated tracks
+    app.config['REORDER_MOVE_FACTOR'] = float(os.getenv('REORDER_MOVE_FACTOR', 3))
+    app.config['REORDER_MAX_MOVES'] = int(os.getenv('REORDER_MAX_MOVES', 500))
+
+    # Persistent cache of album cover URL -> color vector, shared by every sort
+    app.config['FEATURE_CACHE_PATH'] = os.getenv('FEATURE_CACHE_PATH', os.path.join(app.instance_path, 'feature_cache.sqlite3'))
+    app.config['FEATURE_CACHE_MAX_ENTRIES'] = int(os.getenv('FEATURE_CACHE_MAX_ENTRIES', 50000))
+
+    app.extensions['feature_cache'] = FeatureCache(
+        path=app.config['FEATURE_CACHE_PATH'],
+        max_entries=app.config['FEATURE_CACHE_MAX_ENTRIES'],
+        version=feature_version(app.config['PALETTE_SIZE'], app.config['TOP_COLORS'], app.config['COLOR_ENGINE'])
+    )
+    metrics.watch_cache('feature', app.extensions['feature_cache'])
+
+    # Last sorted order of each playlist, so that re-sorting after a few tracks were added or removed only
+    # processes those tracks, as long as they make up at most INCREMENTAL_MAX_CHANGE of the playlist
+    app.config['SORT_STATE_DIR'] = os.getenv('SORT_STATE_DIR', os.path.join(app.instance_path, 'sort_state'))
+    app.config['INCREMENTAL_MAX_CHANGE'] = float(os.getenv('INCREMENTAL_MAX_CHANGE', 0.25))
+    app.extensions['sort_state'] = SortStateStore(app.config['SORT_STATE_DIR'])
+
+    # Maximum number of sorts running at once. Further sorts wait in the queue for a free worker
+    app.config['SORT_JOB_WORKERS'] = int(os.getenv('SORT_JOB_WORKERS', 2))
+    app.extensions['sort_jobs'] = JobManager(app, max_workers=app.config['SORT_JOB_WORKERS'])
+
+    # Sort previews waiting to be committed, keyed by playlist snapshot and strategy. Each holds the sorted order and
+    # feature matrix of a playlist (about 400 KB for 10k tracks), kept for PREVIEW_CACHE_TTL seconds
+    app.config['PREVIEW_CACHE_TTL'] = int(os.getenv('PREVIEW_CACHE_TTL', 1800))
+    app.config['PREVIEW_CACHE_MAX_ENTRIES'] = int(os.getenv('PREVIEW_CACHE_MAX_ENTRIES', 100))
+    app.extensions['sort_previews'] = ResponseCache(
+        ttl=app.config['PREVIEW_CACHE_TTL'],
+        max_entries=app.config['PREVIEW_CACHE_MAX_ENTRIES']
+    )
+    metrics.watch_cache('preview', app.extensions['sort_previews'])
+
+    # Speculative warm-up of the feature cache when '/sorter' loads: the covers of up to PREFETCH_PLAYLISTS playlists
+    # are processed in the background while no sort is running, up to PREFETCH_COVER_BUDGET covers per user every
+    # PREFETCH_WINDOW seconds. 0 turns warm-up off
+    app.config['PREFETCH_COVER_BUDGET'] = int(os.getenv('PREFETCH_COVER_BUDGET', 0))
+    app.config['PREFETCH_WINDOW'] = int(os.getenv('PREFETCH_WINDOW', 3600))
+    app.config['PREFETCH_PLAYLISTS'] = int(os.getenv('PREFETCH_PLAYLISTS', 3))
+
+    if app.config['PREFETCH_COVER_BUDGET'] > 0:
+        app.extensions['prefetcher'] = Prefetcher(
+            app, app.extensions['sort_jobs'],
+            cover_budget=app.config['PREFETCH_COVER_BUDGET'],
+            window=app.config['PREFETCH_WINDOW'],
+            max_playlists=app.config['PREFETCH_PLAYLISTS'],
+            batch_size=app.config['PIPELINE_BATCH_SIZE']
+        )
+
+    # Optional Redis tier shared by every worker and host: album cover features (kept for REDIS_FEATURE_TTL seconds,
+    # 0 = until evicted by Redis), single-flight locks so concurrent sorts compute each cover once (waiting up to
+    # SINGLE_FLIGHT_TIMEOUT seconds for another worker), and login sessions with refresh tokens (SESSION_TTL seconds)
+    app.config['REDIS_URL'] = os.getenv('REDIS_URL')
+    app.config['REDIS_PREFIX'] = os.getenv('REDIS_PREFIX', 'color_sorter')
+    app.config['REDIS_FEATURE_TTL'] = int(os.getenv('REDIS_FEATURE_TTL', 30 * 24 * 3600))
+    app.config['SINGLE_FLIGHT_TIMEOUT'] = float(os.getenv('SINGLE_FLIGHT_TIMEOUT', 30))
+    app.config['SESSION_TTL'] = int(os.getenv('SESSION_TTL', 30 * 24 * 3600))
+
+    if app.config['REDIS_URL']:
+        import redis
+        init_redis(app, redis.Redis.from_url(app.config['REDIS_URL']))
+
     from app.routes.auth import auth_bp
     from app.routes.sorting import sorting_bp
+    from app.routes.metrics import metrics_bp
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(sorting_bp)
+    app.register_blueprint(metrics_bp)
 
     return app
\ No newline at end of file
@@ -0,0 +1,90 @@
+'''
+Module: api
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides an in-memory cache of Spotify API responses, so that page loads and repeated sorts do not
+crawl the same profile, playlist listing, and playlist tracks again. Entries are keyed by tuples that start with
+the kind of response and the user's access token, e.g. ('playlists', access_token), and carry the ETag Spotify
+sent with them, so that stale entries can be revalidated with a conditional request instead of refetched.
+
+Classes:
+- CacheEntry(value, etag, expires_at): a cached response body along with its ETag and expiry time
+
+- ResponseCache(ttl, max_entries): a thread-safe, size-capped LRU cache with a default time-to-live in seconds.
+Lookups finding a fresh entry are counted in 'hits', and lookups finding a stale entry or none in 'misses'
+    - get(key): returns the CacheEntry for the key (fresh or stale), or None if there is none
+    - set(key, value, etag, ttl): stores a value, expiring after 'ttl' seconds (default ttl, None = never)
+    - touch(key, ttl): marks an entry fresh again, e.g. after Spotify answered a conditional request with 304
+    - invalidate(*prefix): removes every entry whose key starts with the given prefix
+'''
+
+import time
+import threading
+
+from collections import OrderedDict
+
+# Stands in for "use the cache's default TTL", since None already means "never expires"
+DEFAULT_TTL = object()
+
+class CacheEntry:
+    def __init__(self, value, etag=None, expires_at=None):
+        self.value = value
+        self.etag = etag
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return self.expires_at is None or time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    def __init__(self, ttl=300, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expires_at(self, ttl):
+        return None if ttl is None else time.monotonic() + ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+            if entry is not None and entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+            return entry
+
+    def set(self, key, value, etag=None, ttl=DEFAULT_TTL):
+        ttl = self.ttl if ttl is DEFAULT_TTL else ttl
+
+        with self._lock:
+            self._entries[key] = CacheEntry(value, etag, self._expires_at(ttl))
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key, ttl=DEFAULT_TTL):
+        ttl = self.ttl if ttl is DEFAULT_TTL else ttl
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.expires_at = self._expires_at(ttl)
+
+    def invalidate(self, *prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key[:len(prefix)] == prefix]:
+                del self._entries[key]
@@ -0,0 +1,229 @@
+'''
+Module: api
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the shared HTTP client that every request to Spotify (and its image CDN) goes through.
+Each app has its own client in app.extensions['http_client'], with its own rate limits and metrics, and requests
+made outside of any app (e.g. by scripts) go through a default client.
+Connections are pooled per host and kept alive between requests, so a sort no longer pays a fresh TCP and TLS
+handshake per call. Each host also gets its own token-bucket rate limiter, which slows down when Spotify answers
+with 429 or 5xx responses, waits out any Retry-After header, and speeds back up as requests succeed.
+Throttled and failed requests are retried with jittered exponential backoff. Only requests that are safe to send twice
+are retried automatically: reads, and any request answered with 429 and a Retry-After header, which Spotify has not
+applied. A write that timed out or failed with 5xx may already have been applied, so it is only retried if the caller
+opts in with retry=True because sending it twice has the same effect as sending it once (e.g. replacing a playlist).
+
+Functions:
+- init_app(app, **kwargs): creates the app's client from the given settings (see HttpClient) and stores it in
+app.extensions['http_client']
+
+- get_client(): returns the client of the current app, or the default client outside of any app
+
+- bind_context(func): returns func wrapped to run in a copy of the caller's context, so that worker threads started
+during a request or job see its app, and send their requests through its client
+
+- request(method, url, retry, **kwargs), get(url, **kwargs), put(url, **kwargs), post(url, **kwargs): send a request
+through get_client(). They take the same arguments as their counterparts in the requests library, plus 'retry'
+
+Classes:
+- TokenBucket(rate, burst, min_rate): an adaptive rate limiter allowing 'rate' requests per second on average,
+with bursts of up to 'burst' requests
+    - acquire(): blocks until a request is allowed to go out
+    - on_success(): additively raises the rate back towards its configured maximum
+    - on_throttle(retry_after): halves the rate (down to 'min_rate') and pauses the bucket for 'retry_after' seconds
+
+- HttpClient(pool_size, rate, burst, host_rates, max_retries, backoff, timeout, metrics): the pooled, rate limited client
+    - request(method, url, retry, **kwargs): sends the request, retrying on 429, 5xx, and connection errors if
+    'retry' is True (by default, only for the methods in IDEMPOTENT_METHODS). A 429 with a Retry-After header is
+    retried whatever 'retry' is. If 'metrics' is passed (see utils/metrics.py), every response and retry is recorded on it
+'''
+
+import time
+import random
+import threading
+import contextvars
+import urllib.parse
+
+import requests
+
+from flask import current_app, has_app_context
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying: rate limited, and server errors that are usually transient
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Methods retried by default, since sending them twice cannot change anything
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+class TokenBucket:
+    def __init__(self, rate=20.0, burst=20, min_rate=1.0):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                # Wait until the bucket is unpaused and has refilled at least one token
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+
+
+def parse_retry_after(response):
+    # Spotify sends Retry-After as a number of seconds
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    def __init__(self, pool_size=16, rate=20.0, burst=20, host_rates=None, max_retries=3, backoff=0.5, timeout=10,
+                 metrics=None):
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates or {}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.metrics = metrics
+
+        # The adapter keeps a pool of up to pool_size keep-alive connections for each host
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+
+        with self._lock:
+            if host not in self._limiters:
+                rate = self.host_rates.get(host, self.rate)
+                self._limiters[host] = TokenBucket(rate=rate, burst=max(self.burst, int(rate)))
+
+            return self._limiters[host]
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        # Full jitter keeps concurrent workers that were throttled together from retrying in lockstep
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        return max(delay, retry_after or 0)
+
+    def request(self, method, url, retry=None, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        limiter = self.limiter_for(url)
+
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            limiter.acquire()
+
+            try:
+                start = time.perf_counter()
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # The request may have reached Spotify before the connection failed
+                if not retry or attempt >= self.max_retries:
+                    raise
+
+                limiter.on_throttle()
+                delay = self._backoff_delay(attempt)
+                print(f'{method} {url} failed ({e}), retrying in {delay:.2f}s')
+
+                if self.metrics is not None:
+                    self.metrics.observe_retry(method, url, reason=type(e).__name__)
+            else:
+                if self.metrics is not None:
+                    self.metrics.observe_response(method, url, response, time.perf_counter() - start)
+
+                if response.status_code not in RETRY_STATUS_CODES:
+                    limiter.on_success()
+                    return response
+
+                retry_after = parse_retry_after(response)
+                limiter.on_throttle(retry_after)
+
+                # A 429 with Retry-After was refused without being applied, so any method can be sent again
+                retryable = retry or (response.status_code == 429 and retry_after is not None)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+
+                delay = self._backoff_delay(attempt, retry_after)
+                print(f'{method} {url} returned {response.status_code}, retrying in {delay:.2f}s')
+
+                if self.metrics is not None:
+                    self.metrics.observe_retry(method, url, reason=str(response.status_code))
+
+            time.sleep(delay)
+            attempt += 1
+
+
+_default_client = HttpClient()
+
+def init_app(app, **kwargs):
+    app.extensions['http_client'] = HttpClient(**kwargs)
+    return app.extensions['http_client']
+
+def get_client():
+    if has_app_context():
+        return current_app.extensions.get('http_client', _default_client)
+
+    return _default_client
+
+def bind_context(func):
+    context = contextvars.copy_context()
+
+    # A context can only be entered by one thread at a time, so every call runs in its own copy
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
+
+def request(method, url, retry=None, **kwargs):
+    return get_client().request(method, url, retry=retry, **kwargs)
+
+def get(url, **kwargs):
+    return get_client().request('GET', url, **kwargs)
+
+def put(url, **kwargs):
+    return get_client().request('PUT', url, **kwargs)
+
+def post(url, **kwargs):
+    return get_client().request('POST', url, **kwargs)
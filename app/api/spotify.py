@@ -10,24 +10,93 @@ It includes functions to authenticate, fetch user data, playlists, and tracks.
 Functions:
 - get_auth_url(): returns the URL to the Spotify OAuth login page for use in redirecting users on app start
 
+- api_url(path): returns the full URL of a Web API endpoint, e.g. api_url('/me'), under the SPOTIFY_API_URL
+the app is configured with (the real Spotify Web API unless pointed at a stand-in, e.g. by the benchmarks)
+
+- token_url(): returns the URL of Spotify's token endpoint, under the SPOTIFY_TOKEN_URL the app is configured with
+
 - get_user_info(access_token): returns the profile information of the current logged-in user after authenticating
     https://developer.spotify.com/documentation/web-api/reference/get-current-users-profile
     
-- get_owned_playlists(access_token): returns a dict of playlists owned by the user that have at least 1 track in them
+- get_json(url, headers, params, cache, cache_key): returns the status code and JSON body of a GET request, or the
+status code and None if it did not succeed.
+If a cache and key are passed, fresh cached bodies are returned without a request, and stale ones are revalidated
+with a conditional request (If-None-Match) so that an unchanged response is not downloaded again
+
+- iter_pages(url, headers, page_size, params, cache_key): yields every page of a paginated listing in order, fetching
+the first page to learn the total and then every remaining offset concurrently. Pages are cached under 'cache_key'.
+Raises IncompleteListingError if a page cannot be retrieved, so a listing never silently ends early
+
+- get_pages(url, headers, page_size, params, cache_key): returns the list of every page yielded by iter_pages()
+
+- get_owned_playlists(access_token, user_info): returns a dict of playlists owned by the user that have at least 1 track
+in them, along with their snapshot IDs. The result is cached per user for RESPONSE_CACHE_TTL seconds. If a page of
+playlists cannot be retrieved, the playlists listed before it are returned without being cached
     https://developer.spotify.com/documentation/web-api/reference/get-a-list-of-current-users-playlists
+
+- pick_image_url(images, min_size): returns the URL of the smallest image variant at least 'min_size' pixels
+on each side, out of the variants Spotify returns for an album (usually 640px, 300px, and 64px)
+
+- get_playlist_tracks(access_token, playlist_id, min_image_size, snapshot_id): returns a list of (track_id, album cover URL)
+for every position in the playlist, in order, using the smallest cover variant adequate for color extraction.
+Positions without a Spotify track (e.g. local files) have a track_id of None. Only the fields that are used are requested.
+If the playlist's snapshot ID is passed, the listing of that exact version is cached.
+Raises IncompleteListingError if any page of the playlist cannot be retrieved
+    https://developer.spotify.com/documentation/web-api/reference/get-playlists-tracks
+
+- iter_playlist_tracks(access_token, playlist_id, min_image_size, snapshot_id): yields the (track_id, album cover URL)
+entries of get_playlist_tracks() one page at a time, as each page arrives, so that the tracks on the first pages can
+be processed while later pages are still loading. A cached listing is yielded as a single page. A page that cannot be
+retrieved raises IncompleteListingError, and the pages yielded before it are not cached
+
+- build_track_info(playlist_tracks): returns a dict of track_id -> album cover URL for every distinct track
+in the list returned by get_playlist_tracks(), in playlist order
+
+- get_track_info(access_token, playlist_id, min_image_size, snapshot_id): returns build_track_info() of the playlist's tracks
+
+- invalidate_playlist(access_token, playlist_id): drops the cached playlist listings and tracks of the playlist,
+so that the next page load and sort see the order a sort just wrote back
+
+- get_playlist_snapshot_id(access_token, playlist_id): returns the current snapshot ID (version) of the playlist
+    https://developer.spotify.com/documentation/web-api/reference/get-playlist
+
+- reorder_playlist_tracks(access_token, playlist_id, range_start, insert_before, range_length, snapshot_id):
+moves the 'range_length' tracks starting at 'range_start' to before position 'insert_before', returning the response
+    https://developer.spotify.com/documentation/web-api/reference/reorder-or-replace-playlists-tracks
+
+Classes:
+- IncompleteListingError: raised when a page of a paginated listing cannot be retrieved. A partial playlist must never
+be sorted and written back, since writing it back would drop every track that was not listed
 ''' 
 
-import requests
 import urllib.parse
 
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app
 from app import REDIRECT_URI, SCOPE
+from . import client
 
 # Spotify API endpoints
 SPOTIFY_AUTH_URL = 'https://accounts.spotify.com/authorize'
 AUTH_TOKEN_URL = 'https://accounts.spotify.com/api/token'
-USER_INFO_URL = 'https://api.spotify.com/v1/me'
-USER_PLAYLISTS_URL = 'https://api.spotify.com/v1/me/playlists'
+SPOTIFY_API_URL = 'https://api.spotify.com/v1'
+
+# Largest page sizes Spotify allows for each listing endpoint
+PLAYLISTS_PAGE_SIZE = 50
+TRACKS_PAGE_SIZE = 100
+
+# Only the parts of each playlist item that sorting uses: the track ID and its album cover variants
+TRACK_FIELDS = 'total,items(track(id,album(images)))'
+
+# Maximum number of pages of a listing fetched concurrently
+DEFAULT_PAGE_WORKERS = 4
+
+# Album covers are thumbnailed to 300x300 for color extraction, so anything larger is wasted bandwidth
+DEFAULT_MIN_IMAGE_SIZE = 300
+
+class IncompleteListingError(Exception):
+    pass
+
 
 def get_auth_url():
     CLIENT_ID = current_app.config['CLIENT_ID']
@@ -43,20 +112,99 @@ def get_auth_url():
     return auth_url
 
 
+def api_url(path):
+    return current_app.config.get('SPOTIFY_API_URL', SPOTIFY_API_URL).rstrip('/') + path
+
+
+def token_url():
+    return current_app.config.get('SPOTIFY_TOKEN_URL', AUTH_TOKEN_URL)
+
+
+def get_response_cache():
+    return current_app.extensions.get('response_cache')
+
+
+def get_json(url, headers, params=None, cache=None, cache_key=None):
+    # Fresh cached responses are served without a request. Stale ones are revalidated with their ETag,
+    # and if Spotify answers 304 Not Modified the cached body is reused instead of downloaded again
+    entry = cache.get(cache_key) if cache is not None and cache_key is not None else None
+    if entry is not None and entry.fresh:
+        return 200, entry.value
+
+    request_headers = headers
+    if entry is not None and entry.etag:
+        request_headers = dict(headers, **{'If-None-Match': entry.etag})
+
+    request_kwargs = {'url': url, 'headers': request_headers}
+    if params:
+        request_kwargs['params'] = params
+
+    response = client.get(**request_kwargs)
+
+    if response.status_code == 304 and entry is not None:
+        cache.touch(cache_key)
+        return 200, entry.value
+
+    # Error responses (e.g. an HTML page from a failing proxy) may not be JSON, so only a 200 is parsed
+    if response.status_code != 200:
+        return response.status_code, None
+
+    body = response.json()
+    if cache is not None and cache_key is not None:
+        cache.set(cache_key, body, etag=response.headers.get('ETag'))
+
+    return response.status_code, body
+
+
+def iter_pages(url, headers, page_size, params=None, cache_key=None):
+    # The first page gives the total number of items, so every remaining page can be requested by offset
+    # at once, instead of following the 'next' link of one page after another
+    params = dict(params or {}, limit=page_size)
+    cache = get_response_cache() if cache_key is not None else None
+
+    def get_page(offset):
+        page_key = cache_key + (offset,) if cache_key is not None else None
+        status_code, page = get_json(url, headers, params=dict(params, offset=offset), cache=cache, cache_key=page_key)
+        if status_code != 200:
+            raise IncompleteListingError(f'Failed to retrieve {url} at offset {offset}, status code: {status_code}')
+
+        return page
+
+    first_page = get_page(0)
+    yield first_page
+
+    offsets = range(page_size, first_page.get('total', 0), page_size)
+    max_workers = current_app.config.get('API_PAGE_WORKERS', DEFAULT_PAGE_WORKERS)
+    if not offsets:
+        return
+
+    # executor.map() yields pages in order as soon as each one (and every page before it) has arrived,
+    # and raises the error of the first page that failed once every page before it has been yielded
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(offsets)))) as executor:
+        yield from executor.map(client.bind_context(get_page), offsets)
+
+
+def get_pages(url, headers, page_size, params=None, cache_key=None):
+    return list(iter_pages(url, headers, page_size, params=params, cache_key=cache_key))
+
+
 def get_user_info(access_token):
     headers = {
         'Authorization': f'Bearer {access_token}'
     }
 
-    response = requests.get(url=USER_INFO_URL, headers=headers)
-
-    user_info = response.json()
+    _, user_info = get_json(api_url('/me'), headers, cache=get_response_cache(), cache_key=('me', access_token))
     return user_info
 
 
-def get_owned_playlists(access_token):
-    url = USER_PLAYLISTS_URL
-    user_info = get_user_info(access_token)
+def get_owned_playlists(access_token, user_info=None):
+    cache = get_response_cache()
+    entry = cache.get(('playlists', access_token)) if cache is not None else None
+    if entry is not None and entry.fresh:
+        return entry.value
+
+    url = api_url('/me/playlists')
+    user_info = user_info or get_user_info(access_token)
     user_id = user_info['id']
 
     headers = {
@@ -67,14 +215,17 @@ def get_owned_playlists(access_token):
     # Value = Dict of the playlist_id, image_url, and number of tracks mapped to their respective values
     owned_playlists = {}
 
-    while url:
-        response = requests.get(url=url, headers=headers)
-        if response.status_code != 200:
-            print(f'Failed to retrieve data, status code: {response.status_code}')
-            break
-
-        playlist_data = response.json()
-
+    # A page that failed still shows the playlists listed before it, but that partial list is not cached
+    complete = True
+    playlist_pages = []
+    try:
+        for page in iter_pages(url, headers, page_size=PLAYLISTS_PAGE_SIZE, cache_key=('playlist_pages', access_token)):
+            playlist_pages.append(page)
+    except IncompleteListingError as e:
+        print(e)
+        complete = False
+
+    for playlist_data in playlist_pages:
         for playlist in playlist_data['items']:
             num_tracks = playlist['tracks']['total']
 
@@ -85,44 +236,138 @@ def get_owned_playlists(access_token):
                 owned_playlists[playlist['name']] = {
                     'playlist_id': playlist['id'],
                     'image_url': image_url,
-                    'num_tracks': num_tracks
+                    'num_tracks': num_tracks,
+                    'snapshot_id': playlist.get('snapshot_id')
                 }
 
-        # Updates the URL of the request to next page of playlist data due to Spotify's request limits
-        url = playlist_data.get('next')
+    if cache is not None and complete:
+        cache.set(('playlists', access_token), owned_playlists)
 
     return owned_playlists
 
 
-def get_track_info(access_token, playlist_id):
-    url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
+def pick_image_url(images, min_size=DEFAULT_MIN_IMAGE_SIZE):
+    if not images:
+        return None
+
+    # Spotify can leave the dimensions of an image as None, in which case the first (largest) one is used
+    sized_images = [image for image in images if image.get('width') and image.get('height')]
+    if not sized_images:
+        return images[0]['url']
+
+    # Smallest variant that is at least min_size on both sides, otherwise the largest variant available
+    adequate_images = [image for image in sized_images if min(image['width'], image['height']) >= min_size]
+    if adequate_images:
+        return min(adequate_images, key=lambda image: image['width'] * image['height'])['url']
+
+    return max(sized_images, key=lambda image: image['width'] * image['height'])['url']
+
+
+def get_playlist_tracks(access_token, playlist_id, min_image_size=DEFAULT_MIN_IMAGE_SIZE, snapshot_id=None):
+    playlist_tracks = []
+    for page_tracks in iter_playlist_tracks(access_token, playlist_id, min_image_size=min_image_size, snapshot_id=snapshot_id):
+        playlist_tracks += page_tracks
+
+    return playlist_tracks
+
+
+def iter_playlist_tracks(access_token, playlist_id, min_image_size=DEFAULT_MIN_IMAGE_SIZE, snapshot_id=None):
+    # A snapshot ID identifies one exact version of the playlist, so its listing can be cached until evicted
+    cache = get_response_cache() if snapshot_id else None
+    cache_key = ('tracks', access_token, playlist_id, snapshot_id, min_image_size)
+    entry = cache.get(cache_key) if cache is not None else None
+    if entry is not None:
+        yield entry.value
+        return
+
+    url = api_url(f'/playlists/{playlist_id}/tracks')
 
     headers = {
         'Authorization': f'Bearer {access_token}'
     }
 
+    # List of (track_id, image_url) in playlist order, one entry per playlist position.
+    # Local files and unavailable tracks have no track ID (or no album art), and are kept as None so that
+    # the positions still line up with the playlist when reordering it
+    playlist_tracks = []
+    for data in iter_pages(url, headers, page_size=TRACKS_PAGE_SIZE, params={'fields': TRACK_FIELDS}):
+        page_tracks = []
+        for item in data['items']:
+            track = item.get('track') or {}
+            track_id = track.get('id')
+            images = (track.get('album') or {}).get('images')
+            image_url = pick_image_url(images, min_size=min_image_size)
+
+            page_tracks.append((track_id, image_url))
+
+        playlist_tracks += page_tracks
+        yield page_tracks
+
+    # Only reached once every page has been listed, since a page that failed raises IncompleteListingError above
+    if cache is not None:
+        cache.set(cache_key, playlist_tracks, ttl=None)
+
+
+def build_track_info(playlist_tracks):
+    # Repeated tracks collapse into a single entry at the position of their first occurrence
     track_info = {}
-    not_in = 0
-    in_count = 0
+    for track_id, image_url in playlist_tracks:
+        if track_id is not None:
+            track_info.setdefault(track_id, image_url)
 
-    while url:
-        response = requests.get(url=url, headers=headers)
-        if response.status_code != 200:
-            print(f'Failed to retrieve data, status code: {response.status_code}')
-            break
+    return track_info
 
-        data = response.json()
 
-        for item in data['items']:
-            track_id = item['track']['id']
-            image_url = item['track']['album']['images'][0]['url'] if item['track']['album']['images'] else None
-            if track_id not in track_info:
-                not_in += 1
-            else:
-                in_count += 1
+def get_track_info(access_token, playlist_id, min_image_size=DEFAULT_MIN_IMAGE_SIZE, snapshot_id=None):
+    playlist_tracks = get_playlist_tracks(access_token, playlist_id, min_image_size=min_image_size, snapshot_id=snapshot_id)
+    return build_track_info(playlist_tracks)
 
-            track_info[track_id] = image_url
 
-        url = data.get('next')
-    
-    return track_info
\ No newline at end of file
+def invalidate_playlist(access_token, playlist_id):
+    # Called after a sort writes a playlist back, since its tracks, snapshot, and cover have all changed
+    cache = get_response_cache()
+    if cache is None:
+        return
+
+    cache.invalidate('playlists', access_token)
+    cache.invalidate('playlist_pages', access_token)
+    cache.invalidate('tracks', access_token, playlist_id)
+
+
+def get_playlist_snapshot_id(access_token, playlist_id):
+    url = api_url(f'/playlists/{playlist_id}')
+
+    headers = {
+        'Authorization': f'Bearer {access_token}'
+    }
+
+    response = client.get(url=url, headers=headers, params={'fields': 'snapshot_id'})
+    if response.status_code != 200:
+        print(f'Failed to retrieve snapshot ID, status code: {response.status_code}')
+        return None
+
+    return response.json().get('snapshot_id')
+
+
+def reorder_playlist_tracks(access_token, playlist_id, range_start, insert_before, range_length=1, snapshot_id=None):
+    url = api_url(f'/playlists/{playlist_id}/tracks')
+
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+
+    data = {
+        'range_start': range_start,
+        'insert_before': insert_before,
+        'range_length': range_length
+    }
+
+    # Chaining each reorder on the snapshot returned by the previous one makes Spotify apply
+    # the positions against the playlist exactly as the previous reorder left it
+    if snapshot_id:
+        data['snapshot_id'] = snapshot_id
+
+    # Not retried after a timeout or server error, since moving the range again would move it twice
+    response = client.put(url=url, json=data, headers=headers)
+    return response
@@ -0,0 +1,123 @@
+'''
+Module: api
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides server-side storage of Spotify tokens for deployments with REDIS_URL set. Instead of the access
+token itself, the session cookie then only holds a random session ID, and the access and refresh tokens are kept in
+Redis where every worker and host can read them. Access tokens are renewed with the refresh token shortly before
+they expire (Spotify's last for an hour), so users stay logged in without going through the login page again.
+
+Functions:
+- get_access_token(): returns the access token of the current session, from the token store if the app has one
+(renewing it if needed), and from the session cookie otherwise. Returns None if the user has not logged in
+
+Classes:
+- TokenStore(redis, refresh, prefix, ttl, refresh_margin, single_flight): the tokens of every logged-in session
+    - create(token_info): stores the token response of Spotify's token endpoint under a new session ID and returns it
+    - get_access_token(session_id): returns the session's access token, first renewing it with refresh(refresh_token)
+    if it expires within 'refresh_margin' seconds. Only one worker renews a session's token at a time, and the others
+    wait for its result. Returns None for an unknown session, or if renewing failed
+    - delete(session_id): removes the session's tokens, e.g. on logout
+'''
+
+import json
+import time
+import secrets
+
+from flask import current_app, session
+
+DEFAULT_PREFIX = 'color_sorter'
+
+def get_access_token():
+    token_store = current_app.extensions.get('token_store')
+    if token_store is None:
+        return session.get('access_token')
+
+    session_id = session.get('session_id')
+    return token_store.get_access_token(session_id) if session_id else None
+
+
+class TokenStore:
+    def __init__(self, redis, refresh, prefix=DEFAULT_PREFIX, ttl=30 * 24 * 3600, refresh_margin=60,
+                 single_flight=None):
+        self.redis = redis
+        self.refresh = refresh
+        self.prefix = prefix
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.single_flight = single_flight
+
+    def _key(self, session_id):
+        return f'{self.prefix}:session:{session_id}'
+
+    def _load(self, session_id):
+        value = self.redis.get(self._key(session_id))
+        return json.loads(value) if value is not None else None
+
+    def _save(self, session_id, tokens):
+        self.redis.set(self._key(session_id), json.dumps(tokens), ex=self.ttl)
+
+    def _tokens_from(self, token_info, previous=None):
+        # Spotify only sometimes sends a new refresh token when renewing, otherwise the previous one stays valid
+        return {
+            'access_token': token_info['access_token'],
+            'refresh_token': token_info.get('refresh_token') or (previous or {}).get('refresh_token'),
+            'expires_at': time.time() + token_info.get('expires_in', 3600)
+        }
+
+    def create(self, token_info):
+        session_id = secrets.token_urlsafe(32)
+        self._save(session_id, self._tokens_from(token_info))
+        return session_id
+
+    def delete(self, session_id):
+        self.redis.delete(self._key(session_id))
+
+    def _expiring(self, tokens):
+        return tokens['expires_at'] - time.time() < self.refresh_margin
+
+    def get_access_token(self, session_id):
+        tokens = self._load(session_id)
+        if tokens is None:
+            return None
+
+        if not self._expiring(tokens):
+            return tokens['access_token']
+
+        if not tokens.get('refresh_token'):
+            return None
+
+        # Concurrent requests of the same session would otherwise each renew the token, and Spotify may revoke
+        # the refresh token that the first renewal replaced
+        if self.single_flight is not None and not self.single_flight.acquire_many([session_id]):
+            return self._wait_for_refresh(session_id)
+
+        try:
+            token_info = self.refresh(tokens['refresh_token'])
+            if token_info is None:
+                return None
+
+            tokens = self._tokens_from(token_info, previous=tokens)
+            self._save(session_id, tokens)
+            return tokens['access_token']
+        finally:
+            if self.single_flight is not None:
+                self.single_flight.release_many([session_id])
+
+    def _wait_for_refresh(self, session_id):
+        deadline = time.monotonic() + self.single_flight.timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.single_flight.poll_interval)
+
+            tokens = self._load(session_id)
+            if tokens is None:
+                return None
+            if not self._expiring(tokens):
+                return tokens['access_token']
+            if not self.single_flight.held([session_id]):
+                # The other worker gave up without a new token
+                return None
+
+        return None
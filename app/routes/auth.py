@@ -7,22 +7,56 @@ Description:
 This file provides Flask routes to interact with the Spotify OAuth 2.0 Workflow.
 It includes routes for app startup, as well as handling the Spotify callback.
 
+Functions:
+- token_headers(): returns the headers authenticating the app to Spotify's token endpoint with its client credentials
+
+- refresh_access_token(refresh_token): returns the token response of Spotify's token endpoint for a renewed
+access token, or None if renewing failed. Used by the Redis token store (see api/tokens.py)
+
 Routes:
 - @auth_bp.route('/'): On app startup, redirects client to the Spotify login authorization URL
 
-- @auth_bp.route('/callback'): This route handles the callback redirection upon successful login
+- @auth_bp.route('/callback'): This route handles the callback redirection upon successful login.
+With a token store configured (REDIS_URL), the tokens are kept server-side and the session only holds a session ID
 '''
 
 import base64
-import requests
 
 from flask import current_app, Blueprint, request, session, redirect, url_for
 
 from app import REDIRECT_URI
-from ..api.spotify import get_auth_url
+from ..api import client
+from ..api.spotify import get_auth_url, token_url
 
 auth_bp = Blueprint('auth', __name__)
 
+def token_headers():
+    CLIENT_ID = current_app.config['CLIENT_ID']
+    CLIENT_SECRET = current_app.config['CLIENT_SECRET']
+
+    combined = f'{CLIENT_ID}:{CLIENT_SECRET}'
+    b64combined = base64.b64encode(combined.encode()).decode()
+
+    return {
+        'content-type': 'application/x-www-form-urlencoded',
+        'Authorization': f'Basic {b64combined}'
+    }
+
+def refresh_access_token(refresh_token):
+    data = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token
+    }
+
+    # Not retried after a timeout or server error, since Spotify may already have rotated the refresh token
+    response = client.post(url=token_url(), headers=token_headers(), data=data)
+
+    if response.status_code != 200:
+        print(f'Failed to refresh token, status code: {response.status_code}')
+        return None
+
+    return response.json()
+
 @auth_bp.route('/')
 def login():
     AUTH_URL = get_auth_url()
@@ -30,9 +64,6 @@ def login():
 
 @auth_bp.route('/callback')
 def spotify_callback():
-    CLIENT_ID = current_app.config['CLIENT_ID']
-    CLIENT_SECRET = current_app.config['CLIENT_SECRET']
-
     error = request.args.get('error')
     code = request.args.get('code')
 
@@ -40,15 +71,7 @@ def spotify_callback():
         return f'Error: {error}', 400
 
     if code:
-        combined = f'{CLIENT_ID}:{CLIENT_SECRET}'
-        b64combined = base64.b64encode(combined.encode()).decode()
-
-        headers = {
-            'content-type': 'application/x-www-form-urlencoded',
-            'Authorization': f'Basic {b64combined}'
-        }
-
-        token_url = 'https://accounts.spotify.com/api/token'
+        headers = token_headers()
 
         data = {
             'grant_type': 'authorization_code',
@@ -56,14 +79,20 @@ def spotify_callback():
             'redirect_uri': REDIRECT_URI,
         }
 
-        response = requests.post(url=token_url, headers=headers, data=data)
+        response = client.post(url=token_url(), headers=headers, data=data)
 
         if response.status_code != 200:
             return f'Failed to retrieve token, status code: {response.status_code}', 500
 
         access_token_info = response.json()
-        access_token = access_token_info['access_token']
-        session['access_token'] = access_token
+
+        # With a token store, the tokens stay on the server and can be renewed by any worker
+        token_store = current_app.extensions.get('token_store')
+        if token_store is not None:
+            session['session_id'] = token_store.create(access_token_info)
+        else:
+            access_token = access_token_info['access_token']
+            session['access_token'] = access_token
 
         return redirect(url_for('sorting.sorter'))
 
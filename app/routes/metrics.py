@@ -0,0 +1,20 @@
+'''
+Module: routes
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the Flask route exposing the app's metrics (see utils/metrics.py) to Prometheus.
+
+Routes:
+- @metrics_bp.route('/metrics'): returns every metric in the Prometheus text exposition format
+'''
+
+from flask import current_app, Blueprint, Response
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    body = current_app.extensions['metrics'].render()
+    return Response(body, mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -12,101 +12,380 @@ Functions:
 If there is a playlist ('lst') with more than 100 tracks, it returns a list of lists of the 
 playlist tracks broken up into "chunks" of size 'chunk_size' (default=100).
 
+- group_tracks_by_image(track_info): returns a dict of album cover URL -> list of the track IDs using it,
+so that tracks from the same album only have their shared cover downloaded and processed once
+
+- get_track_features(track_info, stats, progress, features_by_image): returns the IDs of the tracks with a usable
+album cover, their (N x 9) matrix of LAB color vectors, and the IDs of the tracks without one. Vectors are looked up
+in 'features_by_image' (image URL -> vector) if passed, and computed with utils/features.py otherwise
+
+- is_extendable_state(previous_state, strategy): returns whether the stored result of the playlist's last sort was
+built by the same strategy out of the same kind of color vectors, so that new tracks could be inserted into it
+
+- can_resort_incrementally(previous_state, track_info, strategy): returns whether the stored result of the
+playlist's last sort (see utils/sort_state.py) can be updated with the tracks that changed since
+
+- can_reuse_features(previous_state, track_info): returns whether the stored result of the playlist's last sort
+holds the color vectors of exactly the tracks of 'track_info' that have a cover, so that sorting the unchanged
+playlist again (e.g. with another strategy) can skip computing them
+
+- compute_sort(track_info, strategy, stats, progress, previous_state, features_by_image): returns a tuple of the new
+order of every track of 'track_info' (tracks without a usable cover last), the sorted IDs of the tracks with a cover,
+and their sorted (N x 9) feature matrix, the last two being what is stored as the SortState for next time.
+If 'previous_state' allows it, tracks removed since the last sort are dropped from its color path and only the added
+tracks are processed and inserted, so re-sorting scales with the size of the change instead of the size of the
+playlist. If can_reuse_features() allows it, the stored features are ordered with the new strategy instead of being
+looked up again. How the stored result was reused is reported in 'stats': stats['incremental'] is True for an
+incremental re-sort, and stats['reused_features'] is True when the stored features were reordered as they are.
+stats['smoothness'] is the total LAB distance between adjacent tracks of the result, to compare strategies by
+(lower is smoother)
+
+- sort_tracks(access_token, playlist_id, strategy, stats, progress): returns the track IDs of the playlist sorted
+by album cover color, using the ordering strategy named by 'strategy' (see utils/ordering.py, default SORT_STRATEGY).
+If a 'stats' dict is passed, it is filled with the number of tracks, distinct covers, the dedup ratio,
+and the seconds spent in each stage under 'timings'.
+If a 'progress' callback is passed, it is called with the current stage and percent done as the sort goes
+
+- write_back_playlist(access_token, playlist_id, sorted_track_ids): replaces the tracks of the playlist
+with the sorted order, returning a dict with the 'status' and 'message' of the update. Only Spotify tracks are added
+back, once each, so local files and repeated entries of a track would be lost
+
+- max_reorder_moves(num_tracks): returns the most reorder requests worth sending for a playlist of 'num_tracks'
+tracks: REORDER_MOVE_FACTOR times the requests write_back_playlist() needs to replace it (one to clear it, plus one
+per chunk of 100 tracks), and at most REORDER_MAX_MOVES
+
+- plan_reorder(current_order, target_order, max_moves): returns the list of (range_start, insert_before, range_length)
+moves that turn current_order into target_order, moving runs of tracks together to keep the list short.
+Returns None as soon as more than 'max_moves' moves would be needed, without planning the rest
+
+- build_reorder_target(current_track_ids, sorted_track_ids): returns the current and target playlist orders
+with a unique key per playlist position (so repeated tracks and local files can be moved too), or None
+if the sorted tracks do not match the playlist's tracks
+
+- reorder_playlist(access_token, playlist_id, current_track_ids, sorted_track_ids, snapshot_id, max_moves, progress):
+moves the tracks of the playlist into the sorted order with as few reorder requests as possible, each one
+chained on the snapshot ID returned by the one before. Tracks are never removed, so a failure partway through
+leaves a complete, partially sorted playlist. Returns None if the playlist cannot be reordered into the sorted order,
+or if it would take more than 'max_moves' requests
+
+- write_back_sort(access_token, playlist_id, current_track_ids, sorted_track_ids, snapshot_id, strategy,
+state_track_ids, state_features, progress): writes the sorted order back to the playlist, reordering it in place
+when WRITE_BACK_MODE allows and it takes at most REORDER_MOVE_FACTOR times the requests of replacing it (and at most
+REORDER_MAX_MOVES), and replacing it otherwise, then stores the SortState of a successful sort (or drops the
+stored one after a failure). Playlists with local files or repeated tracks are never replaced, since replacing them
+would drop those entries: they are always reordered in place, however many moves it takes, and the sort fails if
+they cannot be. Returns the result dict of the write-back
+
+- stream_playlist_features(access_token, playlist_id, snapshot_id, stats, progress): lists the playlist page by page
+and feeds the covers of each page into the streaming pipeline (see utils/pipeline.py) as soon as it arrives.
+Returns the playlist's (track_id, image_url) entries and a dict of image URL -> LAB color vector
+
+- prepare_sort(job, access_token, playlist_id, snapshot_id, strategy, stats): lists the playlist at 'snapshot_id'
+and computes its sorted order without writing anything back. Playlists without a stored sort to extend are streamed
+through stream_playlist_features(), so that listing, downloading, and color extraction overlap. Returns a dict of
+everything write_back_sort() needs, which is also what a sort preview caches
+
+- color_strip(features, size): returns the dominant color of each row of a sorted (N x 9) feature matrix as a hex
+string, evenly sampled down to at most 'size' colors, as a compact summary of what a sorted playlist looks like
+
+- run_sort_job(job, access_token, playlist_id, strategy): sorts the playlist and writes it back as a background
+job (see utils/jobs.py), reporting the stage and percent done on the job as it goes.
+stats['seconds'] is the wall-clock time of the whole job. The job fails without writing anything back if any page of
+the playlist cannot be listed (see IncompleteListingError in api/spotify.py)
+
+- run_preview_job(job, access_token, playlist_id, strategy): computes the sorted order of the playlist as a
+background job without changing the playlist, and caches it in the 'sort_previews' cache keyed by the playlist's
+snapshot ID and the strategy. Returns the proposed order of track IDs and its color_strip(). Previewing a playlist
+that has not changed since its last preview returns the cached order without computing anything
+
+- run_commit_job(job, access_token, playlist_id, preview): writes a cached preview back to the playlist as a
+background job, without downloading or computing anything again
+
+- run_library_sort_job(job, access_token, strategy): sorts every playlist the user owns as a single background job.
+Every playlist is listed first, so that the distinct album covers of the whole library are downloaded and processed
+only once, then each playlist is ordered and written back in turn through the shared HTTP client. Returns a dict
+with the overall 'status', the result of each playlist under 'playlists', and library-wide 'stats'. Playlists that
+cannot be listed completely are left as they are and reported as failed
+
 Routes:
 - @sorting_bp.route('/sorter'): This route is called at the end of the @auth_bp.route('/callback')
-route. It renders the playlist.html template with all of the user's playlist data
+route. It renders the playlist.html template with all of the user's playlist data, and starts the speculative
+warm-up of the playlists the user is likely to sort next if PREFETCH_COVER_BUDGET is set (see utils/prefetch.py)
 
 - @sorting_bp.route('/sort_playlist/<playlist_id>'): This route is called whenever the user clicks
 on the "sort" button for any of the playlists rendered in the playlist.html template. 
-It contains the MAIN SORTING LOGIC for the actual sorting of the playlist tracks.
+It starts the MAIN SORTING LOGIC for the actual sorting of the playlist tracks as a background job,
+and returns the ID of the job right away. A playlist that is already being sorted is not sorted twice.
+The ordering strategy can be chosen per request with the 'strategy' query parameter, e.g. ?strategy=path,
+or one of the fast O(N log N) strategies ?strategy=hilbert, ?strategy=hue, or ?strategy=pca
+
+- @sorting_bp.route('/sort_library'): This route is called when the user clicks on the "sort all" button of the
+playlists.html template. It starts a background job sorting every playlist the user owns at once, and returns
+the ID of the job right away. Takes the same 'strategy' query parameter as '/sort_playlist/<playlist_id>'
+
+- @sorting_bp.route('/preview_sort/<playlist_id>'): This route starts a background job computing the sorted order
+of the playlist without changing it, and returns the ID of the job right away. Once it has finished, the job's
+result holds the proposed order and its color strip. Takes the same 'strategy' query parameter as '/sort_playlist'
+
+- @sorting_bp.route('/commit_sort/<playlist_id>'): This route writes the order from the last preview of the
+playlist with the same 'strategy' back to it as a background job, and returns the ID of the job right away.
+Returns a 409 error instead if there is no preview of the playlist as it is now, e.g. because it changed since
+
+- @sorting_bp.route('/sort_status/<job_id>'): This route returns the status, stage, and percent done of a
+sorting job, which the playlist.html template polls until the job has finished
 '''
 
+import math
 import time
-import requests
-import numpy as np
 
-from flask import Blueprint, session, render_template, jsonify
+from flask import current_app, Blueprint, request, render_template, jsonify
+
+from ..api import client
+from ..api.tokens import get_access_token
+from ..api.spotify import (
+    api_url, get_user_info, get_track_info, get_owned_playlists, get_playlist_tracks, iter_playlist_tracks,
+    build_track_info, get_playlist_snapshot_id, reorder_playlist_tracks, invalidate_playlist, IncompleteListingError
+)
+from ..utils.features import get_color_features
+from ..utils.pipeline import stream_color_features
+from ..utils.ordering import ORDERING_STRATEGIES, order_features, insert_into_path, path_length
+from ..utils.image_processing import lab_to_rgb_batch
+from ..utils.sort_state import SortState
+from ..utils.lazy import lazy_import
 
-from ..api.spotify import get_user_info, get_track_info, get_owned_playlists
-from ..utils.image_processing import download_image, get_dominant_colors, rgb_to_lab, lab_color_distance
+# NumPy is only loaded once the first sort runs (see utils/lazy.py)
+np = lazy_import('numpy')
 
 sorting_bp = Blueprint('sorting', __name__)
 
+# Maximum number of colors in the color strip of a sort preview
+COLOR_STRIP_SIZE = 200
+
 def chunk_list(lst, chunk_size=100):
     '''Yield successive chunk_size chunks from lst.'''
     for i in range(0, len(lst), chunk_size):
         yield lst[i:i + chunk_size]
 
-def cosine_similarity(vec1, vec2):
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+def group_tracks_by_image(track_info):
+    '''Group track IDs by album cover URL, keeping the playlist order within each group.'''
+    tracks_by_image = {}
+    for track_id, image_url in track_info.items():
+        tracks_by_image.setdefault(image_url, []).append(track_id)
 
-def sort_tracks(access_token, playlist_id):
-    track_info = get_track_info(access_token, playlist_id)
-    
-    tracks_with_colors = []
+    return tracks_by_image
 
-    for track_id, image_url in track_info.items():
-        img = download_image(image_url)
-        top_rgb_colors = get_dominant_colors(img)
+def get_track_features(track_info, stats=None, progress=None, features_by_image=None):
+    """Return the IDs of the tracks with a usable album cover, their (N x 9) feature matrix, and the IDs without one."""
+    progress = progress or (lambda stage, percent: None)
 
-        # top_3_lab_colors = NP array [[L1, a1, b1], [L2, a2, b2], [L3, a3, b3]]
-        top_lab_colors = [rgb_to_lab(rgb_color) for rgb_color in top_rgb_colors]
+    # Tracks whose album cover could not be downloaded or processed are kept at the end of the playlist
+    unsorted_track_ids = []
 
-        # lab_color_vector = 9D vector in LAB space [L1, a1, b1, L2, a2, b2, L3, a3, b3]
-        lab_color_vector = np.array(top_lab_colors).flatten()
+    # Tracks from the same album share a cover URL, so each distinct cover is only processed once
+    tracks_by_image = group_tracks_by_image(track_info)
+    image_urls = [image_url for image_url in tracks_by_image if image_url]
 
-        tracks_with_colors.append((track_id, lab_color_vector))
+    # dedup_ratio = tracks per distinct cover, i.e. how many times less work than one cover per track
+    dedup_ratio = len(track_info) / len(image_urls) if image_urls else 1.0
+    print(f'Processing {len(track_info)} tracks with {len(image_urls)} distinct covers (dedup ratio {dedup_ratio:.2f})')
 
-    # print('TRACKS WITH COLORS (ID, vector)')
-    # print(tracks_with_colors)
+    if stats is not None:
+        stats.update({
+            'num_tracks': len(track_info),
+            'num_covers': len(image_urls),
+            'dedup_ratio': round(dedup_ratio, 2)
+        })
 
-    sorted_track_ids = []
-    # Our starting reference color vector will be the first lab_color_vector in the list
-    reference_vector = tracks_with_colors[0][1]
+    # lab_color_vector = 9D vector in LAB space [L1, a1, b1, L2, a2, b2, L3, a3, b3]
+    # served from the feature cache where possible. Downloading and processing covers is 10% -> 80% of the sort.
+    # Covers already processed while the playlist was being listed (see run_sort_job) are passed in instead
+    if features_by_image is None:
+        progress('features', 10)
+        lab_color_vectors = get_color_features(
+            image_urls,
+            cache=current_app.extensions['feature_cache'],
+            max_workers=current_app.config['DOWNLOAD_WORKERS'],
+            palette_size=current_app.config['PALETTE_SIZE'],
+            top_colors=current_app.config['TOP_COLORS'],
+            progress=lambda done, total: progress('features', 10 + 70 * done / total),
+            timings=stats.setdefault('timings', {}) if stats is not None else None,
+            extractor=current_app.extensions['feature_extractor'],
+            engine=current_app.config['COLOR_ENGINE'],
+            queue_size=current_app.config['PIPELINE_QUEUE_SIZE'],
+            single_flight=current_app.extensions.get('single_flight')
+        )
+        features_by_image = dict(zip(image_urls, lab_color_vectors))
+
+    # Each distinct vector is stored once in cover_matrix, and rows[i] is the row of the i-th track's cover in it
+    cover_rows = {}
+    cover_vectors = []
+    track_ids = []
+    rows = []
+    for track_id, image_url in track_info.items():
+        lab_color_vector = features_by_image.get(image_url)
+        if lab_color_vector is None:
+            unsorted_track_ids.append(track_id)
+            continue
+
+        if image_url not in cover_rows:
+            cover_rows[image_url] = len(cover_vectors)
+            cover_vectors.append(lab_color_vector)
+
+        track_ids.append(track_id)
+        rows.append(cover_rows[image_url])
+
+    # feature_matrix = contiguous float32 (N x 9) matrix with one lab_color_vector per track, in playlist order,
+    # gathered from the covers in a single step, so the math runs on all tracks at once
+    num_dimensions = 3 * current_app.config['TOP_COLORS']
+    if track_ids:
+        cover_matrix = np.asarray(cover_vectors, dtype=np.float32)
+        feature_matrix = cover_matrix[np.asarray(rows, dtype=np.int64)]
+    else:
+        feature_matrix = np.empty((0, num_dimensions), dtype=np.float32)
+
+    return track_ids, feature_matrix, unsorted_track_ids
+
+def is_extendable_state(previous_state, strategy):
+    """Whether the stored result of the last sort is a color path that new tracks could be inserted into."""
+    if previous_state is None or len(previous_state.track_ids) == 0:
+        return False
+
+    # Only a path built by the same strategy out of comparable vectors can be extended
+    return (previous_state.strategy == strategy
+            and previous_state.feature_version == current_app.extensions['feature_cache'].version)
+
+def can_resort_incrementally(previous_state, track_info, strategy):
+    """Whether the stored result of the last sort can be updated instead of sorting the playlist from scratch."""
+    if not is_extendable_state(previous_state, strategy):
+        return False
+
+    previous_track_ids = set(previous_state.track_ids)
+    num_added = sum(1 for track_id in track_info if track_id not in previous_track_ids)
+    num_removed = sum(1 for track_id in previous_track_ids if track_id not in track_info)
+
+    # Past a certain amount of change, inserting tracks one by one gives a worse path than a fresh sort
+    max_change = current_app.config['INCREMENTAL_MAX_CHANGE'] * len(track_info)
+    return num_added + num_removed <= max_change
+
+def can_reuse_features(previous_state, track_info):
+    """Return whether the stored SortState holds the vectors of exactly the playlist's tracks that have a cover."""
+    if previous_state is None or previous_state.feature_version != current_app.extensions['feature_cache'].version:
+        return False
+
+    track_ids_with_cover = {track_id for track_id, image_url in track_info.items() if image_url}
+    return (len(previous_state.track_ids) == len(track_ids_with_cover)
+            and set(previous_state.track_ids) == track_ids_with_cover)
+
+def compute_sort(track_info, strategy=None, stats=None, progress=None, previous_state=None, features_by_image=None):
+    """Sort the tracks of track_info by album cover color.
+
+    Returns the new order of every track, followed by the sorted IDs and (N x 9) features of the tracks that had a
+    usable cover, which can be stored as the SortState for an incremental re-sort next time. Whether the previous
+    state was extended or its features reused is reported in stats['incremental'] and stats['reused_features'].
+    """
+    progress = progress or (lambda stage, percent: None)
+    strategy = strategy or current_app.config['SORT_STRATEGY']
+
+    if can_resort_incrementally(previous_state, track_info, strategy):
+        # Tracks that are still in the playlist keep their place on the stored color path, removed tracks are
+        # dropped from it, and only the added tracks have their features computed and get inserted
+        previous_track_ids = set(previous_state.track_ids)
+        kept_rows = [i for i, track_id in enumerate(previous_state.track_ids) if track_id in track_info]
+        added_track_info = {
+            track_id: image_url for track_id, image_url in track_info.items() if track_id not in previous_track_ids
+        }
+
+        added_track_ids, added_features, unsorted_track_ids = get_track_features(
+            added_track_info, stats, progress, features_by_image=features_by_image
+        )
+
+        progress('ordering', 80)
+        start = time.perf_counter()
+        kept_track_ids = [previous_state.track_ids[i] for i in kept_rows]
+        kept_features = previous_state.features[kept_rows]
+        sorted_indices = insert_into_path(kept_features, added_features)
+        ordering_seconds = time.perf_counter() - start
+
+        track_ids = kept_track_ids + added_track_ids
+        feature_matrix = np.concatenate([kept_features, added_features.astype(np.float32)])
+
+        print(f'Incrementally re-sorted with {len(added_track_info)} added and '
+              f'{len(previous_state.track_ids) - len(kept_rows)} removed tracks')
+
+        if stats is not None:
+            stats.update({
+                'num_tracks': len(track_info),
+                'incremental': True,
+                'num_added': len(added_track_info),
+                'num_removed': len(previous_state.track_ids) - len(kept_rows)
+            })
+    else:
+        if can_reuse_features(previous_state, track_info):
+            # The playlist has not changed since its last sort (e.g. it is being sorted with another strategy),
+            # so the stored vectors are used as they are, only put back into playlist order
+            positions = {track_id: i for i, track_id in enumerate(previous_state.track_ids)}
+            track_ids = [track_id for track_id, image_url in track_info.items() if image_url]
+            unsorted_track_ids = [track_id for track_id, image_url in track_info.items() if not image_url]
+            feature_matrix = previous_state.features[[positions[track_id] for track_id in track_ids]]
+
+            print(f'Reused the stored features of {len(track_ids)} tracks')
+            if stats is not None:
+                stats.update({'num_tracks': len(track_info), 'num_covers': 0, 'reused_features': True})
+        else:
+            track_ids, feature_matrix, unsorted_track_ids = get_track_features(
+                track_info, stats, progress, features_by_image=features_by_image
+            )
+
+        progress('ordering', 80)
+        start = time.perf_counter()
+        sorted_indices = order_features(
+            feature_matrix,
+            strategy=strategy,
+            time_budget=current_app.config['SORT_TIME_BUDGET']
+        ) if len(track_ids) else np.empty(0, dtype=np.int64)
+        ordering_seconds = time.perf_counter() - start
+
+        if stats is not None:
+            stats['incremental'] = False
+
+    if stats is not None:
+        stats.setdefault('timings', {})['ordering'] = ordering_seconds
+        stats['smoothness'] = round(path_length(feature_matrix, sorted_indices), 1)
 
-    tracks_with_colors.sort(
-        key=lambda x: cosine_similarity(vec1=reference_vector, vec2=x[1]), 
-        reverse=True
-    )
-    
-    # while tracks_with_colors:
-    #     # Cosine similarity has range [-1, 1], with higher value = vectors are more similar
-    #     # Thus, sort in reverse (descending) order to get similar colors next to each other
-    #     tracks_with_colors.sort(
-    #         key=lambda x: cosine_similarity(vec1=x[1], vec2=reference_vector), 
-    #         reverse=True
-    #     )
-    #
-    #    # I want to iteratively update the reference vector to the latest addition
-    #    # Thus, each sort will be in reference to the most recent album cover
-    #    most_similar_track_id, most_similar_lab_vector = tracks_with_colors.pop(0)
-    #    sorted_track_ids.append(most_similar_track_id)
-    #    reference_vector = most_similar_lab_vector
-
-    # print('SORTED TRACK IDS')
-    # print(sorted_track_ids)
     # sorted_track_ids = list of track IDs
-    sorted_track_ids = [track[0] for track in tracks_with_colors]
+    sorted_track_ids = [track_ids[i] for i in sorted_indices]
+    return sorted_track_ids + unsorted_track_ids, sorted_track_ids, feature_matrix[sorted_indices]
+
+def sort_tracks(access_token, playlist_id, strategy=None, stats=None, progress=None, track_info=None):
+    if strategy is not None and strategy not in ORDERING_STRATEGIES:
+        raise ValueError(f'Unknown ordering strategy: {strategy}')
+
+    # progress(stage, percent) reports how far along the sort is, e.g. to the background job running it
+    progress = progress or (lambda stage, percent: None)
+
+    progress('listing', 0)
+    if track_info is None:
+        track_info = get_track_info(access_token, playlist_id, min_image_size=current_app.config['IMAGE_MIN_SIZE'])
+
+    sorted_track_ids, _, _ = compute_sort(track_info, strategy=strategy, stats=stats, progress=progress)
     return sorted_track_ids
 
 @sorting_bp.route('/sorter')
 def sorter():
-    access_token = session.get('access_token')
+    access_token = get_access_token()
     user_info = get_user_info(access_token)
-    playlists = get_owned_playlists(access_token)
+    playlists = get_owned_playlists(access_token, user_info=user_info)
 
-    return render_template('playlists.html', user_name=user_info['display_name'], playlists=playlists)
-
-@sorting_bp.route('/sort_playlist/<playlist_id>')
-def sort_playlist(playlist_id):
-    access_token = session.get('access_token')
-    print(f'Successfully started sorting route for {playlist_id}')
+    # The playlists the user is likely to sort next are warmed up in the background while they look at the page
+    prefetcher = current_app.extensions.get('prefetcher')
+    if prefetcher is not None:
+        prefetcher.submit(user_info['id'], access_token, playlists)
 
-    # sorted_track_ids = list of track IDs
-    sorted_track_ids = sort_tracks(access_token, playlist_id)
+    return render_template('playlists.html', user_name=user_info['display_name'], playlists=playlists)
 
+def write_back_playlist(access_token, playlist_id, sorted_track_ids):
     # replace the tracks with the sorted order
-    url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
+    url = api_url(f'/playlists/{playlist_id}/tracks')
 
     headers = {
         'Authorization': f'Bearer {access_token}',
@@ -115,15 +394,16 @@ def sort_playlist(playlist_id):
 
     # Clearing the playlist first to execute post (replacement) request
     clear_data = {'uris': []}
-    clear_response = requests.put(url=url, json=clear_data, headers=headers)
+    # Replacing the tracks has the same effect however many times it is sent, so it can be retried after a failure
+    clear_response = client.put(url=url, json=clear_data, headers=headers, retry=True)
 
     if clear_response.status_code not in [200, 201]:
         print(f'Error clearing playlist: {clear_response.json()}')
-        return jsonify({
+        return {
             'status': 'error',
             'message': 'Failed to clear playlist',
             'response': clear_response.json()
-        })
+        }
 
     # Convert track IDs to Spotify URI format and split this list into chunks of size=100
     track_uris = [f'spotify:track:{track_id}' for track_id in sorted_track_ids]
@@ -131,25 +411,565 @@ def sort_playlist(playlist_id):
     
     if len(track_uri_chunks) == 1:
         data = {'uris': track_uri_chunks[0]}
-        response = requests.put(url=url, json=data, headers=headers)
+        response = client.put(url=url, json=data, headers=headers, retry=True)
     else:
         # Loop through each chunk and update the playlist
         for i, chunk in enumerate(track_uri_chunks):
             data = {'uris': chunk}
-            response = requests.post(url=url, json=data, headers=headers)
+            response = client.post(url=url, json=data, headers=headers)
             print(f'Chunk: {i}, Total tracks: {len(chunk)}, Response code: {response.status_code}, Response body: {response.json()}')
 
             if response.status_code not in [200, 201]:
                 print(f'Error updating playlist: {response.json()}')
-                return jsonify({
+                return {
                     'status': 'error',
                     'message': 'Failed to update playlist',
                     'response': response.json()
-                })
+                }
+
+    return {'status': 'success', 'message': 'Playlist sorted successfully'}
+
+def max_reorder_moves(num_tracks):
+    # Each reorder request waits for the one before it, so reordering is only worth it while it takes
+    # a few times as many requests as replacing the playlist would
+    replace_requests = 1 + math.ceil(num_tracks / 100)
+    return min(current_app.config['REORDER_MAX_MOVES'], int(current_app.config['REORDER_MOVE_FACTOR'] * replace_requests))
+
+def plan_reorder(current_order, target_order, max_moves=None):
+    '''Return the (range_start, insert_before, range_length) moves that turn current_order into target_order.'''
+    # Walks the target order front to back. Everything before position i is already in place, so the track
+    # that belongs at i is always found further down the playlist and moved up, together with the tracks
+    # following it that also follow it in the target order. Nearly sorted playlists need only a few moves
+    current = list(current_order)
+    position = {item: j for j, item in enumerate(current)}
+    moves = []
+
+    i = 0
+    while i < len(target_order):
+        if current[i] == target_order[i]:
+            i += 1
+            continue
+
+        j = position[target_order[i]]
+        length = 1
+        while (j + length < len(current) and i + length < len(target_order)
+               and current[j + length] == target_order[i + length]):
+            length += 1
+
+        moves.append((j, i, length))
+        if max_moves is not None and len(moves) > max_moves:
+            return None
+
+        current[i:j + length] = current[j:j + length] + current[i:j]
+
+        for k in range(i, j + length):
+            position[current[k]] = k
+
+        i += length
+
+    return moves
+
+def build_reorder_target(current_track_ids, sorted_track_ids):
+    '''Return the current and target playlist orders as lists of unique keys, or None if they cannot be matched.'''
+    # Each position gets a unique key: (track_id, n) for the nth occurrence of a track, and (None, position)
+    # for local files. Repeated tracks are grouped behind their first occurrence, and local files are kept
+    # at the end of the playlist, so no position is ever dropped
+    occurrences = {}
+    current_keys = []
+    for position, track_id in enumerate(current_track_ids):
+        if track_id is None:
+            current_keys.append((None, position))
+        else:
+            current_keys.append((track_id, occurrences.get(track_id, 0)))
+            occurrences[track_id] = occurrences.get(track_id, 0) + 1
+
+    if set(sorted_track_ids) != set(occurrences) or len(sorted_track_ids) != len(occurrences):
+        return None
+
+    target_keys = [(track_id, n) for track_id in sorted_track_ids for n in range(occurrences[track_id])]
+    target_keys += [key for key in current_keys if key[0] is None]
+
+    return current_keys, target_keys
+
+def reorder_playlist(access_token, playlist_id, current_track_ids, sorted_track_ids, snapshot_id=None,
+                     max_moves=None, progress=None):
+    '''Move the playlist's tracks into the sorted order in place, using as few reorder requests as possible.'''
+    orders = build_reorder_target(current_track_ids, sorted_track_ids)
+    if orders is None:
+        return None
+
+    # A fully shuffled playlist needs about one move per track, which is far more requests than replacing it,
+    # so planning stops as soon as it needs more than max_moves
+    moves = plan_reorder(*orders, max_moves=max_moves)
+    if moves is None:
+        print(f'Reordering playlist {playlist_id} needs more than {max_moves} moves')
+        return None
+
+    print(f'Reordering playlist {playlist_id} with {len(moves)} moves')
+
+    for i, (range_start, insert_before, range_length) in enumerate(moves):
+        response = reorder_playlist_tracks(
+            access_token, playlist_id,
+            range_start=range_start,
+            insert_before=insert_before,
+            range_length=range_length,
+            snapshot_id=snapshot_id
+        )
+
+        if response.status_code not in [200, 201]:
+            print(f'Error reordering playlist: {response.json()}')
+            return {
+                'status': 'error',
+                'message': 'Failed to update playlist',
+                'response': response.json()
+            }
+
+        snapshot_id = response.json().get('snapshot_id')
+
+        if progress is not None:
+            progress('writing', 90 + 10 * (i + 1) / len(moves))
+
+    return {'status': 'success', 'message': 'Playlist sorted successfully', 'num_moves': len(moves)}
+
+def write_back_sort(access_token, playlist_id, current_track_ids, sorted_track_ids, snapshot_id, strategy,
+                    state_track_ids, state_features, progress=None):
+    """Write the sorted order back to the playlist, and store or drop its SortState depending on the outcome."""
+    # Replacing a playlist only adds back each Spotify track once, so local files and repeated tracks would be lost
+    replaceable = None not in current_track_ids and len(set(current_track_ids)) == len(current_track_ids)
+
+    max_moves = max_reorder_moves(len(sorted_track_ids)) if replaceable else None
+
+    result = None
+    if current_app.config['WRITE_BACK_MODE'] == 'reorder' or not replaceable:
+        result = reorder_playlist(
+            access_token, playlist_id, current_track_ids, sorted_track_ids,
+            snapshot_id=snapshot_id,
+            max_moves=max_moves,
+            progress=progress
+        )
+
+    # Falls back to clearing and re-adding the playlist if it could not be matched up for reordering,
+    # or if reordering it would take more than max_moves requests
+    if result is None and replaceable:
+        result = write_back_playlist(access_token, playlist_id, sorted_track_ids)
+    elif result is None:
+        print(f'Playlist {playlist_id} could not be reordered, and replacing it would drop tracks')
+        return {
+            'status': 'error',
+            'message': 'Failed to update playlist without dropping local files or repeated tracks'
+        }
+
+    # Even a failed write-back may have changed the playlist, so its cached listings are always dropped
+    invalidate_playlist(access_token, playlist_id)
+
+    sort_states = current_app.extensions['sort_state']
+    if result['status'] == 'success':
+        sort_states.save(SortState(
+            playlist_id=playlist_id,
+            snapshot_id=get_playlist_snapshot_id(access_token, playlist_id),
+            strategy=strategy,
+            feature_version=current_app.extensions['feature_cache'].version,
+            track_ids=state_track_ids,
+            features=state_features
+        ))
+    else:
+        # A partial write-back leaves the playlist in neither the old nor the new order
+        sort_states.delete(playlist_id)
+
+    return result
+
+def stream_playlist_features(access_token, playlist_id, snapshot_id, stats, progress):
+    """Return the playlist's (track_id, image_url) entries and a dict of image URL -> color vector for its covers."""
+    playlist_tracks = []
+
+    def image_url_pages():
+        # Yields the covers of each page of the playlist as it arrives, keeping the tracks for the caller
+        for page_tracks in iter_playlist_tracks(
+            access_token, playlist_id, min_image_size=current_app.config['IMAGE_MIN_SIZE'], snapshot_id=snapshot_id
+        ):
+            playlist_tracks.extend(page_tracks)
+            yield [image_url for _, image_url in page_tracks]
+
+    # The total grows as pages arrive, so the percent done can go back down a little while listing
+    progress('features', 10)
+    features_by_image = stream_color_features(
+        image_url_pages(),
+        cache=current_app.extensions['feature_cache'],
+        max_workers=current_app.config['DOWNLOAD_WORKERS'],
+        palette_size=current_app.config['PALETTE_SIZE'],
+        top_colors=current_app.config['TOP_COLORS'],
+        engine=current_app.config['COLOR_ENGINE'],
+        extractor=current_app.extensions['feature_extractor'],
+        queue_size=current_app.config['PIPELINE_QUEUE_SIZE'],
+        batch_size=current_app.config['PIPELINE_BATCH_SIZE'],
+        progress=lambda done, total: progress('features', 10 + 70 * done / total),
+        timings=stats.setdefault('timings', {}),
+        single_flight=current_app.extensions.get('single_flight')
+    )
+
+    return playlist_tracks, features_by_image
+
+def prepare_sort(job, access_token, playlist_id, snapshot_id, strategy, stats):
+    """Compute the sorted order of the playlist at snapshot_id, returning what write_back_sort() needs."""
+    start = time.perf_counter()
+
+    # The stored result of the last sort of this playlist lets a re-sort only process the tracks that changed
+    previous_state = current_app.extensions['sort_state'].load(playlist_id)
+
+    features_by_image = None
+    if is_extendable_state(previous_state, strategy) or (previous_state is not None
+                                                          and previous_state.snapshot_id == snapshot_id):
+        # Which tracks changed, or whether the stored features can be reused for the unchanged playlist as they are,
+        # is only known once the whole playlist is listed
+        playlist_tracks = get_playlist_tracks(
+            access_token, playlist_id, min_image_size=current_app.config['IMAGE_MIN_SIZE'], snapshot_id=snapshot_id
+        )
+        stats['timings']['listing'] = time.perf_counter() - start
+    else:
+        # Every cover is needed, so they are downloaded and processed page by page while later pages are still
+        # being listed, instead of waiting for the whole listing. Listing and features overlap here (10% -> 80%)
+        playlist_tracks, features_by_image = stream_playlist_features(access_token, playlist_id, snapshot_id, stats, job.update)
+
+    track_info = build_track_info(playlist_tracks)
+
+    # sorted_track_ids = list of track IDs
+    sorted_track_ids, state_track_ids, state_features = compute_sort(
+        track_info, strategy=strategy, stats=stats, progress=job.update, previous_state=previous_state,
+        features_by_image=features_by_image
+    )
+
+    return {
+        'playlist_id': playlist_id,
+        'snapshot_id': snapshot_id,
+        'strategy': strategy,
+        'current_track_ids': [track_id for track_id, _ in playlist_tracks],
+        'sorted_track_ids': sorted_track_ids,
+        'state_track_ids': state_track_ids,
+        'state_features': state_features
+    }
+
+def color_strip(features, size=COLOR_STRIP_SIZE):
+    """Return the hex colors of the dominant color of each sorted track, sampled down to at most size colors."""
+    if len(features) == 0:
+        return []
+
+    rows = np.linspace(0, len(features) - 1, num=min(size, len(features))).round().astype(np.int64)
+    rgb_colors = lab_to_rgb_batch(np.asarray(features)[rows, :3])
+    return ['#%02x%02x%02x' % tuple(rgb) for rgb in rgb_colors.tolist()]
+
+def write_back_prepared(job, access_token, prepared, stats):
+    """Write a prepared sort back to its playlist, adding the time it took to stats['timings']."""
+    job.update('writing', 90)
+    start = time.perf_counter()
+    result = write_back_sort(
+        access_token, prepared['playlist_id'], prepared['current_track_ids'], prepared['sorted_track_ids'],
+        prepared['snapshot_id'], prepared['strategy'], prepared['state_track_ids'], prepared['state_features'],
+        progress=job.update
+    )
+    stats['timings']['writing'] = time.perf_counter() - start
+    return result
+
+def run_sort_job(job, access_token, playlist_id, strategy=None):
+    print(f'Successfully started sorting job {job.id} for {playlist_id}')
+    job.update('listing', 0)
+
+    # stats['timings'] = seconds spent in each stage of the sort, which are also recorded in the app's metrics
+    stats = {'timings': {}}
+    start_job = time.perf_counter()
+    strategy = strategy or current_app.config['SORT_STRATEGY']
+
+    # The snapshot is read before the tracks, so that reorder positions are relative to the listed order
+    snapshot_id = get_playlist_snapshot_id(access_token, playlist_id)
+
+    prepared = prepare_sort(job, access_token, playlist_id, snapshot_id, strategy, stats)
+    result = write_back_prepared(job, access_token, prepared, stats)
+
+    # Stages can overlap, so the total is measured on its own rather than summed up from the timings
+    stats['seconds'] = round(time.perf_counter() - start_job, 3)
+    current_app.extensions['metrics'].observe_sort(result['status'], stats)
+
+    stats['timings'] = {stage: round(seconds, 3) for stage, seconds in stats['timings'].items()}
+    result['stats'] = stats
+
+    print(f'Finished sorting job {job.id} with status: {result["status"]}')
+    return result
+
+def preview_key(playlist_id, snapshot_id, strategy):
+    return ('preview', playlist_id, snapshot_id, strategy)
+
+def run_preview_job(job, access_token, playlist_id, strategy=None):
+    print(f'Successfully started preview job {job.id} for {playlist_id}')
+    job.update('listing', 0)
+
+    previews = current_app.extensions['sort_previews']
+    strategy = strategy or current_app.config['SORT_STRATEGY']
+    snapshot_id = get_playlist_snapshot_id(access_token, playlist_id)
+    if snapshot_id is None:
+        return {'status': 'error', 'message': 'Failed to retrieve the playlist'}
+
+    # A playlist that has not changed since its last preview with the same strategy is not sorted again
+    entry = previews.get(preview_key(playlist_id, snapshot_id, strategy))
+    cached = entry is not None and entry.fresh
+
+    if cached:
+        prepared = entry.value
+    else:
+        stats = {'timings': {}}
+        start_job = time.perf_counter()
+
+        prepared = prepare_sort(job, access_token, playlist_id, snapshot_id, strategy, stats)
+        stats['seconds'] = time.perf_counter() - start_job
+        prepared['stats'] = stats
+
+        previews.set(preview_key(playlist_id, snapshot_id, strategy), prepared)
+
+    stats = prepared['stats']
+    print(f'Finished preview job {job.id} ({"cached" if cached else "computed"})')
+    return {
+        'status': 'success',
+        'message': 'Preview ready',
+        'playlist_id': playlist_id,
+        'snapshot_id': snapshot_id,
+        'strategy': strategy,
+        'cached': cached,
+        'track_ids': prepared['sorted_track_ids'],
+        'color_strip': color_strip(prepared['state_features']),
+        'stats': dict(stats, timings={stage: round(seconds, 3) for stage, seconds in stats['timings'].items()},
+                      seconds=round(stats['seconds'], 3))
+    }
+
+def run_commit_job(job, access_token, playlist_id, preview):
+    print(f'Successfully started commit job {job.id} for {playlist_id}')
+
+    # The preview's own stats are left as they are, in case the commit is retried after a failed write-back
+    stats = dict(preview['stats'], timings=dict(preview['stats']['timings']))
+    result = write_back_prepared(job, access_token, preview, stats)
+
+    # The playlist has a new snapshot now, so no later commit may use this preview again
+    current_app.extensions['sort_previews'].invalidate('preview', playlist_id)
+
+    # Recorded as a single sort, taking as long as the preview and the write-back together
+    stats['seconds'] = round(stats['seconds'] + stats['timings']['writing'], 3)
+    current_app.extensions['metrics'].observe_sort(result['status'], stats)
+
+    stats['timings'] = {stage: round(seconds, 3) for stage, seconds in stats['timings'].items()}
+    result['stats'] = stats
+
+    print(f'Finished commit job {job.id} with status: {result["status"]}')
+    return result
+
+def run_library_sort_job(job, access_token, strategy=None):
+    print(f'Successfully started library sorting job {job.id}')
+    job.update('listing', 0)
+
+    stats = {'timings': {}}
+    start_job = start = time.perf_counter()
+
+    sort_states = current_app.extensions['sort_state']
+    strategy = strategy or current_app.config['SORT_STRATEGY']
+    playlists = get_owned_playlists(access_token)
+
+    # Listing every playlist is 0% -> 10% of the job
+    listed = []
+    results = []
+    for i, (name, details) in enumerate(playlists.items()):
+        playlist_id = details['playlist_id']
+        snapshot_id = get_playlist_snapshot_id(access_token, playlist_id)
+
+        # A playlist that could only be partly listed is left as it is, since writing it back would drop tracks
+        try:
+            playlist_tracks = get_playlist_tracks(
+                access_token, playlist_id, min_image_size=current_app.config['IMAGE_MIN_SIZE'], snapshot_id=snapshot_id
+            )
+        except IncompleteListingError as e:
+            print(e)
+            results.append({
+                'playlist_id': playlist_id,
+                'name': name,
+                'status': 'error',
+                'message': 'Failed to retrieve every track of the playlist',
+                'incremental': False
+            })
+            continue
+
+        track_info = build_track_info(playlist_tracks)
+        previous_state = sort_states.load(playlist_id)
+
+        listed.append((name, playlist_id, snapshot_id, playlist_tracks, track_info, previous_state))
+        job.update('listing', 10 * (i + 1) / len(playlists))
+
+    stats['timings']['listing'] = time.perf_counter() - start
+
+    # One global set of distinct covers across the library, so a cover shared by several playlists is downloaded
+    # and processed once. Playlists that can be re-sorted incrementally only need the covers of their added tracks
+    image_urls = {}
+    num_tracks = 0
+    for _, _, _, _, track_info, previous_state in listed:
+        num_tracks += len(track_info)
+        if can_resort_incrementally(previous_state, track_info, strategy):
+            previous_track_ids = set(previous_state.track_ids)
+            needed = (image_url for track_id, image_url in track_info.items() if track_id not in previous_track_ids)
+        elif can_reuse_features(previous_state, track_info):
+            needed = []
+        else:
+            needed = track_info.values()
+
+        image_urls.update(dict.fromkeys(image_url for image_url in needed if image_url))
+
+    image_urls = list(image_urls)
+    print(f'Processing {len(listed)} playlists with {num_tracks} tracks and {len(image_urls)} distinct covers')
+
+    job.update('features', 10)
+    lab_color_vectors = get_color_features(
+        image_urls,
+        cache=current_app.extensions['feature_cache'],
+        max_workers=current_app.config['DOWNLOAD_WORKERS'],
+        palette_size=current_app.config['PALETTE_SIZE'],
+        top_colors=current_app.config['TOP_COLORS'],
+        progress=lambda done, total: job.update('features', 10 + 60 * done / total),
+        timings=stats['timings'],
+        extractor=current_app.extensions['feature_extractor'],
+        engine=current_app.config['COLOR_ENGINE'],
+        queue_size=current_app.config['PIPELINE_QUEUE_SIZE'],
+        single_flight=current_app.extensions.get('single_flight')
+    )
+    features_by_image = dict(zip(image_urls, lab_color_vectors))
+
+    # Playlists are ordered and written back one after the other, so that every write-back of the library
+    # draws on the same rate budget of the shared HTTP client instead of competing for it (70% -> 100%)
+    for i, (name, playlist_id, snapshot_id, playlist_tracks, track_info, previous_state) in enumerate(listed):
+        job.update('writing', 70 + 30 * i / len(listed))
+        playlist_stats = {}
+
+        sorted_track_ids, state_track_ids, state_features = compute_sort(
+            track_info, strategy=strategy, stats=playlist_stats, previous_state=previous_state,
+            features_by_image=features_by_image
+        )
+        stats['timings']['ordering'] = stats['timings'].get('ordering', 0) + playlist_stats['timings']['ordering']
+
+        start = time.perf_counter()
+        current_track_ids = [track_id for track_id, _ in playlist_tracks]
+        result = write_back_sort(
+            access_token, playlist_id, current_track_ids, sorted_track_ids, snapshot_id, strategy,
+            state_track_ids, state_features
+        )
+        stats['timings']['writing'] = stats['timings'].get('writing', 0) + time.perf_counter() - start
+
+        results.append({
+            'playlist_id': playlist_id,
+            'name': name,
+            'status': result['status'],
+            'message': result['message'],
+            'incremental': playlist_stats['incremental']
+        })
+
+    num_failed = sum(1 for result in results if result['status'] != 'success')
+    stats.update({
+        'num_playlists': len(results),
+        'num_tracks': num_tracks,
+        'num_covers': len(image_urls),
+        'dedup_ratio': round(num_tracks / len(image_urls), 2) if image_urls else 1.0,
+        'seconds': round(time.perf_counter() - start_job, 3)
+    })
+
+    status = 'error' if num_failed else 'success'
+    current_app.extensions['metrics'].observe_sort(status, stats)
+    stats['timings'] = {stage: round(seconds, 3) for stage, seconds in stats['timings'].items()}
+
+    print(f'Finished library sorting job {job.id} with {num_failed} of {len(results)} playlists failed')
+    return {
+        'status': status,
+        'message': (f'Failed to sort {num_failed} of {len(results)} playlists' if num_failed
+                    else f'Sorted {len(results)} playlists successfully'),
+        'playlists': results,
+        'stats': stats
+    }
+
+@sorting_bp.route('/sort_playlist/<playlist_id>')
+def sort_playlist(playlist_id):
+    access_token = get_access_token()
+    strategy = request.args.get('strategy')
+
+    if strategy is not None and strategy not in ORDERING_STRATEGIES:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown sorting strategy: {strategy}'
+        }), 400
+
+    # Sorting runs in the background, and clicking sort again on a playlist that is still being sorted
+    # returns the job that is already running instead of starting a second one
+    jobs = current_app.extensions['sort_jobs']
+    job = jobs.submit(playlist_id, run_sort_job, access_token, playlist_id, strategy=strategy)
+
+    return jsonify({'status': job.status, 'job_id': job.id}), 202
+
+@sorting_bp.route('/sort_library')
+def sort_library():
+    access_token = get_access_token()
+    strategy = request.args.get('strategy')
+
+    if strategy is not None and strategy not in ORDERING_STRATEGIES:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown sorting strategy: {strategy}'
+        }), 400
+
+    # One library sort per user at a time, like one sort per playlist
+    user_info = get_user_info(access_token)
+    jobs = current_app.extensions['sort_jobs']
+    job = jobs.submit(('library', user_info['id']), run_library_sort_job, access_token, strategy=strategy)
+
+    return jsonify({'status': job.status, 'job_id': job.id}), 202
+
+@sorting_bp.route('/preview_sort/<playlist_id>')
+def preview_sort(playlist_id):
+    access_token = get_access_token()
+    strategy = request.args.get('strategy')
+
+    if strategy is not None and strategy not in ORDERING_STRATEGIES:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown sorting strategy: {strategy}'
+        }), 400
+
+    # Previews have their own job key, so that previewing never waits for or blocks a sort of the same playlist
+    jobs = current_app.extensions['sort_jobs']
+    job = jobs.submit(('preview', playlist_id), run_preview_job, access_token, playlist_id, strategy=strategy)
+
+    return jsonify({'status': job.status, 'job_id': job.id}), 202
+
+@sorting_bp.route('/commit_sort/<playlist_id>')
+def commit_sort(playlist_id):
+    access_token = get_access_token()
+    strategy = request.args.get('strategy') or current_app.config['SORT_STRATEGY']
+
+    if strategy not in ORDERING_STRATEGIES:
+        return jsonify({
+            'status': 'error',
+            'message': f'Unknown sorting strategy: {strategy}'
+        }), 400
+
+    # The preview is only written back if the playlist is still exactly as it was when it was previewed
+    snapshot_id = get_playlist_snapshot_id(access_token, playlist_id)
+    entry = current_app.extensions['sort_previews'].get(preview_key(playlist_id, snapshot_id, strategy))
+
+    if snapshot_id is None or entry is None or not entry.fresh:
+        return jsonify({
+            'status': 'error',
+            'message': 'No preview of the playlist as it is now, preview it again'
+        }), 409
+
+    # Shares the key of '/sort_playlist/<playlist_id>', so a commit and a sort never write the playlist at once
+    jobs = current_app.extensions['sort_jobs']
+    job = jobs.submit(playlist_id, run_commit_job, access_token, playlist_id, entry.value)
+
+    return jsonify({'status': job.status, 'job_id': job.id}), 202
 
-            # sleep to avoid hitting rate limits
-            time.sleep(0.1)
+@sorting_bp.route('/sort_status/<job_id>')
+def sort_status(job_id):
+    job = current_app.extensions['sort_jobs'].get(job_id)
 
-    print('Successfully finished sorting')
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown sorting job'}), 404
 
-    return jsonify({'status': 'success', 'message': 'Playlist sorted successfully'})
\ No newline at end of file
+    return jsonify(job.to_dict())
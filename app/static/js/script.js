@@ -6,6 +6,27 @@ document.addEventListener('DOMContentLoaded', function() {
             sortPlaylist(playlistId);
         };
     });
+
+    // Previews the sorted order as a strip of colors without changing the playlist, then APPLY writes it back
+    // from the cached preview without sorting again
+    document.querySelectorAll('.preview-btn').forEach(function(button) {
+        button.onclick = function() {
+            previewPlaylist(this.getAttribute('data-playlist-id'), this.closest('.grid-item'));
+        };
+    });
+
+    document.querySelectorAll('.commit-btn').forEach(function(button) {
+        button.onclick = function() {
+            startSort('/commit_sort/' + this.getAttribute('data-playlist-id'));
+        };
+    });
+
+    // Sorts every playlist at once as a single job, so covers shared between playlists are only processed once
+    document.querySelectorAll('.sort-all-btn').forEach(function(button) {
+        button.onclick = function() {
+            startSort('/sort_library');
+        };
+    });
 });
 
 function showOverlay() {
@@ -14,20 +35,49 @@ function showOverlay() {
 
 function hideOverlay() {
     document.getElementById('overlay').style.display = 'none';
+    setProgress('');
+}
+
+function setProgress(text) {
+    document.getElementById('progress-text').textContent = text;
 }
 
+// How often to check on a running sort, in milliseconds
+const POLL_INTERVAL = 1000;
+
 function sortPlaylist(playlistId) {
+    startSort('/sort_playlist/' + playlistId);
+}
+
+function previewPlaylist(playlistId, item) {
+    startSort('/preview_sort/' + playlistId, function(result) {
+        showColorStrip(item.querySelector('.color-strip'), result.color_strip);
+        item.querySelector('.commit-btn').style.display = 'inline-block';
+    });
+}
+
+function showColorStrip(strip, colors) {
+    strip.innerHTML = '';
+    colors.forEach(function(color) {
+        const swatch = document.createElement('span');
+        swatch.style.backgroundColor = color;
+        strip.appendChild(swatch);
+    });
+}
+
+function startSort(url, onSuccess) {
     showOverlay();
+    setProgress('Starting sort...');
 
-    // Send an AJAX request to your Flask route
-    fetch('/sort_playlist/' + playlistId)
+    // Send an AJAX request to your Flask route, which starts the sort in the background and returns its job ID
+    fetch(url)
         .then(response => response.json())
         .then(data => {
-            hideOverlay();
-            if (data.status === 'success') {
-                alert(data.message); // Show a success message
+            if (data.job_id) {
+                pollSortStatus(data.job_id, onSuccess);
             } else {
-                alert('Sorting failed. Sorry!')
+                hideOverlay();
+                alert(data.message || 'Sorting failed. Sorry!');
             }
         })
         .catch(error => {
@@ -36,3 +86,27 @@ function sortPlaylist(playlistId) {
         });
 }
 
+function pollSortStatus(jobId, onSuccess) {
+    fetch('/sort_status/' + jobId)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'succeeded') {
+                hideOverlay();
+                if (onSuccess) {
+                    onSuccess(job.result);
+                } else {
+                    alert(job.result.message); // Show a success message
+                }
+            } else if (job.status === 'queued' || job.status === 'running') {
+                setProgress('Sorting: ' + job.stage + ' (' + job.progress + '%)');
+                setTimeout(() => pollSortStatus(jobId, onSuccess), POLL_INTERVAL);
+            } else {
+                hideOverlay();
+                alert('Sorting failed. Sorry!');
+            }
+        })
+        .catch(error => {
+            hideOverlay();
+            console.error('Error:', error)
+        });
+}
@@ -0,0 +1,41 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides helpers shared by the unit tests
+
+Functions:
+- create_test_app(tmp_dir): returns a new Flask app instance whose feature cache and stored sorts live in 'tmp_dir'
+instead of the instance folder, so that tests never leave files behind or see each other's state
+
+- make_jpeg(color, size, split): returns the bytes of a solid color JPEG for use as a mock album cover. With 'split',
+the left half is painted a second color derived from 'color', so that the cover has more than one dominant color
+'''
+
+import os
+from io import BytesIO
+
+from PIL import Image
+
+from app import create_app
+
+def create_test_app(tmp_dir):
+    # The app reads its settings from the environment, which is restored once the app has been created
+    environ = dict(os.environ)
+    try:
+        os.environ['FEATURE_CACHE_PATH'] = os.path.join(tmp_dir, 'feature_cache.sqlite3')
+        os.environ['SORT_STATE_DIR'] = os.path.join(tmp_dir, 'sort_state')
+        return create_app()
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+
+def make_jpeg(color, size=(64, 64), split=False):
+    buffer = BytesIO()
+    img = Image.new('RGB', size, color)
+    if split:
+        img.paste((255 - color[0], color[1], 255 - color[2]), (0, 0, size[0] // 2, size[1]))
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
@@ -7,28 +7,53 @@ Description:
 This file provides unit tests for testing the interaction with the Spotify API
 
 Functions:
-- setUp(self): Creates a new Flask app instance for testing and pushes the app context
+- setUp(self): Creates a new Flask app instance for testing with its caches in a temporary directory, and pushes the
+app context
 
-- tearDown(self): Deconstructs the test application context
+- tearDown(self): Deconstructs the test application context and removes the temporary directory
 
 - test_get_auth_url(self): Tests the get_auth_url() function
 Successful test on proper URL formation
 
 - test_get_user_info(self, mock_get): Tests the get_user_info() function
 Successful test on returned response matching mock_response with mock user data
+
+- test_pick_image_url(self): Tests the pick_image_url() function
+Successful test on the smallest adequate variant being picked, falling back to the largest or first variant
+
+- test_get_track_info_paginates_by_offset(self, mock_get): Tests the get_track_info() function on a multi-page playlist
+Successful test on every page being requested by offset with a fields filter, and tracks returned in playlist order
+
+- test_user_info_is_cached_and_revalidated(self, mock_get): Tests the response cache in front of get_user_info()
+Successful test on fresh entries served without a request, and stale entries revalidated with their ETag
+
+- test_playlist_tracks_cached_by_snapshot(self, mock_get): Tests that playlist tracks are cached per snapshot ID
+Successful test on the same snapshot being served from the cache until invalidate_playlist() is called
+
+- test_owned_playlists_with_failed_page(self, mock_get): Tests get_owned_playlists() when a later page fails with a
+non-JSON error page
+Successful test on the playlists of the first page being returned without the error body being parsed, and the
+partial list not being cached
 '''
 
+import shutil
+import tempfile
 import unittest
 import urllib.parse
-from unittest.mock import patch
+from unittest.mock import patch, MagicMock
 
-from app import REDIRECT_URI, SCOPE, create_app
-from app.api.spotify import get_auth_url, get_user_info
+from app import REDIRECT_URI, SCOPE
+from app.api.spotify import (
+    get_auth_url, get_user_info, get_track_info, get_playlist_tracks, get_owned_playlists, pick_image_url,
+    invalidate_playlist
+)
+from app.tests.helpers import create_test_app
 
 class TestAPIInteraction(unittest.TestCase):
 
     def setUp(self):
-        self.app = create_app()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_test_app(self.tmp_dir)
         self.app.config['CLIENT_ID'] = 'dummy_client_id'
         self.ctx = self.app.app_context()
         self.ctx.push()
@@ -36,6 +61,7 @@ class TestAPIInteraction(unittest.TestCase):
     
     def tearDown(self):
         self.ctx.pop()
+        shutil.rmtree(self.tmp_dir)
 
     def test_get_auth_url(self):
         # Testing against this correctly formatted expected URL
@@ -53,7 +79,7 @@ class TestAPIInteraction(unittest.TestCase):
         # Asserts that the URL is formed correctly
         self.assertEqual(auth_url, expected_url)
 
-    @patch('app.api.spotify.requests.get')
+    @patch('app.api.spotify.client.get')
     def test_get_user_info(self, mock_get):
         # The mock get response will return a response with an OK status code and mock data
         mock_response = {
@@ -78,6 +104,120 @@ class TestAPIInteraction(unittest.TestCase):
             headers={'Authorization': f'Bearer {access_token}'}
         )
 
+    def test_pick_image_url(self):
+        # Spotify returns album images from largest to smallest
+        images = [
+            {'url': 'large', 'height': 640, 'width': 640},
+            {'url': 'medium', 'height': 300, 'width': 300},
+            {'url': 'small', 'height': 64, 'width': 64}
+        ]
+
+        # Asserts that the smallest variant at least min_size pixels on each side is picked
+        self.assertEqual(pick_image_url(images, min_size=300), 'medium')
+        self.assertEqual(pick_image_url(images, min_size=301), 'large')
+        self.assertEqual(pick_image_url(images, min_size=64), 'small')
+
+        # Asserts that the largest variant is picked when none are big enough
+        self.assertEqual(pick_image_url(images, min_size=1000), 'large')
+
+        # Asserts that the first variant is picked when Spotify leaves out the dimensions, and None without images
+        self.assertEqual(pick_image_url([{'url': 'unsized', 'height': None, 'width': None}]), 'unsized')
+        self.assertIsNone(pick_image_url([]))
+
+    @patch('app.api.spotify.client.get')
+    def test_get_track_info_paginates_by_offset(self, mock_get):
+        total = 250
+
+        def fake_get(url, headers, params):
+            offset, limit = params['offset'], params['limit']
+            items = [
+                {'track': {'id': f'track_{i}', 'album': {'images': [{'url': f'cover_{i}', 'height': 300, 'width': 300}]}}}
+                for i in range(offset, min(offset + limit, total))
+            ]
+
+            response = MagicMock()
+            response.status_code = 200
+            response.json.return_value = {'total': total, 'items': items}
+            return response
+
+        mock_get.side_effect = fake_get
+
+        track_info = get_track_info('dummy_access_token', 'dummy_playlist_id')
+
+        # Asserts that all three pages were requested by offset, each with a fields filter
+        requested_offsets = sorted(call.kwargs['params']['offset'] for call in mock_get.call_args_list)
+        self.assertEqual(requested_offsets, [0, 100, 200])
+        self.assertTrue(all('fields' in call.kwargs['params'] for call in mock_get.call_args_list))
+
+        # Asserts that the tracks come back in playlist order despite the pages being fetched concurrently
+        self.assertEqual(list(track_info.keys()), [f'track_{i}' for i in range(total)])
+        self.assertEqual(track_info['track_123'], 'cover_123')
+
+    @patch('app.api.spotify.client.get')
+    def test_user_info_is_cached_and_revalidated(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.headers = {'ETag': '"v1"'}
+        mock_get.return_value.json.return_value = {'id': '1234', 'display_name': 'Test User'}
+
+        first = get_user_info('dummy_access_token')
+        second = get_user_info('dummy_access_token')
+
+        # Asserts that the second call was served from the cache without a request
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get.call_count, 1)
+
+        # Once the entry is stale, Spotify answering 304 Not Modified reuses the cached profile
+        self.app.extensions['response_cache'].touch(('me', 'dummy_access_token'), ttl=0)
+        mock_get.return_value.status_code = 304
+
+        self.assertEqual(get_user_info('dummy_access_token'), first)
+        self.assertEqual(mock_get.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+
+    @patch('app.api.spotify.client.get')
+    def test_playlist_tracks_cached_by_snapshot(self, mock_get):
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {
+            'total': 1,
+            'items': [{'track': {'id': 'track_1', 'album': {'images': []}}}]
+        }
+
+        get_playlist_tracks('dummy_access_token', 'dummy_playlist_id', snapshot_id='snapshot_1')
+        get_playlist_tracks('dummy_access_token', 'dummy_playlist_id', snapshot_id='snapshot_1')
+
+        # Asserts that the same snapshot of the playlist was only listed once
+        self.assertEqual(mock_get.call_count, 1)
+
+        # Asserts that the playlist is listed again after a sort invalidates it
+        invalidate_playlist('dummy_access_token', 'dummy_playlist_id')
+        get_playlist_tracks('dummy_access_token', 'dummy_playlist_id', snapshot_id='snapshot_1')
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('app.api.spotify.client.get')
+    def test_owned_playlists_with_failed_page(self, mock_get):
+        def fake_get(url, headers, params):
+            response = MagicMock()
+            if params['offset'] > 0:
+                # A proxy's HTML error page, which is not JSON
+                response.status_code = 502
+                response.json.side_effect = ValueError('Expecting value')
+                return response
+
+            response.status_code = 200
+            response.headers = {}
+            response.json.return_value = {'total': 60, 'items': [{
+                'id': 'playlist_1', 'name': 'First', 'images': [], 'snapshot_id': 'snapshot_1',
+                'owner': {'id': '1234'}, 'tracks': {'total': 3}
+            }]}
+            return response
+
+        mock_get.side_effect = fake_get
+
+        playlists = get_owned_playlists('dummy_access_token', user_info={'id': '1234'})
+
+        # Asserts that the playlists listed before the failed page are shown, but not cached
+        self.assertEqual(list(playlists), ['First'])
+        self.assertIsNone(self.app.extensions['response_cache'].get(('playlists', 'dummy_access_token')))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -7,9 +7,10 @@ Description:
 This file provides unit tests for testing the Flask routes in routes/auth.py
 
 Functions:
-- setUp(self): Creates a new Flask app instance for testing and pushes the app context
+- setUp(self): Creates a new Flask app instance for testing with its caches in a temporary directory, and pushes the
+app context
 
-- tearDown(self): Deconstructs the test application context
+- tearDown(self): Deconstructs the test application context and removes the temporary directory
 
 - test_login_route(self): Tests the default '/' route set to the login logic
 Successful test on successful redirection with correct URL
@@ -31,17 +32,21 @@ Tests the callback route when a valid code nor error is provided
 Successful test on response code 400 for this scenario and correct error handling
 '''
 
+import shutil
+import tempfile
 import unittest
 import urllib.parse
 from unittest.mock import patch
 
 from flask import Flask, session
-from app import REDIRECT_URI, SCOPE, create_app
+from app import REDIRECT_URI, SCOPE
+from app.tests.helpers import create_test_app
 
 class TestAuthRoutes(unittest.TestCase):
 
     def setUp(self):
-        self.app = create_app()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_test_app(self.tmp_dir)
         self.app.config['SECRET_KEY'] = 'dummy_secret_key'
         self.app.config['CLIENT_ID'] = 'dummy_client_id'
         self.app.config['CLIENT_SECRET'] = 'dummy_client_secret'
@@ -52,6 +57,7 @@ class TestAuthRoutes(unittest.TestCase):
     
     def tearDown(self):
         self.ctx.pop()
+        shutil.rmtree(self.tmp_dir)
     
     def test_login_route(self):
         # Makes a GET request to the '/' home login route
@@ -80,7 +86,7 @@ class TestAuthRoutes(unittest.TestCase):
         # Asserts that the returned response correctly gives the expected error message
         self.assertIn('Error: dummy_error', response.data.decode())
     
-    @patch('app.routes.auth.requests.post')
+    @patch('app.routes.auth.client.post')
     def test_callback_route_with_token_success(self, mock_post):
         mock_response = mock_post.return_value
         mock_response.status_code = 200
@@ -99,7 +105,7 @@ class TestAuthRoutes(unittest.TestCase):
         self.assertTrue('Location' in response.headers)
         self.assertTrue('sorter' in response.headers['Location'])
     
-    @patch('app.routes.auth.requests.post')
+    @patch('app.routes.auth.client.post')
     def test_callback_route_with_token_failure(self, mock_post):
         mock_response = mock_post.return_value
         mock_response.status_code = 500
@@ -0,0 +1,85 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides a smoke test for the offline benchmarks in benchmarks/, so that they keep working as the app changes
+
+Functions:
+- test_run_benchmarks(self): Runs the benchmarks on a small playlist against the local Spotify stand-in
+Successful test on every stage being timed, and the sorting job succeeding with every track written back
+
+- test_import_time(self): Measures the cold start of create_app() in a fresh interpreter
+Successful test on create_app() being timed without importing NumPy, Pillow, or OpenCV
+
+- test_color_engines(self): Runs the dominant color engine comparison on a few covers
+Successful test on a result per engine, with the adaptive engine agreeing with itself exactly
+
+- test_load_test(self): Runs the load test with two users at once, with 30% of API requests throttled
+Successful test on requests being throttled and both sorts still succeeding, with every route timed and memory
+measured
+'''
+
+import os
+import tempfile
+import unittest
+
+from benchmarks.mock_spotify import MockSpotify
+from benchmarks.run_benchmarks import create_benchmark_app, benchmark_playlist
+from benchmarks.color_engines import run_color_engines
+from benchmarks.import_time import run_import_time
+from benchmarks.load_test import run_load_test
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_run_benchmarks(self):
+        results = []
+
+        with MockSpotify() as mock, tempfile.TemporaryDirectory() as data_dir:
+            app = create_benchmark_app(mock, data_dir)
+            benchmark_playlist(app, mock, num_tracks=30, strategies=['reference'], results=results)
+
+            final_order = mock.playlist_track_ids('benchmark30')
+
+        # Asserts that every stage was timed, and that the app was pointed at the stand-in without leaking it
+        stages = [result['stage'] for result in results]
+        self.assertEqual(stages, ['listing', 'download', 'quantize', 'lab', 'ordering', 'write_back', 'end_to_end'])
+        self.assertNotIn('SPOTIFY_API_URL', os.environ)
+
+        # Asserts that the end-to-end sort wrote every track back to the playlist
+        self.assertEqual(results[-1]['status'], 'success')
+        self.assertEqual(sorted(final_order), sorted(f'benchmark30t{i}' for i in range(30)))
+        self.assertEqual(results[1]['num_covers'], 20)
+
+    def test_import_time(self):
+        report = run_import_time(repeats=1, top=5)
+
+        # Asserts that the heavy modules are left for the first sort to import
+        self.assertGreater(report['create_app_ms'], 0)
+        self.assertEqual(report['heavy_modules_loaded'], [])
+        self.assertEqual(len(report['top_imports']), 5)
+
+    def test_color_engines(self):
+        results = run_color_engines(num_covers=6)['results']
+
+        self.assertEqual([result['engine'] for result in results], ['adaptive', 'histogram', 'kmeans'])
+        self.assertEqual((results[0]['mean_delta_e'], results[0]['path_ratio']), (0.0, 1.0))
+
+    def test_load_test(self):
+        report = run_load_test(user_counts=[2], num_tracks=20, throttle_rate=0.3, retry_after=0)
+        result = report['results'][0]
+
+        # Asserts that requests were throttled, and that both users' sorts finished by retrying through them
+        self.assertGreater(result['throttled'], 0)
+        self.assertEqual((result['succeeded'], result['failed']), (2, 0))
+
+        # Asserts that every route was timed for both users, and that memory was measured
+        for route in ['/callback', '/sorter', '/sort_playlist', 'sort']:
+            self.assertEqual(result['routes'][route]['count'], 2)
+        self.assertGreater(result['routes']['sort']['p50_ms'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
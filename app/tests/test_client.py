@@ -0,0 +1,148 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the shared HTTP client in api/client.py
+
+Functions:
+- make_response(status_code, headers): Helper that returns a mock response with the given status code and headers
+
+- test_retries_throttled_requests(self, mock_sleep): Tests that a 429 response is retried after its Retry-After
+Successful test on the successful retry being returned, with a wait of at least Retry-After seconds
+
+- test_gives_up_after_max_retries(self, mock_sleep): Tests that a request failing every time stops retrying
+Successful test on the last failed response being returned after max_retries retries
+
+- test_writes_are_not_retried(self, mock_sleep): Tests that writes are only retried when it is safe to send them twice
+Successful test on a failed or timed out POST being sent once, a 429 with Retry-After being retried for any method,
+and a PUT opting in with retry=True being retried
+
+- test_retries_connection_errors(self, mock_sleep): Tests that connection errors are retried, then raised
+Successful test on a recovered request returning its response, and a dead host raising ConnectionError
+
+- test_client_per_app(self): Tests that every app has its own client, also on worker threads started by it
+Successful test on two apps keeping separate clients and metrics, a thread running under bind_context() using the
+client of the app that started it, and the default client being used outside of any app
+
+- test_token_bucket_adapts(self): Tests that the rate limiter backs off on throttling and recovers on success
+Successful test on the rate halving after a 429 and climbing back to (but not past) its maximum
+'''
+
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from app.api import client
+from app.api.client import HttpClient, TokenBucket
+from app.tests.helpers import create_test_app
+
+def make_response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+class TestHttpClient(unittest.TestCase):
+
+    @patch('app.api.client.time.sleep')
+    def test_retries_throttled_requests(self, mock_sleep):
+        http = HttpClient(rate=1000, max_retries=3)
+        http.session.request = MagicMock(side_effect=[
+            make_response(429, {'Retry-After': '0.1'}),
+            make_response(200)
+        ])
+
+        response = http.request('GET', 'https://api.spotify.com/v1/me')
+
+        # Asserts that the retried request succeeded after waiting out the Retry-After header
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(http.session.request.call_count, 2)
+        self.assertGreaterEqual(max(call.args[0] for call in mock_sleep.call_args_list), 0.1)
+
+    @patch('app.api.client.time.sleep')
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        http = HttpClient(rate=1000, max_retries=2)
+        http.session.request = MagicMock(return_value=make_response(503))
+
+        response = http.request('GET', 'https://api.spotify.com/v1/playlists/1/tracks')
+
+        # Asserts that the request was tried once plus max_retries times before giving up
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(http.session.request.call_count, 3)
+
+    @patch('app.api.client.time.sleep')
+    def test_writes_are_not_retried(self, mock_sleep):
+        http = HttpClient(rate=1000, max_retries=2)
+        url = 'https://api.spotify.com/v1/playlists/1/tracks'
+
+        # Asserts that a POST which may already have been applied is sent only once
+        http.session.request = MagicMock(return_value=make_response(503))
+        self.assertEqual(http.request('POST', url).status_code, 503)
+        self.assertEqual(http.session.request.call_count, 1)
+
+        http.session.request = MagicMock(side_effect=requests.Timeout('timed out'))
+        with self.assertRaises(requests.Timeout):
+            http.request('POST', url)
+        self.assertEqual(http.session.request.call_count, 1)
+
+        # Asserts that a POST refused with 429 and Retry-After is sent again
+        http.session.request = MagicMock(side_effect=[make_response(429, {'Retry-After': '0'}), make_response(201)])
+        self.assertEqual(http.request('POST', url).status_code, 201)
+
+        # Asserts that a write opting in is retried like a read
+        http.session.request = MagicMock(side_effect=[make_response(503), make_response(200)])
+        self.assertEqual(http.request('PUT', url, retry=True).status_code, 200)
+
+    @patch('app.api.client.time.sleep')
+    def test_retries_connection_errors(self, mock_sleep):
+        http = HttpClient(rate=1000, max_retries=1)
+        http.session.request = MagicMock(side_effect=[requests.ConnectionError('reset'), make_response(200)])
+
+        self.assertEqual(http.request('GET', 'https://i.scdn.co/image/a').status_code, 200)
+
+        # Asserts that a host that keeps failing raises once the retries are used up
+        http.session.request = MagicMock(side_effect=requests.ConnectionError('reset'))
+        with self.assertRaises(requests.ConnectionError):
+            http.request('GET', 'https://i.scdn.co/image/a')
+
+    def test_client_per_app(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            first_app, second_app = create_test_app(tmp_dir), create_test_app(tmp_dir)
+        first_client = first_app.extensions['http_client']
+
+        # Asserts that creating a second app leaves the first app's client and metrics as they were
+        self.assertIsNot(first_client, second_app.extensions['http_client'])
+        self.assertIs(first_client.metrics, first_app.extensions['metrics'])
+
+        with first_app.app_context():
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                unbound = executor.submit(client.get_client).result()
+                bound = executor.submit(client.bind_context(client.get_client)).result()
+
+            self.assertIs(client.get_client(), first_client)
+
+        # Asserts that worker threads only see the app's client when started with bind_context()
+        self.assertIs(bound, first_client)
+        self.assertIs(unbound, client.get_client())
+        self.assertIsNot(unbound, first_client)
+
+    def test_token_bucket_adapts(self):
+        bucket = TokenBucket(rate=10, burst=10)
+
+        bucket.on_throttle()
+        self.assertEqual(bucket.rate, 5)
+
+        for _ in range(100):
+            bucket.on_success()
+
+        # Asserts that the rate recovers after throttling, but never above the configured rate
+        self.assertEqual(bucket.rate, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the process pool color extraction in utils/extraction.py
+
+Functions:
+- test_process_pool_matches_in_process(self): Tests that extracting on worker processes, with and without shared
+memory, gives the same vectors as extracting in this process
+Successful test on identical vectors, and None for the missing and corrupt images
+
+- test_undecodable_images_are_skipped(self): Tests that images failing to decode with errors other than OSError
+are returned as None instead of failing the batch
+Successful test on None for truncated and oversized images, and vectors for the other images
+
+- test_small_batches_stay_in_process(self): Tests that batches smaller than min_covers never start the pool
+Successful test on the vectors being extracted without any worker processes
+'''
+
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+
+from app.utils.extraction import FeatureExtractor, extract_color_vectors
+from app.tests.helpers import make_jpeg
+
+class TestExtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.images_bytes = [make_jpeg((i * 20, 100, 255 - i * 20), split=True) for i in range(10)]
+        self.images_bytes[3] = None
+        self.images_bytes[7] = b'not a jpeg'
+
+    def assertVectorsEqual(self, vectors, expected):
+        self.assertEqual(len(vectors), len(expected))
+        for vector, expected_vector in zip(vectors, expected):
+            if expected_vector is None:
+                self.assertIsNone(vector)
+            else:
+                np.testing.assert_array_equal(vector, expected_vector)
+
+    def test_process_pool_matches_in_process(self):
+        expected = extract_color_vectors(self.images_bytes)
+        self.assertIsNone(expected[3])
+        self.assertIsNone(expected[7])
+
+        # shared_memory_min_bytes=0 always uses shared memory, and a huge threshold never does
+        for shared_memory_min_bytes in (0, 1 << 40):
+            extractor = FeatureExtractor(max_workers=2, min_covers=1, shared_memory_min_bytes=shared_memory_min_bytes)
+            try:
+                self.assertVectorsEqual(extractor.extract(self.images_bytes), expected)
+            finally:
+                extractor.shutdown()
+
+    def test_undecodable_images_are_skipped(self):
+        valid = make_jpeg((200, 100, 50), split=True)
+        oversized = make_jpeg((50, 100, 200), size=(256, 256))
+        truncated = valid[:len(valid) // 2]
+
+        # Images with more than twice MAX_IMAGE_PIXELS pixels raise DecompressionBombError rather than OSError
+        with patch.object(Image, 'MAX_IMAGE_PIXELS', 64 * 64):
+            vectors = extract_color_vectors([valid, oversized, truncated])
+
+        self.assertIsNotNone(vectors[0])
+        self.assertIsNone(vectors[1])
+        self.assertIsNone(vectors[2])
+
+    def test_small_batches_stay_in_process(self):
+        extractor = FeatureExtractor(max_workers=2, min_covers=100)
+
+        vectors = extractor.extract(self.images_bytes)
+
+        # Asserts that the vectors were extracted without starting the pool
+        self.assertVectorsEqual(vectors, extract_color_vectors(self.images_bytes))
+        self.assertIsNone(extractor._executor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the persistent color feature cache in utils/feature_cache.py
+
+Functions:
+- setUp(self): Creates a temporary directory to hold the SQLite cache file
+
+- tearDown(self): Removes the temporary directory
+
+- test_round_trip(self): Tests that stored vectors are returned unchanged on a later lookup
+Successful test on hits matching the stored vectors and misses being left out of the result
+
+- test_version_invalidates_entries(self): Tests that a cache with a different version key ignores old entries
+Successful test on no hits after the palette settings change
+
+- test_other_versions_kept_while_in_use(self): Tests that entries of other feature versions sharing the file are
+only pruned once they have not been used for stale_version_age seconds
+Successful test on a recently used entry of another version surviving writes of a new version, and a long unused
+one being pruned when a cache opens
+
+- test_lru_eviction(self): Tests that the least recently used entries are evicted past max_entries
+Successful test on the recently read entry surviving while the oldest unread entry is evicted
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from app.utils.feature_cache import FeatureCache, feature_version
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'features.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        cache = FeatureCache(self.path)
+        vector = np.arange(9, dtype=np.float32)
+        cache.put_many({'https://i.scdn.co/image/a': vector})
+
+        features = cache.get_many(['https://i.scdn.co/image/a', 'https://i.scdn.co/image/b'])
+
+        # Asserts that only the stored URL is a hit, with the same vector that was stored
+        self.assertEqual(list(features.keys()), ['https://i.scdn.co/image/a'])
+        np.testing.assert_array_equal(features['https://i.scdn.co/image/a'], vector)
+
+    def test_version_invalidates_entries(self):
+        FeatureCache(self.path, version=feature_version(16, 3)).put_many({'url': np.zeros(9)})
+
+        cache = FeatureCache(self.path, version=feature_version(32, 3))
+
+        # Asserts that vectors computed with other palette settings are never served
+        self.assertEqual(cache.get_many(['url']), {})
+
+    def test_other_versions_kept_while_in_use(self):
+        old_cache = FeatureCache(self.path, version=feature_version(16, 3, engine='kmeans'))
+        old_cache.put_many({'recent': np.zeros(9)})
+        with patch('app.utils.feature_cache.time.time', return_value=0.0):
+            old_cache.put_many({'stale': np.ones(9)})
+
+        cache = FeatureCache(self.path, version=feature_version(16, 3))
+        cache.put_many({'new': np.full(9, 2)})
+
+        # Asserts that only the entry of the other version that was not used for a long time was pruned
+        self.assertEqual(list(FeatureCache(self.path, version=old_cache.version).get_many(['recent', 'stale'])),
+                         ['recent'])
+
+    def test_lru_eviction(self):
+        cache = FeatureCache(self.path, max_entries=2)
+        cache.put_many({'first': np.zeros(9)})
+        cache.put_many({'second': np.ones(9)})
+
+        # Reading 'first' makes 'second' the least recently used entry
+        cache.get_many(['first'])
+        cache.put_many({'third': np.full(9, 2)})
+
+        features = cache.get_many(['first', 'second', 'third'])
+
+        # Asserts that the cache stays at its size cap and evicted the least recently used entry
+        self.assertEqual(set(features.keys()), {'first', 'third'})
+
+
+if __name__ == '__main__':
+    unittest.main()
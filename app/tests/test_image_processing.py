@@ -0,0 +1,163 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the image and color processing helpers in utils/image_processing.py
+
+Functions:
+- test_download_images_preserves_order(self, mock_get):
+Tests that concurrently downloaded images are returned in the same order as the URLs passed in
+Successful test on each returned image matching the color served for its URL
+
+- test_download_images_handles_failures(self, mock_get):
+Tests that a failed or missing download does not abort the other downloads
+Successful test on None being returned only in the positions of the failed URLs
+
+- test_rgb_to_lab_batch_matches_scalar(self): Tests that rgb_to_lab_batch() matches rgb_to_lab() row by row
+Successful test on identical LAB values for a set of random RGB colors
+
+- test_rgb_to_lab_numpy_matches_opencv(self): Tests that the NumPy-only LAB conversion matches OpenCV's
+Successful test on known LAB values of black, white, and gray with and without OpenCV, and on identical values to cv2.COLOR_BGR2LAB
+for a grid of RGB colors (the comparison is skipped if OpenCV is not installed)
+
+- test_batch_kernels_match_scalar(self): Tests that lab_color_distances() and cosine_similarities()
+match lab_color_distance() and the cosine similarity of two vectors against every row of a feature matrix
+Successful test on the batch results equalling the scalar results element by element
+
+- test_dominant_color_engines(self): Tests that every dominant color engine finds the colors of a three-color
+image in order of the area they cover, and that an unknown engine raises a ValueError
+Successful test on each engine's colors being within a few values of the colors drawn
+'''
+
+import unittest
+from io import BytesIO
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+import requests
+from PIL import Image
+
+from app.utils.image_processing import (
+    download_images, rgb_to_lab, rgb_to_lab_batch, lab_color_distance, lab_color_distances, cosine_similarities,
+    DOMINANT_COLOR_ENGINES, get_color_vector, rgb_to_lab_numpy
+)
+from app.utils.lazy import optional_import
+from app.tests.helpers import make_jpeg
+
+class TestImageProcessing(unittest.TestCase):
+
+    @patch('app.utils.image_processing.client.get')
+    def test_download_images_preserves_order(self, mock_get):
+        colors = {f'https://i.scdn.co/image/{i}': (i * 10, 0, 255 - i * 10) for i in range(20)}
+
+        def fake_get(url, timeout=None):
+            response = MagicMock()
+            response.content = make_jpeg(colors[url])
+            return response
+
+        mock_get.side_effect = fake_get
+
+        urls = list(colors.keys())
+        images = download_images(urls, max_workers=4)
+
+        # Asserts that there is exactly one image per URL, returned in the original URL order
+        self.assertEqual(len(images), len(urls))
+        for url, img in zip(urls, images):
+            r, g, b = img.convert('RGB').getpixel((32, 32))
+            expected_r, _, expected_b = colors[url]
+            self.assertAlmostEqual(r, expected_r, delta=8)
+            self.assertAlmostEqual(b, expected_b, delta=8)
+
+    @patch('app.utils.image_processing.client.get')
+    def test_download_images_handles_failures(self, mock_get):
+        def fake_get(url, timeout=None):
+            if url.endswith('bad'):
+                raise requests.ConnectionError('connection reset')
+
+            response = MagicMock()
+            response.content = make_jpeg((255, 0, 0))
+            return response
+
+        mock_get.side_effect = fake_get
+
+        images = download_images(['https://i.scdn.co/image/ok', 'https://i.scdn.co/image/bad', None], max_workers=2)
+
+        # Asserts that only the failed and missing URLs come back as None
+        self.assertIsNotNone(images[0])
+        self.assertIsNone(images[1])
+        self.assertIsNone(images[2])
+
+    def test_rgb_to_lab_batch_matches_scalar(self):
+        rng = np.random.default_rng(0)
+        rgb_colors = rng.integers(0, 256, size=(200, 3))
+
+        lab_colors = rgb_to_lab_batch(rgb_colors)
+
+        # Asserts that the single batch conversion gives the same LAB values as converting one color at a time
+        expected = np.array([rgb_to_lab(list(rgb_color)) for rgb_color in rgb_colors])
+        np.testing.assert_array_equal(lab_colors, expected)
+
+    def test_rgb_to_lab_numpy_matches_opencv(self):
+        # Asserts the LAB values of black, white, and middle gray, scaled like 8-bit OpenCV images
+        np.testing.assert_array_equal(
+            rgb_to_lab_numpy([(0, 0, 0), (255, 255, 255), (119, 119, 119)]),
+            [[0, 128, 128], [255, 128, 128], [128, 128, 128]]
+        )
+
+        # Asserts that rgb_to_lab_batch() falls back to the NumPy conversion without OpenCV
+        with patch.dict('app.utils.lazy._optional_modules', {'cv2': None}):
+            np.testing.assert_array_equal(rgb_to_lab_batch([(0, 0, 0), (255, 255, 255)]), [[0, 128, 128], [255, 128, 128]])
+
+        cv2 = optional_import('cv2')
+        if cv2 is None:
+            self.skipTest('OpenCV is not installed')
+
+        # Every 3rd value of each channel, plus the ends of the range
+        values = np.unique(np.append(np.arange(0, 256, 3), 255))
+        rgb_colors = np.stack(np.meshgrid(values, values, values, indexing='ij'), axis=-1).reshape(-1, 3).astype(np.uint8)
+
+        bgr_image = np.ascontiguousarray(rgb_colors[:, ::-1]).reshape(-1, 1, 3)
+        expected = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2LAB).reshape(-1, 3)
+
+        # Asserts that the NumPy conversion reproduces OpenCV's exactly
+        np.testing.assert_array_equal(rgb_to_lab_numpy(rgb_colors), expected)
+
+    def test_batch_kernels_match_scalar(self):
+        rng = np.random.default_rng(1)
+        feature_matrix = rng.integers(0, 256, size=(50, 9)).astype(np.float32)
+        reference_vector = feature_matrix[0]
+
+        distances = lab_color_distances(reference_vector, feature_matrix)
+        similarities = cosine_similarities(reference_vector, feature_matrix)
+
+        # Asserts that each batch result matches the scalar function applied to that row
+        for i, row in enumerate(feature_matrix):
+            self.assertAlmostEqual(distances[i], lab_color_distance(reference_vector, row), places=9)
+            similarity = np.dot(reference_vector, row) / (np.linalg.norm(reference_vector) * np.linalg.norm(row))
+            self.assertAlmostEqual(similarities[i], similarity, places=6)
+
+    def test_dominant_color_engines(self):
+        # 60% red, 30% blue, 10% green, saved as a PNG so that the colors are exact
+        img = Image.new('RGB', (100, 100), (220, 30, 30))
+        img.paste((30, 30, 220), (60, 0, 90, 100))
+        img.paste((30, 200, 30), (90, 0, 100, 100))
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+
+        for engine, get_colors in DOMINANT_COLOR_ENGINES.items():
+            colors = get_colors(Image.open(BytesIO(buffer.getvalue())), palette_size=16, top_colors=3)
+
+            # Asserts that the colors come back most dominant first, close to the colors drawn
+            expected = [(220, 30, 30), (30, 30, 220), (30, 200, 30)]
+            self.assertEqual(len(colors), 3, engine)
+            for color, expected_color in zip(colors, expected):
+                np.testing.assert_allclose(color, expected_color, atol=4, err_msg=engine)
+
+        with self.assertRaises(ValueError):
+            get_color_vector(img, engine='median_cut')
+
+
+if __name__ == '__main__':
+    unittest.main()
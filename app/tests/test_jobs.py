@@ -0,0 +1,138 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the background job execution in utils/jobs.py and the sorting job routes
+
+Functions:
+- setUp(self): Creates a new Flask app instance for testing with its caches in a temporary directory and a dummy
+access token in the session
+
+- tearDown(self): Removes the temporary directory
+
+- wait_for(self, job): Helper that blocks until a job has finished, failing the test after a few seconds
+
+- test_job_reports_progress_and_result(self): Tests that a job's stage, progress, and result are recorded
+Successful test on a finished job with 100% progress and the return value of its function as the result
+
+- test_running_job_is_deduplicated(self): Tests that submitting a job for a key that is already running
+returns the running job instead of starting another one
+Successful test on both submissions returning the same job and the function only running once
+
+- test_failed_jobs(self): Tests that raising, or returning an error status, marks the job as failed
+Successful test on both jobs being failed with their error message recorded
+
+- test_sort_playlist_route_starts_job(self, mock_run_sort_job): Tests that the '/sort_playlist' route
+returns a job ID right away and that '/sort_status' reports the job
+Successful test on a 202 response with a job ID, and a 404 response for unknown job IDs
+'''
+
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from app.tests.helpers import create_test_app
+from app.utils.jobs import JobManager
+
+class TestJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_test_app(self.tmp_dir)
+        self.app.config['SECRET_KEY'] = 'dummy_secret_key'
+        self.client = self.app.test_client()
+
+        with self.client.session_transaction() as session:
+            session['access_token'] = 'dummy_access_token'
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def wait_for(self, job):
+        deadline = time.time() + 5
+        while not job.finished:
+            self.assertLess(time.time(), deadline, 'Job did not finish in time')
+            time.sleep(0.01)
+
+    def test_job_reports_progress_and_result(self):
+        jobs = JobManager(self.app, max_workers=1)
+
+        def func(job, value):
+            job.update('working', 50)
+            return {'status': 'success', 'value': value}
+
+        job = jobs.submit('playlist', func, 42)
+        self.wait_for(job)
+
+        # Asserts that the finished job reports full progress and the function's result
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.result['value'], 42)
+        self.assertIs(jobs.get(job.id), job)
+
+    def test_running_job_is_deduplicated(self):
+        jobs = JobManager(self.app, max_workers=2)
+        release = threading.Event()
+        calls = []
+
+        def func(job):
+            calls.append(job.id)
+            release.wait(5)
+
+        first = jobs.submit('playlist', func)
+        second = jobs.submit('playlist', func)
+        release.set()
+        self.wait_for(first)
+
+        # Asserts that the second click on the same playlist joined the running job
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(jobs.active_count(), 0)
+
+    def test_failed_jobs(self):
+        jobs = JobManager(self.app, max_workers=2)
+
+        def raises(job):
+            raise RuntimeError('boom')
+
+        def returns_error(job):
+            return {'status': 'error', 'message': 'Failed to update playlist'}
+
+        raised = jobs.submit('a', raises)
+        errored = jobs.submit('b', returns_error)
+        self.wait_for(raised)
+        self.wait_for(errored)
+
+        # Asserts that both kinds of failure are reported with their message
+        self.assertEqual((raised.status, raised.error), ('failed', 'boom'))
+        self.assertEqual((errored.status, errored.error), ('failed', 'Failed to update playlist'))
+
+    @patch('app.routes.sorting.run_sort_job')
+    def test_sort_playlist_route_starts_job(self, mock_run_sort_job):
+        mock_run_sort_job.return_value = {'status': 'success', 'message': 'Playlist sorted successfully'}
+
+        response = self.client.get('/sort_playlist/dummy_playlist_id')
+
+        # Asserts that the route returns a job ID right away instead of waiting for the sort
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+
+        self.wait_for(self.app.extensions['sort_jobs'].get(job_id))
+        status = self.client.get(f'/sort_status/{job_id}').get_json()
+
+        # Asserts that the status route reports the finished job and its result
+        self.assertEqual(status['status'], 'succeeded')
+        self.assertEqual(status['result']['message'], 'Playlist sorted successfully')
+        mock_run_sort_job.assert_called_once()
+
+        # Asserts that unknown job IDs are a 404
+        self.assertEqual(self.client.get('/sort_status/unknown').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
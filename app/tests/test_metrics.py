@@ -0,0 +1,107 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the metrics in utils/metrics.py and the '/metrics' route
+
+Functions:
+- setUp(self): Creates a new Flask app instance for testing with its caches in a temporary directory
+
+- tearDown(self): Removes the temporary directory
+
+- test_endpoint_label(self): Tests that IDs in request URLs are replaced so requests are grouped by endpoint
+Successful test on playlist and image IDs being replaced by '{id}'
+
+- test_histogram_render(self): Tests that a histogram renders cumulative buckets, a sum, and a count
+Successful test on the expected Prometheus text exposition lines
+
+- test_metrics_route(self, mock_request): Tests that responses, retries, cache lookups, and finished sorts
+recorded while the app runs are reported on the '/metrics' route
+Successful test on a 200 response containing every recorded metric
+'''
+
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+from app.tests.helpers import create_test_app
+from app.utils.metrics import MetricsRegistry, endpoint_label
+
+def make_response(status_code, headers=None, content=b''):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.content = content
+    return response
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_test_app(self.tmp_dir)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_endpoint_label(self):
+        self.assertEqual(endpoint_label('https://api.spotify.com/v1/playlists/37i9dQZF/tracks?offset=100'), '/v1/playlists/{id}/tracks')
+        self.assertEqual(endpoint_label('https://api.spotify.com/v1/me/playlists'), '/v1/me/playlists')
+        self.assertEqual(endpoint_label('https://i.scdn.co/image/ab67616d00001e02'), '/image/{id}')
+
+    def test_histogram_render(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram('test_seconds', 'A test histogram', ['stage'], buckets=(1, 5))
+
+        histogram.observe(0.5, stage='listing')
+        histogram.observe(3, stage='listing')
+        histogram.observe(10, stage='listing')
+
+        lines = registry.render().splitlines()
+
+        # Asserts that buckets are cumulative and end with +Inf, followed by the sum and count of observations
+        self.assertEqual(lines, [
+            '# HELP color_sorter_test_seconds A test histogram',
+            '# TYPE color_sorter_test_seconds histogram',
+            'color_sorter_test_seconds_bucket{stage="listing",le="1.0"} 1',
+            'color_sorter_test_seconds_bucket{stage="listing",le="5.0"} 2',
+            'color_sorter_test_seconds_bucket{stage="listing",le="+Inf"} 3',
+            'color_sorter_test_seconds_sum{stage="listing"} 13.5',
+            'color_sorter_test_seconds_count{stage="listing"} 3',
+        ])
+
+    @patch('app.api.client.time.sleep')
+    def test_metrics_route(self, mock_sleep):
+        http = self.app.extensions['http_client']
+        http.session.request = MagicMock(side_effect=[
+            make_response(429, {'Retry-After': '0.01'}),
+            make_response(200, {'Content-Type': 'application/json'}),
+            make_response(200, {'Content-Type': 'image/jpeg'}, content=b'x' * 1234)
+        ])
+
+        http.request('GET', 'https://api.spotify.com/v1/playlists/abc/tracks')
+        http.request('GET', 'https://i.scdn.co/image/abc')
+
+        self.app.extensions['response_cache'].get(('me', 'dummy_access_token'))
+        self.app.extensions['metrics'].observe_sort('success', {
+            'num_tracks': 100, 'timings': {'listing': 0.5, 'ordering': 0.5}
+        })
+
+        response = self.client.get('/metrics')
+        body = response.get_data(as_text=True)
+
+        # Asserts that every kind of metric recorded above is reported
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('color_sorter_api_throttled_total{method="GET",endpoint="/v1/playlists/{id}/tracks"} 1', body)
+        self.assertIn('color_sorter_api_retries_total{method="GET",endpoint="/v1/playlists/{id}/tracks",reason="429"} 1', body)
+        self.assertIn('color_sorter_image_bytes_downloaded_total 1234', body)
+        self.assertIn('color_sorter_cache_requests_total{cache="response",result="miss"} 1', body)
+        self.assertIn('color_sorter_sort_stage_seconds_count{stage="ordering"} 1', body)
+        self.assertIn('color_sorter_sort_tracks_per_second_sum 100.0', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the ordering strategies in utils/ordering.py
+
+Functions:
+- make_features(num_tracks, seed): Helper that returns a random (N x 9) feature matrix of LAB-like values
+
+- test_strategies_return_permutations(self): Tests that every strategy returns each track exactly once
+Successful test on every strategy's order being a permutation of the feature matrix rows
+
+- test_reference_matches_original_sort(self): Tests that the 'reference' strategy matches the original
+sort of tracks by descending cosine similarity to the first track
+Successful test on identical orders
+
+- test_color_path_is_smoother(self): Tests that the 'path' strategy gives a shorter color path than the
+'reference' strategy, and that 2-opt never makes the nearest-neighbor chain longer
+Successful test on path lengths decreasing from 'reference' to nearest-neighbor to 2-opt
+
+- test_insert_into_path(self): Tests that new tracks are inserted where they lengthen the path the least
+Successful test on the existing path keeping its order, and a track between two neighbors landing between them
+
+- test_hilbert_index(self): Tests that consecutive positions along the Hilbert curve are neighboring grid cells
+Successful test on every cell of 2-D and 3-D grids getting a distinct index, one step apart from the next cell
+
+- test_fast_strategies_are_smoother_than_random(self): Tests the 'hilbert', 'hue', and 'pca' strategies on
+random colors
+Successful test on each giving a shorter color path than a random order of the same tracks
+
+- test_fast_strategies_follow_gradients(self): Tests the 'hue' and 'pca' strategies on shuffled color gradients
+Successful test on 'pca' recovering a gradient between two colors, and 'hue' ordering by hue angle with grays first
+
+- test_unknown_strategy(self): Tests that an unknown strategy name raises a ValueError
+Successful test on the ValueError being raised
+'''
+
+import unittest
+from itertools import product
+
+import numpy as np
+
+from app.utils.ordering import (
+    ORDERING_STRATEGIES, order_features, nearest_neighbor_path, two_opt, path_length, insert_into_path, hilbert_index
+)
+
+def make_features(num_tracks, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 255, size=(num_tracks, 9)).astype(np.float32)
+
+class TestOrdering(unittest.TestCase):
+
+    def test_strategies_return_permutations(self):
+        features = make_features(200)
+
+        for strategy in ORDERING_STRATEGIES:
+            order = order_features(features, strategy=strategy, time_budget=0.5)
+
+            # Asserts that no track is dropped or repeated
+            self.assertEqual(sorted(order.tolist()), list(range(200)), strategy)
+
+    def test_reference_matches_original_sort(self):
+        features = make_features(100, seed=1)
+
+        order = order_features(features, strategy='reference')
+
+        norms = np.linalg.norm(features, axis=1)
+        expected = sorted(
+            range(len(features)),
+            key=lambda i: np.dot(features[0], features[i]) / (norms[0] * norms[i]),
+            reverse=True
+        )
+        self.assertEqual(order.tolist(), expected)
+
+    def test_color_path_is_smoother(self):
+        features = make_features(300, seed=2)
+
+        reference_length = path_length(features, order_features(features, strategy='reference'))
+        chain = nearest_neighbor_path(features)
+        chain_length = path_length(features, chain)
+        refined_length = path_length(features, two_opt(features, chain, time_budget=2.0))
+
+        # Asserts that each step of the path engine shortens the total color distance along the playlist
+        self.assertLess(chain_length, reference_length)
+        self.assertLessEqual(refined_length, chain_length)
+
+    def test_insert_into_path(self):
+        path_features = np.array([[0.0] * 9, [10.0] * 9, [20.0] * 9], dtype=np.float32)
+        new_features = np.array([[15.0] * 9, [-5.0] * 9], dtype=np.float32)
+
+        order = insert_into_path(path_features, new_features)
+
+        # Asserts that the existing tracks keep their order, with each new track next to its closest colors
+        self.assertEqual(order.tolist(), [4, 0, 1, 3, 2])
+
+        # Asserts that inserting into an empty path keeps the new tracks
+        self.assertEqual(sorted(insert_into_path(np.empty((0, 9)), new_features).tolist()), [0, 1])
+
+    def test_hilbert_index(self):
+        for num_dims, bits in [(2, 3), (3, 4)]:
+            cells = np.array(list(product(range(1 << bits), repeat=num_dims)))
+            index = hilbert_index(cells, bits)
+
+            self.assertEqual(sorted(index.tolist()), list(range(len(cells))))
+
+            # Asserts that each cell along the curve differs from the previous one by a single step on one axis
+            steps = np.abs(np.diff(cells[np.argsort(index)], axis=0)).sum(axis=1)
+            self.assertTrue(np.all(steps == 1))
+
+    def test_fast_strategies_are_smoother_than_random(self):
+        features = make_features(1000, seed=3)
+        random_length = path_length(features, np.random.default_rng(3).permutation(len(features)))
+
+        for strategy in ['hilbert', 'hue', 'pca']:
+            self.assertLess(path_length(features, order_features(features, strategy=strategy)), random_length, strategy)
+
+    def test_fast_strategies_follow_gradients(self):
+        rng = np.random.default_rng(4)
+        shuffled = rng.permutation(50)
+
+        # A gradient from dark blue to light yellow, in the 9-D layout of three LAB colors
+        steps = np.linspace(0, 1, 50)[:, None]
+        gradient = np.tile((1 - steps) * [40, 150, 60] + steps * [220, 120, 200], 3).astype(np.float32)
+
+        order = shuffled[order_features(gradient[shuffled], strategy='pca')]
+        self.assertIn(order.tolist(), [list(range(50)), list(range(50))[::-1]])
+
+        # Hue angles of 0, 90, 180, and 270 degrees around the a-b plane, and a gray
+        colors = np.array([[128, 128, 128], [100, 128, 178], [100, 78, 128], [100, 128, 78], [100, 178, 128]])
+        order = order_features(np.tile(colors, 3).astype(np.float32), strategy='hue')
+        self.assertEqual(order.tolist(), [0, 4, 1, 2, 3])
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            order_features(make_features(10), strategy='alphabetical')
+
+
+if __name__ == '__main__':
+    unittest.main()
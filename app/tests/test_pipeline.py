@@ -0,0 +1,143 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the streaming color feature pipeline in utils/pipeline.py
+
+Functions:
+- setUp(self): Creates mock album covers keyed by URL, and counts downloads per URL
+
+- test_matches_batch_extraction(self, mock_download): Tests that streamed vectors match extracting every cover at once
+Successful test on identical vectors, each distinct cover downloaded once across batches, and failed covers left out
+
+- test_memory_is_bounded(self, mock_download, mock_extract): Tests that slow extraction holds back the downloaders
+Successful test on the number of downloaded covers waiting to be extracted never exceeding the queue bounds
+
+- test_overlaps_listing(self, mock_download): Tests that covers of the first batch are extracted before the next
+batch is produced
+Successful test on the producer seeing a finished cover while it is still producing
+
+- test_errors_propagate(self, mock_download): Tests that a failure in extraction or in the producer is raised
+in the caller
+Successful test on the original exceptions being raised, without the pipeline hanging
+'''
+
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from app.utils.extraction import extract_color_vectors
+from app.utils.pipeline import stream_color_features
+from app.tests.helpers import make_jpeg
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.covers = {
+            f'http://example.com/{i}.jpg': make_jpeg((i * 7 % 256, 100, 255 - i * 7 % 256), size=(32, 32))
+            for i in range(40)
+        }
+        self.downloads = {}
+        self.lock = threading.Lock()
+
+    def download(self, image_url):
+        with self.lock:
+            self.downloads[image_url] = self.downloads.get(image_url, 0) + 1
+
+        if image_url not in self.covers:
+            raise OSError('Not found')
+
+        return self.covers[image_url]
+
+    @patch('app.utils.pipeline.download_image_bytes')
+    def test_matches_batch_extraction(self, mock_download):
+        mock_download.side_effect = self.download
+        urls = list(self.covers)
+
+        # Overlapping batches, plus a repeated URL, a missing cover, and an empty URL
+        batches = [urls[:25], urls[20:] + [urls[0], 'http://example.com/missing.jpg', None]]
+        features = stream_color_features(batches, max_workers=3, queue_size=4, batch_size=5)
+
+        expected = dict(zip(urls, extract_color_vectors([self.covers[url] for url in urls])))
+        self.assertEqual(set(features), set(urls))
+        for url in urls:
+            np.testing.assert_array_equal(features[url], expected[url])
+
+        self.assertTrue(all(count == 1 for count in self.downloads.values()))
+        self.assertIn('http://example.com/missing.jpg', self.downloads)
+
+    @patch('app.utils.pipeline.extract_color_vectors')
+    @patch('app.utils.pipeline.download_image_bytes')
+    def test_memory_is_bounded(self, mock_download, mock_extract):
+        in_flight = [0]
+        max_in_flight = [0]
+
+        def download(image_url):
+            data = self.download(image_url)
+            with self.lock:
+                in_flight[0] += 1
+                max_in_flight[0] = max(max_in_flight[0], in_flight[0])
+            return data
+
+        def extract(images_bytes, **kwargs):
+            # Extraction is the slow stage, so downloaded covers would pile up without the bounded queues
+            threading.Event().wait(0.01)
+            with self.lock:
+                in_flight[0] -= len(images_bytes)
+            return [np.zeros(9, dtype=np.float32) for _ in images_bytes]
+
+        mock_download.side_effect = download
+        mock_extract.side_effect = extract
+
+        queue_size, max_workers, batch_size = 4, 2, 2
+        features = stream_color_features(
+            [list(self.covers)], max_workers=max_workers, queue_size=queue_size, batch_size=batch_size
+        )
+
+        # Covers in the queue, one held by each downloader waiting to put it, and one batch being extracted
+        self.assertEqual(len(features), len(self.covers))
+        self.assertLessEqual(max_in_flight[0], queue_size + max_workers + batch_size)
+
+    @patch('app.utils.pipeline.download_image_bytes')
+    def test_overlaps_listing(self, mock_download):
+        mock_download.side_effect = self.download
+        urls = list(self.covers)
+        first_done = threading.Event()
+
+        def batches():
+            yield urls[:10]
+            # The next page only "arrives" once a cover of the first one is done, or after a timeout
+            first_done.wait(timeout=5)
+            yield urls[10:]
+
+        def progress(done, total):
+            first_done.set()
+
+        features = stream_color_features(batches(), max_workers=2, progress=progress)
+
+        self.assertTrue(first_done.is_set())
+        self.assertEqual(len(features), len(urls))
+
+    @patch('app.utils.pipeline.download_image_bytes')
+    def test_errors_propagate(self, mock_download):
+        mock_download.side_effect = self.download
+        urls = list(self.covers)
+
+        with patch('app.utils.pipeline.extract_color_vectors', side_effect=RuntimeError('extraction failed')):
+            with self.assertRaisesRegex(RuntimeError, 'extraction failed'):
+                stream_color_features([urls], max_workers=2, queue_size=2)
+
+        def batches():
+            yield urls[:10]
+            raise ValueError('listing failed')
+
+        with self.assertRaisesRegex(ValueError, 'listing failed'):
+            stream_color_features(batches(), max_workers=2, queue_size=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
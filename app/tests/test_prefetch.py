@@ -0,0 +1,137 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the speculative warm-up in utils/prefetch.py, against the local Spotify stand-in
+in benchmarks/mock_spotify.py
+
+Functions:
+- setUp(self): Starts the local Spotify stand-in with one playlist, and creates an app talking to it with its
+caches in a temporary directory
+
+- tearDown(self): Stops the local Spotify stand-in and removes the temporary directory
+
+- run_warm_up(self, prefetcher): Helper that starts a warm-up of the user's playlists and blocks until it is done
+
+- test_warm_up_caches_covers(self): Tests that a warm-up processes every cover of the playlist ahead of its sort
+Successful test on every distinct cover downloaded once by the warm-up, and none by the sort that follows
+
+- test_budget(self): Tests that a warm-up stops at the user's cover budget
+Successful test on only 'cover_budget' covers being downloaded, even after a second warm-up in the same window
+
+- test_yields_to_sort_jobs(self): Tests that a warm-up waits while a sorting job is running
+Successful test on nothing being downloaded until the running job has finished
+
+- test_skips_sorted_playlists(self): Tests that playlists sorted at their current snapshot are not warmed up
+Successful test on only the changed playlist being picked
+'''
+
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from app.api.spotify import get_owned_playlists
+from app.routes.sorting import run_sort_job
+from app.utils.jobs import Job
+from app.utils.prefetch import Prefetcher
+from app.utils.sort_state import SortState
+from benchmarks.mock_spotify import MockSpotify
+from benchmarks.run_benchmarks import create_benchmark_app
+
+ACCESS_TOKEN = 'dummy_access_token'
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = MockSpotify().start()
+        self.mock.add_playlist('warm', num_tracks=30, tracks_per_cover=1.5, seed=5)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_benchmark_app(self.mock, self.tmp_dir)
+
+    def tearDown(self):
+        self.mock.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def run_warm_up(self, prefetcher):
+        with self.app.app_context():
+            playlists = get_owned_playlists(ACCESS_TOKEN)
+
+        self.assertTrue(prefetcher.submit('user', ACCESS_TOKEN, playlists))
+
+        deadline = time.time() + 10
+        while prefetcher._active:
+            self.assertLess(time.time(), deadline, 'Warm-up did not finish in time')
+            time.sleep(0.01)
+
+    def test_warm_up_caches_covers(self):
+        prefetcher = Prefetcher(self.app, self.app.extensions['sort_jobs'], cover_budget=1000, poll_interval=0.01)
+        self.run_warm_up(prefetcher)
+        num_covers = len(self.mock._covers_in_use())
+
+        # Asserts that the warm-up processed every distinct cover of the playlist
+        self.assertEqual(self.mock.request_counts[('GET', 'image')], num_covers)
+
+        with self.app.app_context():
+            result = run_sort_job(Job('sort_job', 'warm'), ACCESS_TOKEN, 'warm')
+
+        # Asserts that the sort found every cover in the feature cache
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(self.mock.request_counts[('GET', 'image')], num_covers)
+
+    def test_budget(self):
+        prefetcher = Prefetcher(
+            self.app, self.app.extensions['sort_jobs'], cover_budget=10, batch_size=4, poll_interval=0.01
+        )
+        self.run_warm_up(prefetcher)
+        self.run_warm_up(prefetcher)
+
+        # Asserts that both warm-ups together stayed within the budget
+        self.assertEqual(self.mock.request_counts[('GET', 'image')], 10)
+        self.assertEqual(prefetcher.spend('user', 1), 0)
+        self.assertEqual(prefetcher.spend('other_user', 1), 1)
+
+    def test_yields_to_sort_jobs(self):
+        jobs = self.app.extensions['sort_jobs']
+        prefetcher = Prefetcher(self.app, jobs, cover_budget=1000, poll_interval=0.01)
+        release = threading.Event()
+
+        job = jobs.submit('running_sort', lambda job: release.wait(5))
+        warm_up = threading.Thread(target=self.run_warm_up, args=(prefetcher,))
+        warm_up.start()
+
+        # Asserts that nothing is downloaded while the sort is running
+        time.sleep(0.3)
+        self.assertEqual(self.mock.request_counts[('GET', 'image')], 0)
+
+        release.set()
+        warm_up.join()
+
+        self.assertTrue(job.finished)
+        self.assertEqual(self.mock.request_counts[('GET', 'image')], len(self.mock._covers_in_use()))
+
+    def test_skips_sorted_playlists(self):
+        self.mock.add_playlist('sorted', num_tracks=10, seed=6)
+        prefetcher = Prefetcher(self.app, self.app.extensions['sort_jobs'])
+
+        with self.app.app_context():
+            playlists = get_owned_playlists(ACCESS_TOKEN)
+            self.app.extensions['sort_state'].save(SortState(
+                playlist_id='sorted',
+                snapshot_id=playlists['sorted']['snapshot_id'],
+                strategy='reference',
+                feature_version=self.app.extensions['feature_cache'].version,
+                track_ids=[],
+                features=[]
+            ))
+
+            picked = prefetcher.pick_playlists(playlists)
+
+        self.assertEqual([details['playlist_id'] for details in picked], ['warm'])
+
+
+if __name__ == '__main__':
+    unittest.main()
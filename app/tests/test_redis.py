@@ -0,0 +1,199 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the optional Redis tier in utils/shared_cache.py and api/tokens.py.
+They run against fakeredis if it is installed (see requirements-dev.txt), or else against the Redis server at
+REDIS_TEST_URL (default redis://localhost:6379/15, which is flushed), and are skipped if neither is available
+
+Functions:
+- make_redis(): Helper that returns a Redis client for the tests, or None if there is none
+
+- setUp(self): Creates a Redis client and a temporary directory for each worker's SQLite feature cache
+
+- tearDown(self): Flushes Redis and removes the temporary directory
+
+- test_tiered_cache_shares_features(self): Tests that a vector stored by one worker is found by another
+Successful test on the hit coming from Redis, being copied into the second worker's local cache, and versions
+being kept apart
+
+- test_single_flight(self): Tests that a lock can only be held by one worker at a time
+Successful test on the second worker only getting the keys the first did not take, until they are released
+
+- test_concurrent_sorts_compute_each_cover_once(self, mock_download): Runs two pipelines with the same covers at once,
+as two workers sharing Redis
+Successful test on each cover downloaded only once across both, and both getting every vector
+
+- test_token_store_refresh(self): Tests that expiring access tokens are renewed with the refresh token
+Successful test on a fresh token being returned as is, an expiring one being renewed once, the refresh token being
+kept when Spotify does not send a new one, and unknown sessions returning None
+
+- test_callback_stores_tokens_server_side(self, mock_post): Tests the login callback with a token store configured
+Successful test on the session only holding a session ID, which the sorting routes resolve to the access token
+'''
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from flask import session
+
+from app import init_redis
+from app.api.tokens import TokenStore, get_access_token
+from app.utils.feature_cache import FeatureCache
+from app.utils.pipeline import stream_color_features
+from app.utils.shared_cache import RedisFeatureCache, TieredFeatureCache, SingleFlight
+from app.tests.helpers import create_test_app, make_jpeg
+
+def make_redis():
+    try:
+        import fakeredis
+        return fakeredis.FakeRedis()
+    except ImportError:
+        pass
+
+    import redis
+    client = redis.Redis.from_url(os.getenv('REDIS_TEST_URL', 'redis://localhost:6379/15'))
+    try:
+        client.ping()
+    except redis.RedisError:
+        return None
+
+    return client
+
+class TestRedis(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = make_redis()
+        if self.redis is None:
+            self.skipTest('Neither fakeredis nor a local Redis server is available')
+
+        self.redis.flushdb()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.redis.flushdb()
+        shutil.rmtree(self.tmp_dir)
+
+    def make_cache(self, worker, version='v'):
+        local = FeatureCache(os.path.join(self.tmp_dir, f'{worker}.sqlite3'), version=version)
+        return TieredFeatureCache(local, RedisFeatureCache(self.redis, version=version, prefix='test'))
+
+    def test_tiered_cache_shares_features(self):
+        first, second = self.make_cache('first'), self.make_cache('second')
+        vector = np.arange(9, dtype=np.float32)
+
+        first.put_many({'cover_a': vector})
+        features = second.get_many(['cover_a', 'cover_b'])
+
+        # Asserts that the second worker finds the first worker's vector in Redis
+        np.testing.assert_array_equal(features['cover_a'], vector)
+        self.assertNotIn('cover_b', features)
+        self.assertEqual((second.hits, second.misses), (1, 1))
+        self.assertEqual(second.shared.hits, 1)
+
+        # Asserts that the vector was copied into the second worker's local cache
+        np.testing.assert_array_equal(second.local.get_many(['cover_a'])['cover_a'], vector)
+
+        # Asserts that a worker with other feature settings does not see it
+        self.assertEqual(self.make_cache('third', version='other').get_many(['cover_a']), {})
+
+    def test_single_flight(self):
+        first = SingleFlight(self.redis, prefix='test')
+        second = SingleFlight(self.redis, prefix='test')
+
+        self.assertEqual(first.acquire_many(['a', 'b']), {'a', 'b'})
+        self.assertEqual(second.acquire_many(['a', 'b', 'c']), {'c'})
+        self.assertEqual(first.held(['a', 'b', 'c', 'd']), {'a', 'b', 'c'})
+
+        first.release_many(['a'])
+        self.assertEqual(second.acquire_many(['a', 'b']), {'a'})
+
+    @patch('app.utils.pipeline.download_image_bytes')
+    def test_concurrent_sorts_compute_each_cover_once(self, mock_download):
+        covers = {f'http://example.com/{i}.jpg': make_jpeg((i * 9, 200 - i * 4, 90), size=(32, 32)) for i in range(24)}
+        downloads = []
+        lock = threading.Lock()
+
+        def download(image_url):
+            with lock:
+                downloads.append(image_url)
+            # Slow enough for both workers to need the same covers at the same time
+            threading.Event().wait(0.02)
+            return covers[image_url]
+
+        mock_download.side_effect = download
+        results = {}
+
+        def worker(name):
+            results[name] = stream_color_features(
+                [list(covers)],
+                cache=self.make_cache(name),
+                max_workers=2,
+                single_flight=SingleFlight(self.redis, prefix='test', poll_interval=0.01)
+            )
+
+        threads = [threading.Thread(target=worker, args=(name,)) for name in ['first', 'second']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Asserts that every cover was downloaded once, and that both workers got every vector
+        self.assertCountEqual(downloads, covers)
+        for name in ['first', 'second']:
+            self.assertEqual(set(results[name]), set(covers))
+
+    def test_token_store_refresh(self):
+        refreshes = []
+
+        def refresh(refresh_token):
+            refreshes.append(refresh_token)
+            return {'access_token': f'renewed_{len(refreshes)}', 'expires_in': 3600}
+
+        store = TokenStore(self.redis, refresh=refresh, prefix='test', single_flight=SingleFlight(self.redis, 'test'))
+
+        fresh_id = store.create({'access_token': 'fresh', 'refresh_token': 'r1', 'expires_in': 3600})
+        expiring_id = store.create({'access_token': 'expiring', 'refresh_token': 'r2', 'expires_in': 10})
+
+        self.assertEqual(store.get_access_token(fresh_id), 'fresh')
+        self.assertEqual(store.get_access_token(expiring_id), 'renewed_1')
+        self.assertEqual(store.get_access_token(expiring_id), 'renewed_1')
+        self.assertEqual(refreshes, ['r2'])
+
+        # Asserts that the refresh token is kept for the next renewal when Spotify did not send a new one
+        self.assertEqual(store._load(expiring_id)['refresh_token'], 'r2')
+
+        store.delete(fresh_id)
+        self.assertIsNone(store.get_access_token(fresh_id))
+        self.assertIsNone(store.get_access_token('unknown_session'))
+
+    @patch('app.routes.auth.client.post')
+    def test_callback_stores_tokens_server_side(self, mock_post):
+        app = create_test_app(self.tmp_dir)
+        app.config['SECRET_KEY'] = 'dummy_secret_key'
+        init_redis(app, self.redis)
+
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {
+            'access_token': 'dummy_access_token', 'refresh_token': 'dummy_refresh_token', 'expires_in': 3600
+        }
+
+        with app.test_client() as client:
+            response = client.get('/callback?code=dummy_code')
+
+            # Asserts that the cookie session only holds a session ID, resolved to the token from Redis
+            self.assertEqual(response.status_code, 302)
+            self.assertNotIn('access_token', session)
+            self.assertIn('session_id', session)
+            self.assertEqual(get_access_token(), 'dummy_access_token')
+
+
+if __name__ == '__main__':
+    unittest.main()
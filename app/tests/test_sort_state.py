@@ -0,0 +1,153 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the stored sort results in utils/sort_state.py and the incremental re-sort
+in routes/sorting.py
+
+Functions:
+- setUp(self): Creates a new Flask app instance for testing with a temporary feature cache and sort state store
+
+- tearDown(self): Deconstructs the test request context and removes the temporary directory
+
+- test_store_round_trip(self): Tests that a saved SortState loads back unchanged, and can be deleted
+Successful test on identical track IDs and memory-mapped features, only the latest state's files being kept
+after saving again, and None after deleting
+
+- test_incremental_resort(self, mock_get_color_features): Tests that re-sorting a playlist with a stored
+SortState only computes features for the added tracks
+Successful test on removed tracks being dropped, added tracks being inserted next to their closest colors,
+and only the added tracks' covers being processed
+
+- test_reuse_features(self, mock_get_color_features): Tests that sorting an unchanged playlist with another
+strategy reuses the stored features
+Successful test on no covers being processed, tracks without a cover kept at the end, and the new strategy
+ordering the tracks as it would from scratch
+
+- test_incremental_resort_falls_back(self, mock_get_color_features): Tests that a stored SortState is not
+used when the strategy changed or too much of the playlist changed
+Successful test on every cover being processed again
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from app.tests.helpers import create_test_app
+from app.routes.sorting import compute_sort
+from app.utils.sort_state import SortState, SortStateStore
+
+def fake_color_features(image_urls, **kwargs):
+    # Cover URLs in these tests are the color value itself, e.g. 'cover_15' -> [15, 15, ..., 15]
+    return [np.full(9, float(url.split('_')[1]), dtype=np.float32) for url in image_urls]
+
+class TestSortState(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_test_app(self.tmp_dir)
+        self.app.config['INCREMENTAL_MAX_CHANGE'] = 0.5
+        self.store = SortStateStore(self.tmp_dir)
+        self.ctx = self.app.test_request_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+        shutil.rmtree(self.tmp_dir)
+
+    def make_state(self, track_ids, colors, strategy='path'):
+        return SortState(
+            playlist_id='playlist',
+            snapshot_id='snapshot',
+            strategy=strategy,
+            feature_version=self.app.extensions['feature_cache'].version,
+            track_ids=track_ids,
+            features=np.array([[color] * 9 for color in colors], dtype=np.float32)
+        )
+
+    def test_store_round_trip(self):
+        state = self.make_state(['t1', 't2', 't3'], [0, 10, 20])
+        self.store.save(state)
+
+        loaded = self.store.load('playlist')
+
+        # Asserts that the stored order and features come back as they were saved
+        self.assertEqual(loaded.track_ids, ['t1', 't2', 't3'])
+        self.assertEqual(loaded.snapshot_id, 'snapshot')
+        np.testing.assert_array_equal(loaded.features, state.features)
+
+        # Asserts that the features are mapped from disk instead of read into memory
+        self.assertIsInstance(loaded.features, np.memmap)
+        self.assertEqual(loaded.features.dtype, np.float32)
+
+        # Asserts that saving again replaces the previous state's files
+        self.store.save(self.make_state(['t3', 't1'], [20, 0]))
+        self.assertEqual(self.store.load('playlist').track_ids, ['t3', 't1'])
+        self.assertEqual(len([name for name in os.listdir(self.tmp_dir) if name.endswith('.npy')]), 2)
+
+        self.store.delete('playlist')
+        self.assertIsNone(self.store.load('playlist'))
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    @patch('app.routes.sorting.get_color_features', side_effect=fake_color_features)
+    def test_incremental_resort(self, mock_get_color_features):
+        previous_state = self.make_state(['t1', 't2', 't3', 't4'], [0, 10, 20, 30])
+
+        # t3 was removed, and t5 was added with a color between t1 and t2
+        track_info = {'t1': 'cover_0', 't2': 'cover_10', 't4': 'cover_30', 't5': 'cover_5'}
+        stats = {}
+        sorted_track_ids, state_track_ids, state_features = compute_sort(
+            track_info, strategy='path', stats=stats, previous_state=previous_state
+        )
+
+        # Asserts that only the added track's cover was processed, and that it was inserted by color
+        mock_get_color_features.assert_called_once()
+        self.assertEqual(mock_get_color_features.call_args.args[0], ['cover_5'])
+        self.assertEqual(sorted_track_ids, ['t1', 't5', 't2', 't4'])
+        self.assertEqual(state_track_ids, sorted_track_ids)
+        self.assertEqual(state_features[:, 0].tolist(), [0, 5, 10, 30])
+        self.assertEqual((stats['incremental'], stats['num_added'], stats['num_removed']), (True, 1, 1))
+
+    @patch('app.routes.sorting.get_color_features', side_effect=fake_color_features)
+    def test_reuse_features(self, mock_get_color_features):
+        self.store.save(self.make_state(['t2', 't1', 't3'], [10, 5, 20]))
+        previous_state = self.store.load('playlist')
+
+        track_info = {'t1': 'cover_5', 't4': None, 't2': 'cover_10', 't3': 'cover_20'}
+        stats = {}
+        sorted_track_ids, state_track_ids, state_features = compute_sort(
+            track_info, strategy='reference', stats=stats, previous_state=previous_state
+        )
+
+        # Asserts that nothing was computed, and that 'reference' ordered by similarity to the first track (t1)
+        mock_get_color_features.assert_not_called()
+        self.assertTrue(stats['reused_features'])
+        self.assertEqual(sorted_track_ids, ['t1', 't2', 't3', 't4'])
+        self.assertEqual(state_features[:, 0].tolist(), [5, 10, 20])
+
+        # Asserts that the same sort from scratch gives the same order
+        self.assertEqual(compute_sort(track_info, strategy='reference')[0], sorted_track_ids)
+
+    @patch('app.routes.sorting.get_color_features', side_effect=fake_color_features)
+    def test_incremental_resort_falls_back(self, mock_get_color_features):
+        track_info = {'t1': 'cover_1', 't2': 'cover_10', 't3': 'cover_20', 't4': 'cover_30'}
+
+        # Different strategy than the stored sort
+        compute_sort(track_info, strategy='reference', previous_state=self.make_state(['t1', 't2', 't3'], [0, 10, 20]))
+        self.assertEqual(len(mock_get_color_features.call_args.args[0]), 4)
+
+        # Three out of four tracks changed
+        stats = {}
+        compute_sort(track_info, strategy='path', stats=stats, previous_state=self.make_state(['t1', 't9'], [0, 90]))
+        self.assertEqual(len(mock_get_color_features.call_args.args[0]), 4)
+        self.assertFalse(stats['incremental'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,280 @@
+'''
+Module: tests
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides unit tests for the sorting logic in routes/sorting.py
+
+Functions:
+- setUp(self): Creates a new Flask app instance for testing with a temporary feature cache and pushes a request context
+
+- tearDown(self): Deconstructs the test request context and removes the temporary feature cache
+
+- test_group_tracks_by_image(self): Tests the group_tracks_by_image() function
+Successful test on tracks sharing a cover URL being grouped together in playlist order
+
+- test_sort_tracks_dedups_covers(self, mock_get, mock_track_info):
+Tests that sort_tracks() downloads each distinct album cover only once
+Successful test on one download per distinct cover, every track in the result, and the reported dedup ratio
+
+- test_library_sort_shares_covers(self): Tests that run_library_sort_job() sorts every owned playlist against the
+local Spotify stand-in, with playlists sharing album covers
+Successful test on each distinct cover downloaded once across the library, every playlist written back with all of
+its tracks, and a second library sort re-sorting each playlist incrementally without downloading anything
+
+- test_preview_then_commit(self): Tests previewing a sort against the local Spotify stand-in, then committing it
+Successful test on the preview leaving the playlist as it was, a second preview coming from the cache, the commit
+writing the previewed order back without any downloads, and a later commit being refused since the playlist changed
+
+- test_partial_listing_is_not_written_back(self): Tests a sort of a playlist whose second page of tracks fails to load
+against the local Spotify stand-in
+Successful test on the sort raising IncompleteListingError, leaving the playlist and the response cache untouched
+
+- apply_moves(order, moves): Helper that applies reorder moves the way Spotify's reorder endpoint does
+
+- test_plan_reorder(self): Tests that the planned moves turn the current order into the target order
+Successful test on random shuffles being sorted, nearly sorted playlists needing a single move, and planning
+stopping with None once more than max_moves moves are needed
+
+- test_write_back_never_drops_tracks(self, mock_reorder, mock_replace, mock_snapshot_id): Tests the write-back of
+playlists that would need too many reorder moves
+Successful test on a playlist of distinct tracks being replaced once it needs more than REORDER_MOVE_FACTOR times the
+requests of replacing it, while one with local files or repeated tracks is reordered without a limit on moves, and
+fails instead of being replaced if it cannot be reordered
+
+- test_build_reorder_target(self): Tests that repeated tracks and local files keep their positions in the plan
+Successful test on repeated tracks grouped after their first occurrence, local files kept at the end,
+and None being returned when the sorted tracks do not match the playlist
+'''
+
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+from app.api import spotify
+from app.api.spotify import IncompleteListingError
+from app.routes.sorting import (
+    group_tracks_by_image, sort_tracks, plan_reorder, build_reorder_target, write_back_sort, run_library_sort_job,
+    run_sort_job, run_preview_job, run_commit_job, preview_key
+)
+from app.utils.jobs import Job
+from app.tests.helpers import create_test_app, make_jpeg
+from benchmarks.mock_spotify import MockSpotify
+from benchmarks.run_benchmarks import create_benchmark_app
+
+def apply_moves(order, moves):
+    order = list(order)
+    for range_start, insert_before, range_length in moves:
+        block = order[range_start:range_start + range_length]
+        del order[range_start:range_start + range_length]
+
+        # insert_before refers to a position in the playlist as it was before the block was removed
+        if insert_before > range_start:
+            insert_before -= range_length
+        order[insert_before:insert_before] = block
+
+    return order
+
+class TestSorting(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.app = create_test_app(self.tmp_dir)
+        self.ctx = self.app.test_request_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_group_tracks_by_image(self):
+        track_info = {'t1': 'cover_a', 't2': 'cover_b', 't3': 'cover_a', 't4': None}
+
+        tracks_by_image = group_tracks_by_image(track_info)
+
+        # Asserts that tracks from the same album are grouped under their shared cover
+        self.assertEqual(tracks_by_image, {'cover_a': ['t1', 't3'], 'cover_b': ['t2'], None: ['t4']})
+
+    @patch('app.routes.sorting.get_track_info')
+    @patch('app.utils.image_processing.client.get')
+    def test_sort_tracks_dedups_covers(self, mock_get, mock_track_info):
+        colors = {'cover_red': (255, 0, 0), 'cover_blue': (0, 0, 255)}
+        mock_track_info.return_value = {f't{i}': ('cover_red' if i % 2 else 'cover_blue') for i in range(10)}
+
+        def fake_get(url, timeout=None):
+            response = MagicMock()
+            response.content = make_jpeg(colors[url])
+            return response
+
+        mock_get.side_effect = fake_get
+
+        stats = {}
+        sorted_track_ids = sort_tracks('dummy_access_token', 'dummy_playlist_id', stats=stats)
+
+        # Asserts that each distinct cover was only downloaded once
+        self.assertEqual(mock_get.call_count, 2)
+
+        # Asserts that every track is still in the sorted result exactly once
+        self.assertCountEqual(sorted_track_ids, mock_track_info.return_value.keys())
+
+        # Asserts that the dedup ratio is reported as tracks per distinct cover
+        self.assertEqual(stats['dedup_ratio'], 5.0)
+
+    def test_library_sort_shares_covers(self):
+        with MockSpotify() as mock:
+            # The second playlist uses the covers of the first one, plus 10 of its own
+            mock.add_playlist('first', num_tracks=30, tracks_per_cover=1.5, seed=1, first_cover=0)
+            mock.add_playlist('second', num_tracks=40, tracks_per_cover=1.0, seed=2, first_cover=0)
+            app = create_benchmark_app(mock, self.tmp_dir)
+
+            with app.app_context():
+                result = run_library_sort_job(Job('library_job', 'library'), 'dummy_access_token')
+                num_downloads = mock.request_counts[('GET', 'image')]
+
+                # Nothing changed since, so the second sort extends the stored color paths without any downloads
+                second_result = run_library_sort_job(Job('second_library_job', 'library'), 'dummy_access_token')
+
+            final_orders = {playlist_id: mock.playlist_track_ids(playlist_id) for playlist_id in ['first', 'second']}
+
+        # Asserts that each of the 40 distinct covers was downloaded once for both playlists
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['stats']['num_covers'], 40)
+        self.assertEqual(num_downloads, 40)
+
+        # Asserts that every playlist was written back with all of its tracks
+        self.assertEqual([playlist['status'] for playlist in result['playlists']], ['success', 'success'])
+        self.assertCountEqual(final_orders['first'], [f'firstt{i}' for i in range(30)])
+        self.assertCountEqual(final_orders['second'], [f'secondt{i}' for i in range(40)])
+
+        self.assertEqual(second_result['status'], 'success')
+        self.assertTrue(all(playlist['incremental'] for playlist in second_result['playlists']))
+        self.assertEqual(mock.request_counts[('GET', 'image')], 40)
+
+    def test_preview_then_commit(self):
+        with MockSpotify() as mock:
+            mock.add_playlist('previewed', num_tracks=30, seed=3)
+            original_order = mock.playlist_track_ids('previewed')
+            app = create_benchmark_app(mock, self.tmp_dir)
+            app.config['SECRET_KEY'] = 'dummy_secret_key'
+
+            with app.app_context():
+                preview = run_preview_job(Job('preview_job', 'previewed'), 'dummy_access_token', 'previewed', 'path')
+                second_preview = run_preview_job(Job('second_preview_job', 'previewed'), 'dummy_access_token',
+                                                 'previewed', 'path')
+                num_downloads = mock.request_counts[('GET', 'image')]
+                previewed_order = mock.playlist_track_ids('previewed')
+
+                entry = app.extensions['sort_previews'].get(preview_key('previewed', preview['snapshot_id'], 'path'))
+                result = run_commit_job(Job('commit_job', 'previewed'), 'dummy_access_token', 'previewed', entry.value)
+                final_order = mock.playlist_track_ids('previewed')
+
+            with app.test_client() as client:
+                with client.session_transaction() as session:
+                    session['access_token'] = 'dummy_access_token'
+
+                stale_response = client.get('/commit_sort/previewed?strategy=path')
+
+        # Asserts that previewing does not change the playlist, and that an unchanged playlist is not sorted again
+        self.assertEqual(previewed_order, original_order)
+        self.assertFalse(preview['cached'])
+        self.assertTrue(second_preview['cached'])
+        self.assertEqual(second_preview['track_ids'], preview['track_ids'])
+        self.assertEqual(len(preview['color_strip']), 30)
+        self.assertTrue(all(color.startswith('#') and len(color) == 7 for color in preview['color_strip']))
+
+        # Asserts that the commit writes the previewed order without downloading anything again
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(final_order, preview['track_ids'])
+        self.assertEqual(mock.request_counts[('GET', 'image')], num_downloads)
+
+        # Asserts that the preview cannot be committed again once the playlist has changed
+        self.assertEqual(stale_response.status_code, 409)
+
+    def test_partial_listing_is_not_written_back(self):
+        get_json = spotify.get_json
+
+        def failing_get_json(url, headers, params=None, **kwargs):
+            if params and params.get('offset') == 100:
+                return 500, {'error': {'status': 500}}
+            return get_json(url, headers, params=params, **kwargs)
+
+        with MockSpotify() as mock:
+            mock.add_playlist('partial', num_tracks=250, seed=4)
+            original_order = mock.playlist_track_ids('partial')
+            app = create_benchmark_app(mock, self.tmp_dir)
+
+            with app.app_context(), patch('app.api.spotify.get_json', side_effect=failing_get_json):
+                with self.assertRaises(IncompleteListingError):
+                    run_sort_job(Job('sort_job', 'partial'), 'dummy_access_token', 'partial', 'reference')
+
+            final_order = mock.playlist_track_ids('partial')
+            cached_listings = [key for key in app.extensions['response_cache']._entries if key[0] == 'tracks']
+
+        # Asserts that nothing was written back, and that the partial listing was not cached under its snapshot
+        self.assertEqual(final_order, original_order)
+        self.assertEqual(mock.request_counts[('PUT', 'tracks')], 0)
+        self.assertEqual(mock.request_counts[('POST', 'tracks')], 0)
+        self.assertEqual(cached_listings, [])
+
+    def test_plan_reorder(self):
+        rng = random.Random(0)
+        for num_tracks in [0, 1, 2, 10, 200]:
+            current = list(range(num_tracks))
+            target = current[:]
+            rng.shuffle(target)
+
+            # Asserts that the moves sort any shuffled playlist
+            self.assertEqual(apply_moves(current, plan_reorder(current, target)), target)
+
+        # Asserts that moving one run of tracks elsewhere only takes one move, in either direction
+        current = list(range(100))
+        moved_up = current[40:50] + current[:40] + current[50:]
+        moved_down = current[10:] + current[:10]
+        self.assertEqual(len(plan_reorder(current, moved_up)), 1)
+        self.assertEqual(len(plan_reorder(current, moved_down)), 1)
+        self.assertEqual(plan_reorder(current, current), [])
+
+        # Asserts that planning gives up as soon as it needs more than max_moves moves
+        shuffled = current[:]
+        rng.shuffle(shuffled)
+        self.assertIsNone(plan_reorder(current, shuffled, max_moves=10))
+        self.assertEqual(len(plan_reorder(current, moved_up, max_moves=1)), 1)
+
+    @patch('app.routes.sorting.get_playlist_snapshot_id', return_value='snapshot_2')
+    @patch('app.routes.sorting.write_back_playlist', return_value={'status': 'success', 'message': 'Replaced'})
+    @patch('app.routes.sorting.reorder_playlist', return_value=None)
+    def test_write_back_never_drops_tracks(self, mock_reorder, mock_replace, mock_snapshot_id):
+        def write_back(current_track_ids):
+            return write_back_sort('dummy_access_token', 'dummy_playlist_id', current_track_ids, ['b', 'a'],
+                                   'snapshot_1', 'reference', ['b', 'a'], [[0.0] * 9, [1.0] * 9])
+
+        # Asserts that a playlist of distinct tracks needing too many moves is replaced
+        self.assertEqual(write_back(['a', 'b'])['status'], 'success')
+        self.assertEqual(mock_reorder.call_args.kwargs['max_moves'], 6)
+        self.assertEqual(mock_replace.call_count, 1)
+
+        # Asserts that playlists with local files or repeated tracks are reordered however many moves it takes,
+        # and never replaced
+        for current_track_ids in [['a', None, 'b'], ['a', 'b', 'a']]:
+            self.assertEqual(write_back(current_track_ids)['status'], 'error')
+            self.assertIsNone(mock_reorder.call_args.kwargs['max_moves'])
+            self.assertEqual(mock_replace.call_count, 1)
+
+    def test_build_reorder_target(self):
+        current_track_ids = ['a', None, 'b', 'a', 'c']
+
+        current_keys, target_keys = build_reorder_target(current_track_ids, ['c', 'a', 'b'])
+
+        # Asserts that every playlist position is kept, with repeats grouped and local files at the end
+        self.assertEqual(current_keys, [('a', 0), (None, 1), ('b', 0), ('a', 1), ('c', 0)])
+        self.assertEqual(target_keys, [('c', 0), ('a', 0), ('a', 1), ('b', 0), (None, 1)])
+
+        # Asserts that a sorted order missing a track of the playlist cannot be used for reordering
+        self.assertIsNone(build_reorder_target(current_track_ids, ['c', 'a']))
+
+
+if __name__ == '__main__':
+    unittest.main()
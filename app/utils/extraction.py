@@ -0,0 +1,160 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the execution of color extraction (JPEG decode, thumbnail, and palette quantization), which is
+CPU-bound and holds the GIL for most of its time, so on its own it keeps a single core busy however many covers a
+sort has. Extraction can optionally run on a pool of worker processes instead: compressed image bytes go in and
+compact float32 LAB vectors come out. Large batches of bytes are handed to the workers through a single shared
+memory block rather than pickled through the pool's pipes, so each cover is copied into the workers only once.
+
+Functions:
+- extract_color_vectors(images_bytes, palette_size, top_colors, engine): returns the LAB color vector of each of the
+compressed images passed as an argument, in the same order, computed in this process. Images that are missing
+or cannot be decoded for any reason (e.g. corrupt, truncated, or oversized images) are returned as None, so one
+bad cover never fails a whole sort. 'engine' names the dominant color engine (see utils/image_processing.py)
+
+Classes:
+- FeatureExtractor(max_workers, min_covers, shared_memory_min_bytes): runs color extraction on a process pool
+    - extract(images_bytes, palette_size, top_colors, engine): same as extract_color_vectors(). Batches with fewer than
+    'min_covers' images, and every batch if 'max_workers' is 0, are extracted in this process, since starting
+    and feeding the workers would cost more than it saves. Batches of at least 'shared_memory_min_bytes' bytes
+    are passed to the workers through shared memory
+    - shutdown(): stops the worker processes, if they were started
+'''
+
+import threading
+import multiprocessing
+
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+from .lazy import lazy_import
+from .image_processing import get_color_vector_from_bytes
+
+np = lazy_import('numpy')
+
+# Batches are split into this many chunks per worker, so that one slow chunk does not leave the others idle
+CHUNKS_PER_WORKER = 4
+
+def extract_color_vectors(images_bytes, palette_size=16, top_colors=3, engine='adaptive'):
+    vectors = []
+    for data in images_bytes:
+        if data is None:
+            vectors.append(None)
+            continue
+
+        try:
+            vectors.append(get_color_vector_from_bytes(
+                data, palette_size=palette_size, top_colors=top_colors, engine=engine
+            ))
+        except Exception as e:
+            # Besides OSError, decoding can raise DecompressionBombError, ValueError, or SyntaxError
+            print(f'Failed to process image: {e!r}')
+            vectors.append(None)
+
+    return vectors
+
+
+def _to_matrix(vectors, num_dimensions):
+    # A single (N x 9) float32 array pickles far smaller than N separate arrays.
+    # Rows of images that failed are NaN, and turned back into None by the parent process
+    matrix = np.full((len(vectors), num_dimensions), np.nan, dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        if vector is not None:
+            matrix[i] = vector
+
+    return matrix
+
+
+def _extract_chunk(images_bytes, palette_size, top_colors, engine):
+    vectors = extract_color_vectors(images_bytes, palette_size=palette_size, top_colors=top_colors, engine=engine)
+    return _to_matrix(vectors, 3 * top_colors)
+
+
+def _extract_shared_chunk(shm_name, spans, palette_size, top_colors, engine):
+    # Workers started with 'spawn' share the parent's resource tracker, so attaching here does not make the
+    # block outlive the parent, which unlinks it as soon as every chunk is done
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        images_bytes = [bytes(shm.buf[start:end]) if end > start else None for start, end in spans]
+    finally:
+        shm.close()
+
+    return _extract_chunk(images_bytes, palette_size, top_colors, engine)
+
+
+class FeatureExtractor:
+    def __init__(self, max_workers=0, min_covers=64, shared_memory_min_bytes=1 << 20):
+        self.max_workers = max_workers
+        self.min_covers = min_covers
+        self.shared_memory_min_bytes = shared_memory_min_bytes
+
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Started on first use, with 'spawn' since forking a process that is running request and job threads
+        # can copy locks held by those threads into the workers
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+
+            return self._executor
+
+    def _chunks(self, num_items):
+        num_chunks = min(num_items, self.max_workers * CHUNKS_PER_WORKER)
+        bounds = np.linspace(0, num_items, num_chunks + 1).astype(int)
+        return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+    def extract(self, images_bytes, palette_size=16, top_colors=3, engine='adaptive'):
+        images_bytes = list(images_bytes)
+        num_images = sum(1 for data in images_bytes if data is not None)
+
+        if self.max_workers <= 0 or num_images < self.min_covers:
+            return extract_color_vectors(images_bytes, palette_size=palette_size, top_colors=top_colors, engine=engine)
+
+        executor = self._get_executor()
+        total_bytes = sum(len(data) for data in images_bytes if data is not None)
+
+        shm = None
+        try:
+            if total_bytes >= self.shared_memory_min_bytes:
+                # Every image is copied once into one shared block, and workers are only sent (start, end) spans
+                shm = shared_memory.SharedMemory(create=True, size=total_bytes)
+                spans = []
+                offset = 0
+                for data in images_bytes:
+                    size = len(data) if data is not None else 0
+                    shm.buf[offset:offset + size] = data or b''
+                    spans.append((offset, offset + size))
+                    offset += size
+
+                futures = [
+                    executor.submit(_extract_shared_chunk, shm.name, spans[start:end], palette_size, top_colors, engine)
+                    for start, end in self._chunks(len(images_bytes))
+                ]
+            else:
+                futures = [
+                    executor.submit(_extract_chunk, images_bytes[start:end], palette_size, top_colors, engine)
+                    for start, end in self._chunks(len(images_bytes))
+                ]
+
+            matrix = np.concatenate([future.result() for future in futures])
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+        return [None if np.isnan(row[0]) else row for row in matrix]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,185 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides a persistent on-disk cache of album cover color features for use in sorting.
+Album cover URLs on Spotify's CDN never change, so the LAB color vector computed for a URL can be reused
+across sorts, playlists, and users. Entries are stored in SQLite and evicted in least-recently-used order.
+Several workers can share one database even with different feature versions (e.g. another COLOR_ENGINE), so entries
+of other versions are only pruned once they have not been used for 'stale_version_age' seconds, when the cache opens.
+
+Functions:
+- feature_version(palette_size, top_colors, engine): returns the version key for color vectors computed with the
+given settings. Changing any setting that affects the vectors changes the key, which invalidates old entries
+
+Classes:
+- FeatureCache(path, max_entries, version, stale_version_age): maps an image URL to its LAB color vector.
+The number of URLs looked up that were found and not found are counted in 'hits' and 'misses'
+    - get_many(image_urls): returns a dict of the cached vectors for the image URLs passed as an argument
+    - put_many(features): stores a dict of image URL -> vector, evicting the oldest entries past max_entries.
+    The number of entries is kept as a running estimate, so the table is only counted once it may be full
+    - clear(): removes every entry from the cache
+'''
+
+import os
+import time
+import sqlite3
+import threading
+
+from .lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# Bump this whenever the feature extraction itself changes in a way that makes old vectors incomparable
+FEATURE_ALGORITHM_VERSION = 2
+
+# Entries of other feature versions unused for this many seconds are pruned when the cache opens
+STALE_VERSION_AGE = 7 * 24 * 3600
+
+def feature_version(palette_size=16, top_colors=3, engine='adaptive'):
+    version = f'v{FEATURE_ALGORITHM_VERSION}:palette={palette_size}:top={top_colors}'
+
+    # Left out for the original engine, so that vectors cached before engines were selectable stay valid
+    if engine != 'adaptive':
+        version += f':engine={engine}'
+
+    return version
+
+
+class FeatureCache:
+    def __init__(self, path, max_entries=50000, version=None, stale_version_age=STALE_VERSION_AGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = version or feature_version()
+        self.stale_version_age = stale_version_age
+
+        # SQLite handles concurrent readers, but writes from the download threads are serialized here
+        self._write_lock = threading.Lock()
+        self._initialized = False
+
+        # Upper bound on the number of entries, counted exactly when the cache opens and whenever it may be full
+        self._num_entries = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        # A new connection per call keeps the cache safe to use from any worker thread
+        conn = sqlite3.connect(self.path, timeout=30)
+
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS features (
+                    url TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (url, version)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS features_last_access ON features (last_access)')
+
+            # Other versions may still be in use by other workers sharing the file, so only long unused ones go
+            conn.execute(
+                'DELETE FROM features WHERE version != ? AND last_access < ?',
+                [self.version, time.time() - self.stale_version_age]
+            )
+            conn.commit()
+
+            self._num_entries = conn.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+            self._initialized = True
+
+        return conn
+
+    def _ensure_directory(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+    def get_many(self, image_urls):
+        image_urls = list({url for url in image_urls if url})
+        if not image_urls:
+            return {}
+
+        self._ensure_directory()
+        features = {}
+
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                # SQLite limits the number of bound parameters per statement, so look up in chunks
+                for i in range(0, len(image_urls), 500):
+                    chunk = image_urls[i:i + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = conn.execute(
+                        f'SELECT url, vector FROM features WHERE version = ? AND url IN ({placeholders})',
+                        [self.version, *chunk]
+                    ).fetchall()
+
+                    for url, vector in rows:
+                        features[url] = np.frombuffer(vector, dtype=np.float32).copy()
+
+                # Refresh the access time of every hit so that eviction is least-recently-used
+                now = time.time()
+                conn.executemany(
+                    'UPDATE features SET last_access = ? WHERE url = ? AND version = ?',
+                    [(now, url, self.version) for url in features]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+            self.hits += len(features)
+            self.misses += len(image_urls) - len(features)
+
+        return features
+
+    def put_many(self, features):
+        if not features:
+            return
+
+        self._ensure_directory()
+        now = time.time()
+        rows = [
+            (url, self.version, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for url, vector in features.items() if url
+        ]
+
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO features (url, version, vector, last_access) VALUES (?, ?, ?, ?)',
+                    rows
+                )
+
+                # Replaced rows are counted as new ones too, so the estimate only ever overshoots, and the table
+                # is only counted (a full scan) once the estimate says it may be over max_entries
+                self._num_entries += len(rows)
+                if self._num_entries > self.max_entries:
+                    num_entries = conn.execute('SELECT COUNT(*) FROM features').fetchone()[0]
+                    if num_entries > self.max_entries:
+                        conn.execute(
+                            'DELETE FROM features WHERE rowid IN '
+                            '(SELECT rowid FROM features ORDER BY last_access ASC LIMIT ?)',
+                            [num_entries - self.max_entries]
+                        )
+                    self._num_entries = min(num_entries, self.max_entries)
+
+                conn.commit()
+            finally:
+                conn.close()
+
+    def clear(self):
+        self._ensure_directory()
+
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                conn.execute('DELETE FROM features')
+                conn.commit()
+                self._num_entries = 0
+            finally:
+                conn.close()
@@ -0,0 +1,45 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the feature extraction stage of sorting, turning album cover URLs into LAB color vectors.
+Vectors are read from the persistent feature cache when possible, and only the cache misses are downloaded
+and processed before being written back to the cache.
+
+Functions:
+- get_color_features(image_urls, cache, max_workers, palette_size, top_colors, progress, timings, extractor, engine,
+queue_size, single_flight): returns a list of the LAB color vectors for the image URLs passed as an argument, in the same order.
+Covers that could not be downloaded or processed are returned as None. If passed, progress(done, total) is called
+as covers are done, and the seconds spent downloading and extracting colors are added to the 'timings' dict.
+If a FeatureExtractor is passed (see utils/extraction.py), colors are extracted with it, e.g. on its pool of worker
+processes. 'engine' names the dominant color engine used (see DOMINANT_COLOR_ENGINES in utils/image_processing.py).
+The work runs through the streaming pipeline in utils/pipeline.py, holding at most about 2 * 'queue_size'
+downloaded covers in memory at once. If a SingleFlight is passed (see utils/shared_cache.py), covers that another
+worker is already computing are read from the shared cache once they are done instead of being computed again
+'''
+
+from .pipeline import stream_color_features
+
+def get_color_features(image_urls, cache=None, max_workers=8, palette_size=16, top_colors=3, progress=None,
+                       timings=None, extractor=None, engine='adaptive', queue_size=64, single_flight=None):
+    image_urls = list(image_urls)
+
+    # A single batch through the streaming pipeline, so downloading and extracting still overlap
+    # and only a bounded number of downloaded covers are held in memory at once
+    features = stream_color_features(
+        [image_urls],
+        cache=cache,
+        max_workers=max_workers,
+        palette_size=palette_size,
+        top_colors=top_colors,
+        engine=engine,
+        extractor=extractor,
+        queue_size=queue_size,
+        progress=progress,
+        timings=timings,
+        single_flight=single_flight
+    )
+
+    return [features.get(url) for url in image_urls]
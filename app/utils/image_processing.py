@@ -8,37 +8,158 @@ This file provides utility functions for image processing for use in sorting.
 It includes functions for extracting Image URLs and their dominant color, convert RGB to LAB, and calculate LAB color distance
 
 Functions:
+- download_image_bytes(image_url): returns the compressed bytes of the image at the URL passed as an argument
+
 - download_image(image_url): returns the PIL Image of the playlist image URL passed as an argument
 
+- download_images(image_urls, max_workers, progress): returns the PIL Images of all the image URLs passed as an argument,
+in the same order, downloading up to 'max_workers' of them concurrently. Failed downloads are returned as None.
+If passed, progress(done, total) is called after each download finishes
+
+- download_images_bytes(image_urls, max_workers, progress): same as download_images(), but returns the compressed
+bytes of each image without decoding them, e.g. to be decoded in another process
+
 - rgb_to_lab(rgb_color): returns the LAB color space equivalent to the RGB value passed as an argument
 
 - lab_color_distance(lab1, lab2): returns the linear distance between two LAB values in color space
 
-- get_dominant_color(image, palette_size): returns the RGB values of the dominant color in a given PIL Image 
+- rgb_to_lab_batch(rgb_colors): returns an (N x 3) array of the LAB equivalents of an (N x 3) array of RGB values,
+converted in a single call. Row i matches rgb_to_lab(rgb_colors[i]). Uses OpenCV if it is installed, and
+rgb_to_lab_numpy() otherwise
+
+- rgb_to_lab_numpy(rgb_colors): same as rgb_to_lab_batch(), in NumPy only. It reproduces the fixed-point arithmetic
+of OpenCV's 8-bit cv2.COLOR_BGR2LAB conversion, so it gives identical values for all 16.7 million RGB colors
+
+- lab_to_rgb_batch(lab_colors): returns an (N x 3) uint8 array of the RGB equivalents of an (N x 3) array of 8-bit
+LAB values as returned by rgb_to_lab_batch(), e.g. to show the colors of a sort. It is the inverse of the exact
+LAB formulas in floating point. 8-bit LAB is coarser than RGB for some saturated colors, so a round trip is close but
+not always exact
+
+- lab_color_distances(lab, lab_matrix): returns the linear distance from a LAB vector to every row of a matrix
+of LAB vectors (e.g. the N x 9 feature matrix of a playlist). Element i matches lab_color_distance(lab, lab_matrix[i])
+
+- cosine_similarities(vector, matrix): returns the cosine similarity between a vector and every row of a matrix.
+Element i matches the cosine similarity of the vector and matrix[i]
+
+- get_dominant_colors(image, palette_size, top_colors): returns the RGB values of the 'top_colors' most dominant colors
+in a given PIL Image, most dominant first, out of an adaptive palette of 'palette_size' colors (the 'adaptive' engine)
+
+- get_dominant_colors_histogram(image, palette_size, top_colors): same as get_dominant_colors(), from a 3-D histogram
+of a small downsample of the image with HISTOGRAM_BINS bins per channel. Each color is the mean of the pixels in one
+of the fullest bins, so 'palette_size' does not apply (the 'histogram' engine)
+
+- get_dominant_colors_kmeans(image, palette_size, top_colors): same as get_dominant_colors(), from a mini-batch k-means
+with 'palette_size' clusters over the LAB values of a small downsample of the image. Each color is the mean RGB
+value of the pixels in one of the largest clusters (the 'kmeans' engine)
+
+- get_color_vector(image, palette_size, top_colors, engine): returns the float32 LAB color vector of a given PIL Image,
+i.e. its 'top_colors' most dominant colors in LAB space concatenated together (9-D for the default of 3),
+found with the dominant color engine named by 'engine' (see DOMINANT_COLOR_ENGINES, default 'adaptive')
+
+- get_color_vector_from_bytes(data, palette_size, top_colors, engine): returns get_color_vector() of the compressed image bytes
 '''
 
-import cv2
 import requests
-import numpy as np
+import functools
+import threading
 
-from PIL import Image
+from ..api import client
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from .lazy import lazy_import, optional_import
+
+# Imported on first use, so that only processes that actually sort pay for loading them.
+# OpenCV is optional: without it, colors are converted to LAB by rgb_to_lab_numpy() instead, with the same results
+np = lazy_import('numpy')
+Image = lazy_import('PIL.Image')
+
+# Album covers are shrunk to fit in this size before color quantization
+THUMBNAIL_SIZE = (300, 300)
+
+# The histogram and k-means engines work on a much smaller downsample, since they look at every pixel in NumPy
+ENGINE_SAMPLE_SIZE = (64, 64)
+
+# Bins per RGB channel of the histogram engine, i.e. 8 x 8 x 8 = 512 bins of 32 values per channel
+HISTOGRAM_BINS = 8
+
+# Mini-batch k-means settings. The seed is fixed so that the same cover always gives the same colors
+KMEANS_BATCH_SIZE = 256
+KMEANS_ITERATIONS = 20
+KMEANS_SEED = 0
+
+# Fixed-point precision of OpenCV's 8-bit RGB -> LAB conversion, which rgb_to_lab_numpy() reproduces
+LAB_GAMMA_SHIFT = 3
+LAB_SHIFT = 12
+LAB_SHIFT2 = LAB_SHIFT + LAB_GAMMA_SHIFT
+
+# sRGB -> XYZ matrix and D65 white point, as used by OpenCV
+SRGB_TO_XYZ = ((0.412453, 0.357580, 0.180423), (0.212671, 0.715160, 0.072169), (0.019334, 0.119193, 0.950227))
+D65_WHITE = (0.950456, 1.0, 1.088754)
 
 # ---- IMAGE PROCESSING -----------------------------------------------
-def download_image(image_url):
-    response = requests.get(image_url)
+def download_image_bytes(image_url, timeout=10):
+    response = client.get(image_url, timeout=timeout)
+    response.raise_for_status()
 
-    img = Image.open(BytesIO(response.content))
+    return response.content
+
+
+def download_image(image_url, timeout=10):
+    img = Image.open(BytesIO(download_image_bytes(image_url, timeout=timeout)))
     return img
 
 
+def _try_download(image_url, download_func):
+    # A single bad cover (missing image, timeout, corrupt file) should never abort a whole sort
+    if not image_url:
+        return None
+
+    try:
+        return download_func(image_url)
+    except (requests.RequestException, OSError) as e:
+        print(f'Failed to download image {image_url}: {e}')
+        return None
+
+
+def download_images(image_urls, max_workers=8, progress=None):
+    return _download_all(image_urls, download_image, max_workers=max_workers, progress=progress)
+
+
+def download_images_bytes(image_urls, max_workers=8, progress=None):
+    return _download_all(image_urls, download_image_bytes, max_workers=max_workers, progress=progress)
+
+
+def _download_all(image_urls, download_func, max_workers=8, progress=None):
+    # executor.map() yields results in the order of image_urls regardless of completion order,
+    # so the output stays deterministic while at most max_workers downloads are in flight
+    image_urls = list(image_urls)
+    if not image_urls:
+        return []
+
+    num_done = 0
+    lock = threading.Lock()
+
+    def download(image_url):
+        nonlocal num_done
+        img = _try_download(image_url, download_func)
+
+        if progress is not None:
+            with lock:
+                num_done += 1
+                progress(num_done, len(image_urls))
+
+        return img
+
+    max_workers = max(1, min(max_workers, len(image_urls)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(client.bind_context(download), image_urls))
+
+
 # ---- COLOR PROCESSING -----------------------------------------------
 def rgb_to_lab(rgb_color):
     # INPUT rgb_color = tuple (R, G, B) each value in range [0, 255]
     # OUTPUT lab_color = NP array with 3 int elements [L, a, b] in LAB space
-    bgr_color = rgb_color[::-1]
-
-    lab_color = cv2.cvtColor(np.uint8([[bgr_color]]), cv2.COLOR_BGR2LAB)[0][0]
+    lab_color = rgb_to_lab_batch([rgb_color])[0]
     return lab_color
 
 
@@ -49,8 +170,111 @@ def lab_color_distance(lab1, lab2):
     return np.sqrt(np.sum((lab1 - lab2) ** 2))
 
 
+def rgb_to_lab_batch(rgb_colors):
+    # INPUT rgb_colors = (N x 3) array-like of RGB values each in range [0, 255]
+    # OUTPUT lab_colors = (N x 3) uint8 NP array of [L, a, b] rows in LAB space
+    rgb_colors = np.asarray(rgb_colors, dtype=np.uint8).reshape(-1, 3)
+    if len(rgb_colors) == 0:
+        return np.empty((0, 3), dtype=np.uint8)
+
+    cv2 = optional_import('cv2')
+    if cv2 is None:
+        return rgb_to_lab_numpy(rgb_colors)
+
+    # cv2 converts an (N x 1) image of BGR pixels in one call instead of one 1x1 image per color
+    bgr_image = np.ascontiguousarray(rgb_colors[:, ::-1]).reshape(-1, 1, 3)
+
+    lab_colors = cv2.cvtColor(bgr_image, cv2.COLOR_BGR2LAB).reshape(-1, 3)
+    return lab_colors
+
+
+@functools.lru_cache(maxsize=None)
+def _lab_tables():
+    # Lookup tables of OpenCV's fixed-point 8-bit conversion (see cv2.COLOR_BGR2LAB in OpenCV's color_lab.cpp)
+    # gamma_table[v] = linear light of the sRGB value v, scaled by 255 * 2^LAB_GAMMA_SHIFT
+    x = np.arange(256) / 255.0
+    linear = np.where(x <= 0.04045, x / 12.92, ((x + 0.055) / 1.055) ** 2.4)
+    gamma_table = np.rint(255 * (1 << LAB_GAMMA_SHIFT) * linear).astype(np.int64)
+
+    # cbrt_table[v] = f(v / (255 * 2^LAB_GAMMA_SHIFT)) of the LAB formulas, scaled by 2^LAB_SHIFT2.
+    # OpenCV computes it in single precision, which is needed to match it exactly
+    t = np.float32(1 / (255 * (1 << LAB_GAMMA_SHIFT))) * np.arange(256 * 3 // 2 * (1 << LAB_GAMMA_SHIFT), dtype=np.float32)
+    f = np.where(t < np.float32(0.008856), t * np.float32(7.787) + np.float32(16 / 116), np.cbrt(t))
+    cbrt_table = np.rint((1 << LAB_SHIFT2) * f.astype(np.float32).astype(np.float64)).astype(np.int64)
+
+    # XYZ relative to the white point, as integer coefficients scaled by 2^LAB_SHIFT
+    coefficients = np.rint(
+        (1 << LAB_SHIFT) * np.array(SRGB_TO_XYZ) / np.array(D65_WHITE)[:, None]
+    ).astype(np.int64)
+
+    return gamma_table, cbrt_table, coefficients
+
+
+def _descale(values, shift):
+    return (values + (1 << (shift - 1))) >> shift
+
+
+def rgb_to_lab_numpy(rgb_colors):
+    # INPUT rgb_colors = (N x 3) array-like of RGB values each in range [0, 255]
+    # OUTPUT lab_colors = (N x 3) uint8 NP array of [L, a, b] rows, identical to cv2.COLOR_BGR2LAB
+    rgb_colors = np.asarray(rgb_colors, dtype=np.uint8).reshape(-1, 3)
+    gamma_table, cbrt_table, coefficients = _lab_tables()
+
+    # fx, fy, fz = f(X / Xn), f(Y / Yn), f(Z / Zn), in fixed point
+    linear = gamma_table[rgb_colors]
+    fx, fy, fz = cbrt_table[_descale(linear @ coefficients.T, LAB_SHIFT)].T
+
+    # L is scaled from [0, 100] to [0, 255], and a and b are offset by 128, like 8-bit OpenCV images
+    l_scale = (116 * 255 + 50) // 100
+    l_shift = -((16 * 255 * (1 << LAB_SHIFT2) + 50) // 100)
+
+    lab_colors = np.stack([
+        _descale(l_scale * fy + l_shift, LAB_SHIFT2),
+        _descale(500 * (fx - fy) + 128 * (1 << LAB_SHIFT2), LAB_SHIFT2),
+        _descale(200 * (fy - fz) + 128 * (1 << LAB_SHIFT2), LAB_SHIFT2)
+    ], axis=1)
+
+    return np.clip(lab_colors, 0, 255).astype(np.uint8)
+
+
+def lab_to_rgb_batch(lab_colors):
+    # INPUT lab_colors = (N x 3) array-like of 8-bit [L, a, b] rows, with L scaled to [0, 255] and a, b offset by 128
+    # OUTPUT rgb_colors = (N x 3) uint8 NP array of RGB values
+    lab_colors = np.asarray(lab_colors, dtype=np.float64).reshape(-1, 3)
+
+    fy = (lab_colors[:, 0] * 100 / 255 + 16) / 116
+    fx = fy + (lab_colors[:, 1] - 128) / 500
+    fz = fy - (lab_colors[:, 2] - 128) / 200
+
+    f = np.stack([fx, fy, fz], axis=1)
+    xyz = np.where(f > 6 / 29, f ** 3, 3 * (6 / 29) ** 2 * (f - 4 / 29)) * np.array(D65_WHITE)
+
+    linear = np.clip(xyz @ np.linalg.inv(np.array(SRGB_TO_XYZ)).T, 0, 1)
+    srgb = np.where(linear <= 0.0031308, 12.92 * linear, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+    return np.clip(np.rint(255 * srgb), 0, 255).astype(np.uint8)
+
+
+def lab_color_distances(lab, lab_matrix):
+    lab = np.asarray(lab, dtype=np.float64)
+    lab_matrix = np.asarray(lab_matrix, dtype=np.float64)
+
+    return np.sqrt(np.sum((lab_matrix - lab) ** 2, axis=-1))
+
+
+def cosine_similarities(vector, matrix):
+    vector = np.asarray(vector, dtype=np.float64)
+    matrix = np.asarray(matrix, dtype=np.float64)
+
+    return (matrix @ vector) / (np.linalg.norm(matrix, axis=-1) * np.linalg.norm(vector))
+
+
 def get_dominant_colors(image, palette_size=16, top_colors=3):
-    image.thumbnail((300, 300))
+    # For JPEGs, draft() makes the decoder scale down by 1/2, 1/4, or 1/8 while decoding (never below
+    # THUMBNAIL_SIZE), so a 640px cover is decoded straight to 320px instead of being decoded in full first.
+    # thumbnail() then only has to do the final, much smaller resize. It is a no-op for other formats
+    image.draft('RGB', THUMBNAIL_SIZE)
+    image.thumbnail(THUMBNAIL_SIZE)
 
     paletted = image.convert('P', palette=Image.ADAPTIVE, colors=palette_size)
     # palette = [R1, G1, B1, R2, G2, B2, ...] 
@@ -71,3 +295,124 @@ def get_dominant_colors(image, palette_size=16, top_colors=3):
     top_colors = [palette[idx*3:idx*3+3] for idx in top_color_indices]
 
     return top_colors
+
+
+def _sample_pixels(image, size=ENGINE_SAMPLE_SIZE):
+    # (N x 3) uint8 RGB pixels of the image shrunk to fit in 'size', decoded at a reduced scale where possible
+    image.draft('RGB', size)
+    image = image.convert('RGB')
+    image.thumbnail(size)
+
+    return np.asarray(image, dtype=np.uint8).reshape(-1, 3)
+
+
+def _mean_colors(pixels, labels, top_labels):
+    # Mean RGB value of the pixels with each of the given labels, as lists of ints like get_dominant_colors() returns
+    colors = []
+    for label in top_labels:
+        mean = pixels[labels == label].mean(axis=0)
+        colors.append([int(round(value)) for value in mean])
+
+    return colors
+
+
+def get_dominant_colors_histogram(image, palette_size=16, top_colors=3):
+    pixels = _sample_pixels(image)
+
+    # Bin index of each pixel in the 3-D histogram, e.g. (r // 32) * 64 + (g // 32) * 8 + (b // 32)
+    bins = (pixels.astype(np.int32) * HISTOGRAM_BINS) // 256
+    labels = (bins[:, 0] * HISTOGRAM_BINS + bins[:, 1]) * HISTOGRAM_BINS + bins[:, 2]
+
+    counts = np.bincount(labels, minlength=HISTOGRAM_BINS ** 3)
+
+    # Fullest bins first, ties broken by bin index so that the result is deterministic
+    order = np.argsort(-counts, kind='stable')
+    top_labels = [label for label in order[:top_colors] if counts[label] > 0]
+
+    return _mean_colors(pixels, labels, top_labels)
+
+
+def _nearest_centers(points, centers):
+    # Squared distances expanded as |p|^2 - 2 p.c + |c|^2, so the (N x K) distances come from one matrix product
+    # instead of an (N x K x 3) array of differences. |p|^2 is the same for every center, so it is left out
+    distances = (centers ** 2).sum(axis=1)[None, :] - 2 * points @ centers.T
+    return np.argmin(distances, axis=1)
+
+
+def get_dominant_colors_kmeans(image, palette_size=16, top_colors=3):
+    pixels = _sample_pixels(image)
+    lab_pixels = rgb_to_lab_batch(pixels)
+    rng = np.random.default_rng(KMEANS_SEED)
+
+    # k-means++ seeding on the distinct colors, so that flat covers with few colors get fewer clusters.
+    # Packing each uint8 LAB triple into one int makes finding the distinct colors a 1-D np.unique()
+    packed = (lab_pixels[:, 0].astype(np.int32) << 16) | (lab_pixels[:, 1].astype(np.int32) << 8) | lab_pixels[:, 2]
+    _, first_indices = np.unique(packed, return_index=True)
+    distinct = lab_pixels[first_indices].astype(np.float32)
+    lab_pixels = lab_pixels.astype(np.float32)
+
+    num_clusters = min(palette_size, len(distinct))
+    centers = np.empty((num_clusters, 3), dtype=np.float32)
+    centers[0] = distinct[rng.integers(len(distinct))]
+    distances = np.sum((distinct - centers[0]) ** 2, axis=1)
+
+    for k in range(1, num_clusters):
+        centers[k] = distinct[rng.choice(len(distinct), p=distances / distances.sum())]
+        distances = np.minimum(distances, np.sum((distinct - centers[k]) ** 2, axis=1))
+
+    # Mini-batch updates: each center moves towards the mean of the batch pixels assigned to it, with a step
+    # size that shrinks as the center accumulates pixels (Sculley, 2010)
+    center_counts = np.zeros(num_clusters)
+    for _ in range(KMEANS_ITERATIONS):
+        batch = lab_pixels[rng.integers(len(lab_pixels), size=KMEANS_BATCH_SIZE)]
+        assignments = _nearest_centers(batch, centers)
+
+        batch_counts = np.bincount(assignments, minlength=num_clusters)
+        batch_sums = np.stack([
+            np.bincount(assignments, weights=batch[:, channel], minlength=num_clusters) for channel in range(3)
+        ], axis=1)
+
+        assigned = batch_counts > 0
+        center_counts += batch_counts
+        steps = batch_counts[assigned] / center_counts[assigned]
+        batch_means = batch_sums[assigned] / batch_counts[assigned, None]
+        centers[assigned] += (steps[:, None] * (batch_means - centers[assigned])).astype(np.float32)
+
+    labels = _nearest_centers(lab_pixels, centers)
+    counts = np.bincount(labels, minlength=num_clusters)
+
+    order = np.argsort(-counts, kind='stable')
+    top_labels = [label for label in order[:top_colors] if counts[label] > 0]
+
+    return _mean_colors(pixels, labels, top_labels)
+
+
+# Name -> function(image, palette_size, top_colors) returning the RGB values of the most dominant colors
+DOMINANT_COLOR_ENGINES = {
+    'adaptive': get_dominant_colors,
+    'histogram': get_dominant_colors_histogram,
+    'kmeans': get_dominant_colors_kmeans
+}
+
+def get_color_vector(image, palette_size=16, top_colors=3, engine='adaptive'):
+    if engine not in DOMINANT_COLOR_ENGINES:
+        raise ValueError(f'Unknown dominant color engine: {engine}')
+
+    top_rgb_colors = DOMINANT_COLOR_ENGINES[engine](image, palette_size=palette_size, top_colors=top_colors)
+
+    # Images with fewer distinct colors than top_colors repeat their least dominant color,
+    # so that every vector has the same number of dimensions
+    top_rgb_colors += [top_rgb_colors[-1]] * (top_colors - len(top_rgb_colors))
+
+    # top_lab_colors = [[L1, a1, b1], [L2, a2, b2], [L3, a3, b3]]
+    top_lab_colors = rgb_to_lab_batch(top_rgb_colors)
+
+    # lab_color_vector = 9D vector in LAB space [L1, a1, b1, L2, a2, b2, L3, a3, b3]
+    # kept as floats, since dot products of the raw uint8 LAB values overflow
+    lab_color_vector = top_lab_colors.astype(np.float32).flatten()
+    return lab_color_vector
+
+
+def get_color_vector_from_bytes(data, palette_size=16, top_colors=3, engine='adaptive'):
+    img = Image.open(BytesIO(data))
+    return get_color_vector(img, palette_size=palette_size, top_colors=top_colors, engine=engine)
@@ -0,0 +1,135 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides background execution of long-running sorts on a bounded worker pool.
+Each sort runs as a job that reports its current stage and percent done, so that routes can return
+a job ID right away and the page can poll for progress instead of holding a request open for minutes.
+
+Classes:
+- Job(job_id, key): the state of a single background job
+    - update(stage, progress): records the stage the job is in and how far along it is, in percent
+    - to_dict(): returns the JSON-serializable state of the job for the status route
+
+- JobManager(app, max_workers, max_finished): runs jobs inside the app context on a thread pool
+    - submit(key, func, *args, **kwargs): starts func(job, *args, **kwargs) in the background and returns its Job.
+    If a job with the same key (e.g. the same playlist) is still queued or running, that job is returned instead.
+    A job fails if func raises, or if it returns a dict with a 'status' of 'error' like the sorting routes do
+    - get(job_id): returns the Job with the given ID, or None if it is unknown or has been pruned
+    - active_count(): returns the number of jobs that are queued or running
+'''
+
+import time
+import uuid
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+class Job:
+    def __init__(self, job_id, key):
+        self.id = job_id
+        self.key = key
+        self.status = QUEUED
+        self.stage = QUEUED
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def update(self, stage, progress=None):
+        self.stage = stage
+        if progress is not None:
+            # Progress only ever moves forward, even if a stage reports a lower estimate than the previous one
+            self.progress = max(self.progress, min(100, int(progress)))
+
+    @property
+    def finished(self):
+        return self.status in (SUCCEEDED, FAILED)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'key': self.key,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobManager:
+    def __init__(self, app, max_workers=2, max_finished=100):
+        self.app = app
+        self.max_finished = max_finished
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='sort-job')
+        self._lock = threading.Lock()
+
+        # Key = job ID, Value = Job, in submission order so the oldest finished jobs are pruned first
+        self._jobs = OrderedDict()
+
+        # Key = job key (e.g. playlist ID), Value = the queued or running Job for that key
+        self._active = {}
+
+    def submit(self, key, func, *args, **kwargs):
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None:
+                return existing
+
+            job = Job(uuid.uuid4().hex, key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._prune()
+
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_count(self):
+        with self._lock:
+            return len(self._active)
+
+    def _run(self, job, func, args, kwargs):
+        job.status = RUNNING
+
+        try:
+            # Jobs run outside of any request, so they get their own app context for current_app
+            with self.app.app_context():
+                job.result = func(job, *args, **kwargs)
+
+            if isinstance(job.result, dict) and job.result.get('status') == 'error':
+                job.status = FAILED
+                job.stage = 'failed'
+                job.error = job.result.get('message')
+            else:
+                job.status = SUCCEEDED
+                job.update('done', 100)
+        except Exception as e:
+            print(f'Job {job.id} for {job.key} failed: {e}')
+            job.status = FAILED
+            job.stage = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._active.pop(job.key, None)
+
+    def _prune(self):
+        # Keep the state of recently finished jobs around for status polling, but only up to max_finished
+        finished_ids = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished_ids[:max(0, len(finished_ids) - self.max_finished)]:
+            del self._jobs[job_id]
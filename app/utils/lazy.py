@@ -0,0 +1,56 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides deferred imports for the numeric and image stack (NumPy, Pillow, OpenCV). Importing them takes
+most of the app's start-up time and memory, but only sorting needs them, so processes that only serve the login
+pages, and tests that never sort, should not pay for them.
+
+Functions:
+- lazy_import(name): returns a stand-in for the module 'name' that imports it the first time one of its attributes
+is used, e.g. np = lazy_import('numpy') at the top of a module, and np.zeros(3) inside a function
+
+- optional_import(name): returns the module 'name', importing it on first use, or None if it is not installed
+'''
+
+import importlib
+import threading
+
+class _LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Module imports already hold the interpreter's import lock, this only keeps the attribute consistent
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_import(name):
+    return _LazyModule(name)
+
+
+_optional_modules = {}
+
+def optional_import(name):
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+
+    return _optional_modules[name]
@@ -0,0 +1,285 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the app's metrics, exposed in the Prometheus text format on the '/metrics' route so that a
+Prometheus server (or anyone with curl) can see where the time of a sort goes under real load: how long each
+stage takes, how fast Spotify answers each endpoint, how often it throttles, and how well the caches work.
+
+Functions:
+- endpoint_label(url): returns the URL's path with IDs replaced by '{id}', e.g. '/v1/playlists/{id}/tracks',
+so that requests to the same endpoint are counted together
+
+Classes:
+- Counter(name, documentation, labelnames, function): a value that only goes up
+    - inc(amount, **labels): adds 'amount' to the value for the given label values
+
+- Gauge(name, documentation, labelnames, function): a value that can go up and down
+    - set(value, **labels): sets the value for the given label values
+
+If 'function' is passed to a Counter or Gauge, it is called on every scrape and returns a dict of
+label values tuple -> value, which is reported instead of the values recorded with inc() or set()
+
+- Histogram(name, documentation, labelnames, buckets): a distribution of observed values, e.g. durations in seconds
+    - observe(value, **labels): adds an observation for the given label values
+
+- MetricsRegistry(): a set of metrics rendered together
+    - counter(...), gauge(...), histogram(...): create a metric and add it to the registry
+    - render(): returns every metric in the Prometheus text exposition format
+
+- AppMetrics(): the registry of every metric the app records, with helpers for the places that record them
+    - observe_response(method, url, response, seconds): records a response from the shared HTTP client
+    - observe_retry(method, url, reason): records a request being retried, e.g. after a 429 or a connection error
+    - observe_sort(status, stats): records a finished sort, its stage timings, and its tracks per second
+    - watch_cache(name, cache): reports the hits and misses counted by a cache ('hits' and 'misses' attributes)
+'''
+
+import math
+import threading
+import urllib.parse
+
+# Prefix of every metric name, so they are easy to find among other exporters' metrics
+NAMESPACE = 'color_sorter'
+
+# Durations in seconds, from a fast API call up to sorting a very large playlist from scratch
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Sort throughput, from a cold sort of a large playlist up to a fully cached one
+TRACKS_PER_SECOND_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Path segments that are followed by the ID of one of the things they name
+ID_COLLECTIONS = {'playlists', 'users', 'albums', 'artists', 'tracks', 'image', 'images'}
+
+def endpoint_label(url):
+    segments = urllib.parse.urlsplit(url).path.split('/')
+
+    for i in range(1, len(segments)):
+        if segments[i - 1] in ID_COLLECTIONS and segments[i]:
+            segments[i] = '{id}'
+
+    return '/'.join(segments)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} takes the labels {self.labelnames}, got {tuple(labels)}')
+
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        # Metrics backed by a function report whatever it returns at scrape time, e.g. counts kept by a cache
+        if self.function is not None:
+            values = {tuple(map(str, key)): value for key, value in self.function().items()}
+        else:
+            with self._lock:
+                values = dict(self._values)
+
+        return [(self.name, key, (), value) for key, value in sorted(values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, key, extra, value in self._samples():
+            lines.append(f'{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}')
+
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [count per bucket..., sum]. Buckets are stored non-cumulative and summed up when rendered
+            counts = self._values.setdefault(key, [0] * len(self.buckets) + [0.0])
+            counts[next(i for i, bound in enumerate(self.buckets) if value <= bound)] += 1
+            counts[-1] += value
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f'{self.name}_bucket', key, [('le', _format_value(float(bound)))], cumulative))
+
+                samples.append((f'{self.name}_sum', key, (), counts[-1]))
+                samples.append((f'{self.name}_count', key, (), cumulative))
+
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), function=None):
+        return self._add(Counter(f'{NAMESPACE}_{name}', documentation, labelnames, function))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self._add(Gauge(f'{NAMESPACE}_{name}', documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(f'{NAMESPACE}_{name}', documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+
+        return '\n'.join(lines) + '\n'
+
+
+class AppMetrics:
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self._caches = {}
+
+        self.sort_stage_seconds = self.registry.histogram(
+            'sort_stage_seconds', 'Time spent in each stage of a sort', ['stage']
+        )
+        self.sorts = self.registry.counter(
+            'sorts_total', 'Sorts finished, by status', ['status']
+        )
+        self.tracks_sorted = self.registry.counter(
+            'tracks_sorted_total', 'Tracks in the playlists of finished sorts'
+        )
+        self.sort_tracks_per_second = self.registry.histogram(
+            'sort_tracks_per_second', 'Tracks processed per second of a whole sort', buckets=TRACKS_PER_SECOND_BUCKETS
+        )
+        self.api_request_seconds = self.registry.histogram(
+            'api_request_seconds', 'Latency of Spotify API requests, by endpoint', ['method', 'endpoint']
+        )
+        self.api_responses = self.registry.counter(
+            'api_responses_total', 'Responses from the Spotify API, by endpoint and status code',
+            ['method', 'endpoint', 'status']
+        )
+        self.api_throttled = self.registry.counter(
+            'api_throttled_total', 'Requests answered with 429 Too Many Requests, by endpoint', ['method', 'endpoint']
+        )
+        self.api_retries = self.registry.counter(
+            'api_retries_total', 'Requests retried, by endpoint and reason', ['method', 'endpoint', 'reason']
+        )
+        self.image_requests = self.registry.counter(
+            'image_downloads_total', 'Album cover download responses, by status code', ['status']
+        )
+        self.image_bytes = self.registry.counter(
+            'image_bytes_downloaded_total', 'Bytes of album cover images downloaded'
+        )
+        self.image_request_seconds = self.registry.histogram(
+            'image_request_seconds', 'Latency of album cover downloads'
+        )
+        self.prefetched_covers = self.registry.counter(
+            'prefetched_covers_total', 'Album covers processed ahead of a sort by the speculative warm-up'
+        )
+        self.registry.counter(
+            'cache_requests_total', 'Lookups in each cache, by result (hit or miss)', ['cache', 'result'],
+            function=self._cache_values
+        )
+
+    def render(self):
+        return self.registry.render()
+
+    def observe_response(self, method, url, response, seconds):
+        # Album covers are told apart from API calls by what came back, since they are served from other hosts
+        if response.headers.get('Content-Type', '').startswith('image/'):
+            self.image_requests.inc(status=response.status_code)
+            self.image_bytes.inc(len(response.content))
+            self.image_request_seconds.observe(seconds)
+            return
+
+        endpoint = endpoint_label(url)
+        self.api_request_seconds.observe(seconds, method=method, endpoint=endpoint)
+        self.api_responses.inc(method=method, endpoint=endpoint, status=response.status_code)
+
+        if response.status_code == 429:
+            self.api_throttled.inc(method=method, endpoint=endpoint)
+
+    def observe_retry(self, method, url, reason):
+        self.api_retries.inc(method=method, endpoint=endpoint_label(url), reason=reason)
+
+    def observe_sort(self, status, stats):
+        self.sorts.inc(status=status)
+
+        timings = stats.get('timings', {})
+        for stage, seconds in timings.items():
+            self.sort_stage_seconds.observe(seconds, stage=stage)
+
+        num_tracks = stats.get('num_tracks', 0)
+        self.tracks_sorted.inc(num_tracks)
+
+        # Stages can overlap, so the job's own wall-clock time is used when it was measured
+        total_seconds = stats.get('seconds', sum(timings.values()))
+        if num_tracks and total_seconds > 0:
+            self.sort_tracks_per_second.observe(num_tracks / total_seconds)
+
+    def watch_cache(self, name, cache):
+        self._caches[name] = cache
+
+    def _cache_values(self):
+        values = {}
+        for name, cache in self._caches.items():
+            values[(name, 'hit')] = cache.hits
+            values[(name, 'miss')] = cache.misses
+
+        return values
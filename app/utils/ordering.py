@@ -0,0 +1,302 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the ordering strategies used to turn a playlist's LAB color vectors into a track order.
+Every strategy takes an (N x 9) feature matrix and a time budget in seconds, and returns an array of row indices
+in sorted order. Strategies that always finish quickly ignore the time budget.
+None of them build a dense N x N distance matrix, so memory stays O(N) even for 10k-track playlists.
+The 'hilbert', 'hue', and 'pca' strategies only sort one key per track, so they take O(N log N) time and finish in
+milliseconds even for 10k tracks, at the cost of a less smooth path than 'path'. How smooth an order is can be
+compared between strategies with path_length(), the total LAB distance (Delta E) between adjacent tracks.
+
+Functions:
+- order_by_reference(features, time_budget): orders tracks by descending cosine similarity to the first track's vector.
+This is the original sorting heuristic
+
+- order_by_color_path(features, time_budget, window): builds a smooth color path by chaining each track to its
+nearest unvisited neighbor, then shortens the path with 2-opt segment reversals until no move helps or
+'time_budget' seconds have passed
+
+- nearest_neighbor_path(features, start): returns the greedy nearest-neighbor chain starting from row 'start'
+
+- two_opt(features, path, time_budget, window): returns the path after 2-opt refinement, reversing segments
+of at most 'window' tracks whenever that shortens the total color distance along the path
+
+- insert_into_path(path_features, new_features): returns the order of the rows of [path_features; new_features]
+after inserting each new row into the existing path (whose rows are already in order) where it adds the least
+color distance. Used to re-sort a playlist that only gained a few tracks without redoing the whole path
+
+- path_length(features, path): returns the total LAB distance between adjacent tracks along the path.
+This is the smoothness score of an order: the lower, the smoother
+
+- hilbert_index(coords, bits): returns the position of each row of the (N x D) integer grid coordinates 'coords'
+(each in [0, 2^bits)) along a D-dimensional Hilbert curve
+
+- order_by_hilbert(features, time_budget, bits): orders tracks along a Hilbert curve through LAB space, by the
+dominant color quantized to a grid of 2^bits cells per axis, with ties broken by the second and third colors
+
+- order_by_hue(features, time_budget, hue_bins, min_chroma): orders tracks by the hue angle of their dominant
+color, in 'hue_bins' sectors around the color wheel, and by lightness within each sector. Near-gray covers, whose
+hue is meaningless, come first, ordered by lightness
+
+- order_by_pca(features, time_budget): orders tracks by their projection onto the first principal component of
+the feature matrix, i.e. along the direction in which the playlist's colors vary the most
+
+- order_features(features, strategy, time_budget): returns the order given by the named strategy in ORDERING_STRATEGIES
+'''
+
+import time
+
+from .lazy import lazy_import
+from .image_processing import cosine_similarities
+
+np = lazy_import('numpy')
+
+def order_by_reference(features, time_budget=None):
+    features = np.asarray(features)
+    if len(features) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Cosine similarity has range [-1, 1], with higher value = vectors are more similar
+    # A stable argsort of the negated similarities keeps playlist order between equally similar tracks
+    similarities = cosine_similarities(vector=features[0], matrix=features)
+    return np.argsort(-similarities, kind='stable')
+
+
+def nearest_neighbor_path(features, start=0):
+    features = np.asarray(features, dtype=np.float32)
+    num_tracks = len(features)
+    if num_tracks == 0:
+        return np.empty(0, dtype=np.int64)
+
+    path = np.empty(num_tracks, dtype=np.int64)
+
+    # remaining_indices/remaining_features hold the unvisited tracks. A visited track is swapped with the
+    # last unvisited one, so every step is a single vectorized pass over a shrinking contiguous block
+    remaining_indices = np.arange(num_tracks)
+    remaining_features = features.copy()
+
+    current = start
+    for step in range(num_tracks):
+        num_remaining = num_tracks - step
+        if step == 0:
+            position = start
+        else:
+            diffs = remaining_features[:num_remaining] - features[current]
+            position = int(np.argmin(np.einsum('ij,ij->i', diffs, diffs)))
+
+        current = remaining_indices[position]
+        path[step] = current
+
+        last = num_remaining - 1
+        remaining_indices[position] = remaining_indices[last]
+        remaining_features[position] = remaining_features[last]
+
+    return path
+
+
+def insert_into_path(path_features, new_features):
+    path_features = np.asarray(path_features, dtype=np.float64)
+    new_features = np.asarray(new_features, dtype=np.float64)
+
+    order = list(range(len(path_features)))
+    ordered = path_features
+
+    for k, feature in enumerate(new_features):
+        new_index = len(path_features) + k
+
+        if len(ordered) == 0:
+            order.append(new_index)
+            ordered = feature[None, :]
+            continue
+
+        # Inserting between positions p-1 and p costs d(prev, new) + d(new, next) - d(prev, next).
+        # Inserting at either end of the path only adds the one edge to the first or last track
+        to_new = np.linalg.norm(ordered - feature, axis=1)
+        edges = np.linalg.norm(ordered[1:] - ordered[:-1], axis=1)
+        costs = np.concatenate([[to_new[0]], to_new[:-1] + to_new[1:] - edges, [to_new[-1]]])
+
+        position = int(np.argmin(costs))
+        order.insert(position, new_index)
+        ordered = np.insert(ordered, position, feature, axis=0)
+
+    return np.array(order, dtype=np.int64)
+
+
+def path_length(features, path):
+    if len(path) < 2:
+        return 0.0
+
+    ordered = np.asarray(features, dtype=np.float64)[path]
+    return float(np.sum(np.linalg.norm(ordered[1:] - ordered[:-1], axis=1)))
+
+
+def two_opt(features, path, time_budget=2.0, window=1000):
+    features = np.asarray(features, dtype=np.float64)
+    path = np.array(path, dtype=np.int64)
+    num_tracks = len(path)
+    if num_tracks < 4:
+        return path
+
+    deadline = time.monotonic() + time_budget
+    ordered = features[path]
+
+    # edges[k] = distance between the tracks at positions k and k + 1 of the path
+    edges = np.linalg.norm(ordered[1:] - ordered[:-1], axis=1)
+
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+
+        for i in range(num_tracks - 2):
+            # Reversing path[i+1 : j+1] replaces edges (i, i+1) and (j, j+1) with (i, j) and (i+1, j+1)
+            # Every candidate j for this i is scored in one vectorized pass
+            j_end = min(num_tracks - 1, i + window)
+            candidates = np.arange(i + 2, j_end + 1)
+
+            a, b = ordered[i], ordered[i + 1]
+            d_ac = np.linalg.norm(ordered[candidates] - a, axis=1)
+
+            # The path is open, so reversing through the final track only replaces a single edge
+            has_next = candidates < num_tracks - 1
+            d_bd = np.zeros(len(candidates))
+            d_cd = np.zeros(len(candidates))
+            d_bd[has_next] = np.linalg.norm(ordered[candidates[has_next] + 1] - b, axis=1)
+            d_cd[has_next] = edges[candidates[has_next]]
+
+            gains = edges[i] + d_cd - d_ac - d_bd
+            best = int(np.argmax(gains))
+            if gains[best] <= 1e-9:
+                continue
+
+            j = int(candidates[best])
+            path[i + 1:j + 1] = path[i + 1:j + 1][::-1].copy()
+            ordered[i + 1:j + 1] = ordered[i + 1:j + 1][::-1].copy()
+            edges[i + 1:j] = edges[i + 1:j][::-1].copy()
+            edges[i] = d_ac[best]
+            if j < num_tracks - 1:
+                edges[j] = d_bd[best]
+
+            improved = True
+
+            if time.monotonic() >= deadline:
+                break
+
+    return path
+
+
+def order_by_color_path(features, time_budget=2.0, window=1000):
+    started = time.monotonic()
+    path = nearest_neighbor_path(features, start=0)
+
+    # Whatever is left of the time budget after the greedy chain goes to refinement
+    remaining_budget = max(0.0, time_budget - (time.monotonic() - started))
+    return two_opt(features, path, time_budget=remaining_budget, window=window)
+
+
+def hilbert_index(coords, bits):
+    # Skilling's transpose algorithm ("Programming the Hilbert curve", 2004), run on every row at once
+    coords = np.array(coords, dtype=np.int64)
+    num_dims = coords.shape[1]
+    x = [coords[:, i].copy() for i in range(num_dims)]
+
+    # Inverse undo of the curve's rotations and reflections, from the highest bit down
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = q - 1
+        for i in range(num_dims):
+            high = (x[i] & q) != 0
+            t = np.where(high, 0, (x[0] ^ x[i]) & p)
+            x[0] = np.where(high, x[0] ^ p, x[0] ^ t)
+            if i:
+                x[i] = x[i] ^ t
+        q >>= 1
+
+    # Gray encode
+    for i in range(1, num_dims):
+        x[i] = x[i] ^ x[i - 1]
+
+    t = np.zeros(len(coords), dtype=np.int64)
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = np.where((x[num_dims - 1] & q) != 0, t ^ (q - 1), t)
+        q >>= 1
+
+    x = [axis ^ t for axis in x]
+
+    # The index interleaves the transposed bits, most significant bit of every axis first
+    index = np.zeros(len(coords), dtype=np.int64)
+    for bit in range(bits - 1, -1, -1):
+        for i in range(num_dims):
+            index = (index << 1) | ((x[i] >> bit) & 1)
+
+    return index
+
+
+def order_by_hilbert(features, time_budget=None, bits=8):
+    features = np.asarray(features, dtype=np.float64)
+    if len(features) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Every axis shares the same scale, so a grid cell spans the same LAB distance along L, a, and b
+    low, high = features.min(), features.max()
+    scale = ((1 << bits) - 1) / (high - low) if high > low else 0.0
+    grid = np.rint((features - low) * scale).astype(np.int64)
+
+    # One index per color of the vector (dominant color first), np.lexsort sorts by its last key first
+    keys = [hilbert_index(grid[:, i:i + 3], bits) for i in range(0, features.shape[1], 3)]
+    return np.lexsort(keys[::-1])
+
+
+def order_by_hue(features, time_budget=None, hue_bins=24, min_chroma=10.0):
+    features = np.asarray(features, dtype=np.float64)
+    if len(features) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # 8-bit LAB from OpenCV stores a and b offset by 128, and L scaled to [0, 255]
+    lightness = features[:, 0]
+    a, b = features[:, 1] - 128, features[:, 2] - 128
+
+    hue = np.mod(np.arctan2(b, a), 2 * np.pi)
+    sectors = np.minimum((hue / (2 * np.pi) * hue_bins).astype(np.int64), hue_bins - 1)
+
+    # Grays go into sector -1, ahead of the colored sectors
+    sectors[np.hypot(a, b) < min_chroma] = -1
+
+    # Lightness runs up and down in alternate sectors, so the last track of a sector and the first of the next
+    # are about as light, instead of jumping from the lightest back to the darkest
+    direction = np.where(sectors % 2 == 0, 1.0, -1.0)
+    return np.lexsort((direction * lightness, sectors))
+
+
+def order_by_pca(features, time_budget=None):
+    features = np.asarray(features, dtype=np.float64)
+    if len(features) < 2:
+        return np.arange(len(features), dtype=np.int64)
+
+    # The first principal component is the eigenvector of the (9 x 9) covariance matrix with the largest eigenvalue
+    centered = features - features.mean(axis=0)
+    _, eigenvectors = np.linalg.eigh(centered.T @ centered)
+    projection = centered @ eigenvectors[:, -1]
+
+    return np.argsort(projection, kind='stable')
+
+
+# Key = strategy name accepted by /sort_playlist/<playlist_id>?strategy=<name>
+# Value = function taking the (N x 9) feature matrix and a time budget, and returning the sorted row indices
+ORDERING_STRATEGIES = {
+    'reference': order_by_reference,
+    'path': order_by_color_path,
+    'hilbert': order_by_hilbert,
+    'hue': order_by_hue,
+    'pca': order_by_pca
+}
+
+def order_features(features, strategy='reference', time_budget=2.0):
+    if strategy not in ORDERING_STRATEGIES:
+        raise ValueError(f'Unknown ordering strategy: {strategy}')
+
+    return ORDERING_STRATEGIES[strategy](features, time_budget=time_budget)
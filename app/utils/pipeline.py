@@ -0,0 +1,278 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the streaming pipeline that turns album cover URLs into LAB color vectors. Instead of finishing
+each step for every cover before starting the next one, the steps run at the same time and hand covers to each
+other through bounded queues:
+
+    batches of URLs (e.g. one per page of a playlist) -> feature cache lookup -> downloaders -> extractor
+
+so the first covers are being downloaded and processed while later pages of the playlist are still loading.
+The queues block when they are full, so a slow step holds back the ones before it instead of letting downloaded
+images pile up, and at most about 2 * 'queue_size' compressed images are in memory at any time, whatever
+the size of the playlist.
+
+Functions:
+- stream_color_features(url_batches, cache, max_workers, palette_size, top_colors, engine, extractor, queue_size,
+batch_size, progress, timings): consumes an iterable of lists of image URLs as it is produced, and returns a dict of
+image URL -> LAB color vector for every distinct URL whose cover could be downloaded and processed.
+Cache hits are served from 'cache', and computed vectors are written back to it in batches of 'batch_size'.
+If a SingleFlight is passed (see utils/shared_cache.py), covers that another worker is already computing are not
+computed again: their results are read from the shared cache once the other worker has stored them.
+If passed, progress(done, total) is called as covers are done, with the total known so far, and the seconds spent
+listing (waiting on url_batches), downloading, and extracting colors are added to the 'timings' dict
+'''
+
+import time
+import queue
+import threading
+
+from ..api import client
+from .image_processing import download_image_bytes, _try_download
+from .extraction import extract_color_vectors
+
+# Marks the end of a queue for the thread reading it
+_DONE = object()
+
+class _Aborted(Exception):
+    pass
+
+
+def stream_color_features(url_batches, cache=None, max_workers=8, palette_size=16, top_colors=3, engine='adaptive',
+                          extractor=None, queue_size=64, batch_size=32, progress=None, timings=None, single_flight=None):
+    timings = {} if timings is None else timings
+    max_workers = max(1, max_workers)
+
+    url_queue = queue.Queue(maxsize=queue_size)
+    bytes_queue = queue.Queue(maxsize=queue_size)
+
+    features = {}
+    lock = threading.Lock()
+    abort = threading.Event()
+    errors = []
+    num_seen = 0
+    num_done = 0
+    busy = {'download': 0.0, 'extract': 0.0}
+
+    # Covers this call holds the single-flight lock of, released as soon as they are stored in the cache
+    claimed = set()
+
+    def put(q, item):
+        # Blocks while the queue is full, but gives up if another stage failed, so that no thread waits forever
+        while True:
+            if abort.is_set():
+                raise _Aborted()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(q):
+        while True:
+            if abort.is_set():
+                raise _Aborted()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def report_done(count):
+        nonlocal num_done
+        with lock:
+            num_done += count
+            done, total = num_done, num_seen
+
+        if progress is not None and count:
+            progress(done, total)
+
+    def run_stage(func):
+        # Any failure stops every stage, and is raised again in the calling thread
+        def run():
+            try:
+                func()
+            except _Aborted:
+                pass
+            except BaseException as e:
+                errors.append(e)
+                abort.set()
+
+        thread = threading.Thread(target=client.bind_context(run), daemon=True)
+        thread.start()
+        return thread
+
+    def download():
+        while True:
+            image_url = get(url_queue)
+            if image_url is _DONE:
+                put(bytes_queue, _DONE)
+                return
+
+            start = time.perf_counter()
+            data = _try_download(image_url, download_image_bytes)
+            with lock:
+                busy['download'] += time.perf_counter() - start
+
+            put(bytes_queue, (image_url, data))
+
+    def extract():
+        num_finished_downloaders = 0
+        while num_finished_downloaders < max_workers:
+            # Waits for one downloaded cover, then takes whatever else is ready, up to batch_size covers
+            batch = []
+            item = get(bytes_queue)
+            while True:
+                if item is _DONE:
+                    num_finished_downloaders += 1
+                else:
+                    batch.append(item)
+
+                if len(batch) >= batch_size or num_finished_downloaders == max_workers:
+                    break
+                try:
+                    item = bytes_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            images_bytes = [data for _, data in batch]
+            if extractor is not None:
+                vectors = extractor.extract(images_bytes, palette_size=palette_size, top_colors=top_colors, engine=engine)
+            else:
+                vectors = extract_color_vectors(images_bytes, palette_size=palette_size, top_colors=top_colors, engine=engine)
+
+            computed = {image_url: vector for (image_url, _), vector in zip(batch, vectors) if vector is not None}
+            if cache is not None:
+                cache.put_many(computed)
+
+            if single_flight is not None:
+                # Released for the covers that failed too, so that other workers stop waiting and try themselves
+                released = [image_url for image_url, _ in batch]
+                single_flight.release_many(released)
+                with lock:
+                    claimed.difference_update(released)
+
+            with lock:
+                features.update(computed)
+                busy['extract'] += time.perf_counter() - start
+
+            report_done(len(batch))
+
+    def claim(image_urls):
+        # Returns the covers to compute here. The others are being computed by another worker right now
+        if single_flight is None or cache is None:
+            return image_urls, []
+
+        acquired = single_flight.acquire_many(image_urls)
+
+        # Another worker may have stored a cover and released its lock since it was looked up in the cache
+        done = cache.get_many(acquired) if acquired else {}
+        if done:
+            single_flight.release_many(done)
+            with lock:
+                features.update(done)
+            report_done(len(done))
+
+        mine = [url for url in image_urls if url in acquired and url not in done]
+        with lock:
+            claimed.update(mine)
+
+        return mine, [url for url in image_urls if url not in acquired]
+
+    def wait_for_others(waiting):
+        # Waits for other workers to store the covers they hold the lock of. Covers whose lock was released
+        # without a result (e.g. the download failed there), or that take longer than single_flight.timeout,
+        # are computed here after all
+        deadline = time.monotonic() + single_flight.timeout
+        while waiting:
+            # Locks are checked before the cache: a worker stores its result before releasing the lock, so a cover
+            # that was already unlocked here and is still not in the cache really has no result yet
+            held = single_flight.held(waiting)
+            found = cache.get_many(waiting)
+            with lock:
+                features.update(found)
+            report_done(len(found))
+
+            waiting = [url for url in waiting if url not in found]
+            if time.monotonic() >= deadline:
+                return waiting
+
+            mine, _ = claim([url for url in waiting if url not in held])
+            for image_url in mine:
+                put(url_queue, image_url)
+
+            waiting = [url for url in waiting if url not in mine]
+            if waiting:
+                if abort.wait(single_flight.poll_interval):
+                    raise _Aborted()
+
+        return []
+
+    start = time.perf_counter()
+    threads = [run_stage(download) for _ in range(max_workers)] + [run_stage(extract)]
+
+    try:
+        # The calling thread produces: each batch of URLs is looked up in the cache as it arrives, and only
+        # the distinct URLs that are not cached are queued for download
+        seen = set()
+        waiting = []
+        listing_seconds = 0.0
+        batches = iter(url_batches)
+
+        while True:
+            listing_start = time.perf_counter()
+            try:
+                image_urls = next(batches)
+            except StopIteration:
+                break
+            finally:
+                listing_seconds += time.perf_counter() - listing_start
+
+            new_urls = [url for url in dict.fromkeys(image_urls) if url and url not in seen]
+            seen.update(new_urls)
+            with lock:
+                num_seen += len(new_urls)
+
+            cached = cache.get_many(new_urls) if cache is not None else {}
+            with lock:
+                features.update(cached)
+            report_done(len(cached))
+
+            mine, others = claim([url for url in new_urls if url not in cached])
+            waiting += others
+            for image_url in mine:
+                put(url_queue, image_url)
+
+        for image_url in wait_for_others(waiting) if waiting else []:
+            put(url_queue, image_url)
+
+        for _ in range(max_workers):
+            put(url_queue, _DONE)
+    except _Aborted:
+        pass
+    except BaseException:
+        abort.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+        # Locks of covers that were never finished, e.g. after an error, are not left for others to wait on
+        if claimed:
+            single_flight.release_many(claimed)
+
+    if errors:
+        raise errors[0]
+
+    timings['listing'] = timings.get('listing', 0) + listing_seconds
+    timings['download'] = timings.get('download', 0) + busy['download'] / max_workers
+    timings['extract'] = timings.get('extract', 0) + busy['extract']
+    timings['features'] = timings.get('features', 0) + time.perf_counter() - start
+
+    return features
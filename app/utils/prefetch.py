@@ -0,0 +1,157 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides speculative warm-up of the feature cache. When '/sorter' renders a user's playlists, the
+playlists they are most likely to sort next are listed and the colors of their album covers are extracted in the
+background, so that by the time the user clicks sort most of the work is already in the feature cache (and the
+listing in the response cache). Warm-up is low priority: it only starts a batch of covers while no sorting job is
+queued or running, and each user can only have up to a budget of covers processed for them per time window.
+
+Classes:
+- Prefetcher(app, jobs, cover_budget, window, max_playlists, batch_size, max_workers, poll_interval, max_wait):
+warms the feature cache on a single background thread, yielding to the jobs of the JobManager 'jobs'
+    - submit(user_id, access_token, playlists): starts warming up the playlists (as returned by get_owned_playlists)
+    in the background. Returns False without doing anything if a warm-up for the user is already queued or running
+    - pick_playlists(playlists): returns the details of the playlists to warm up, at most 'max_playlists' of them in
+    the order they are listed in (most recently changed first). Playlists whose stored sort (see utils/sort_state.py)
+    is of their current snapshot are skipped, since sorting them again needs no new covers
+    - spend(user_id, num_covers): takes up to 'num_covers' covers from the user's budget for the current window of
+    'window' seconds, and returns how many it took
+    - wait_for_idle(): waits until no sorting job is queued or running. Returns False if that takes longer than
+    'max_wait' seconds, in which case the warm-up gives up
+'''
+
+import time
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from ..api.spotify import get_playlist_tracks
+from .pipeline import stream_color_features
+
+class Prefetcher:
+    def __init__(self, app, jobs, cover_budget=500, window=3600, max_playlists=3, batch_size=32, max_workers=2,
+                 poll_interval=0.5, max_wait=300):
+        self.app = app
+        self.jobs = jobs
+        self.cover_budget = cover_budget
+        self.window = window
+        self.max_playlists = max_playlists
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+
+        # A single thread, so warm-ups never use more than one thread's worth of downloads and extraction at once
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+
+        # Key = user ID, Value = [start of the user's budget window, covers spent in it]
+        self._budgets = {}
+
+        # User IDs with a warm-up queued or running
+        self._active = set()
+
+    def submit(self, user_id, access_token, playlists):
+        with self._lock:
+            if user_id in self._active:
+                return False
+            self._active.add(user_id)
+
+        self._executor.submit(self._run, user_id, access_token, playlists)
+        return True
+
+    def spend(self, user_id, num_covers):
+        now = time.monotonic()
+        with self._lock:
+            start, spent = self._budgets.get(user_id, (now, 0))
+            if now - start >= self.window:
+                start, spent = now, 0
+
+            taken = max(0, min(num_covers, self.cover_budget - spent))
+            self._budgets[user_id] = (start, spent + taken)
+
+        return taken
+
+    def wait_for_idle(self):
+        deadline = time.monotonic() + self.max_wait
+        while self.jobs.active_count() > 0:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+
+        return True
+
+    def pick_playlists(self, playlists):
+        sort_states = current_app.extensions['sort_state']
+
+        picked = []
+        for details in playlists.values():
+            if len(picked) >= self.max_playlists:
+                break
+
+            state = sort_states.load(details['playlist_id'])
+            if state is not None and details.get('snapshot_id') and state.snapshot_id == details['snapshot_id']:
+                continue
+
+            picked.append(details)
+
+        return picked
+
+    def _run(self, user_id, access_token, playlists):
+        try:
+            # Runs outside of any request, so it gets its own app context for current_app
+            with self.app.app_context():
+                for details in self.pick_playlists(playlists):
+                    if not self._warm_up(user_id, access_token, details):
+                        break
+        except Exception as e:
+            print(f'Warm-up for user {user_id} failed: {e}')
+        finally:
+            with self._lock:
+                self._active.discard(user_id)
+
+    def _warm_up(self, user_id, access_token, details):
+        """Process the covers of one playlist that are not cached yet. Returns False once the warm-up should stop."""
+        if not self.wait_for_idle():
+            return False
+
+        # Listed at the snapshot the page showed, which is also what a sort of the unchanged playlist lists
+        playlist_tracks = get_playlist_tracks(
+            access_token, details['playlist_id'], min_image_size=current_app.config['IMAGE_MIN_SIZE'],
+            snapshot_id=details.get('snapshot_id')
+        )
+
+        cache = current_app.extensions['feature_cache']
+        image_urls = list(dict.fromkeys(image_url for _, image_url in playlist_tracks if image_url))
+        cached = cache.get_many(image_urls)
+        missing = [image_url for image_url in image_urls if image_url not in cached]
+
+        for i in range(0, len(missing), self.batch_size):
+            # Checked before every batch, so a sort the user starts only waits for the batch in flight
+            if not self.wait_for_idle():
+                return False
+
+            batch = missing[i:i + self.batch_size]
+            batch = batch[:self.spend(user_id, len(batch))]
+            if not batch:
+                print(f'Warm-up for user {user_id} used up its budget of {self.cover_budget} covers')
+                return False
+
+            stream_color_features(
+                [batch],
+                cache=cache,
+                max_workers=self.max_workers,
+                palette_size=current_app.config['PALETTE_SIZE'],
+                top_colors=current_app.config['TOP_COLORS'],
+                engine=current_app.config['COLOR_ENGINE'],
+                single_flight=current_app.extensions.get('single_flight')
+            )
+            current_app.extensions['metrics'].prefetched_covers.inc(len(batch))
+
+        return True
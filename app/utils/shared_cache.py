@@ -0,0 +1,166 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides the optional Redis tier of the feature cache, for deployments with several gunicorn workers
+or hosts. The SQLite feature cache (see utils/feature_cache.py) is private to one host, so without Redis every host
+downloads and processes the same album covers again. With REDIS_URL set, color vectors are shared through Redis,
+and a single-flight lock makes sure that covers needed by concurrent sorts on different workers are only
+computed by one of them while the others wait for the result.
+
+Classes:
+- RedisFeatureCache(redis, version, prefix, ttl): the feature cache interface of FeatureCache (get_many, put_many,
+clear, 'hits' and 'misses'), stored in Redis. Entries expire after 'ttl' seconds if it is set, and are otherwise
+evicted by Redis' own maxmemory policy
+
+- TieredFeatureCache(local, shared): the same interface over a local cache in front of a shared one. Lookups try the
+local cache first and copy hits from the shared cache into it, and stored vectors are written to both
+
+- SingleFlight(redis, prefix, ttl, timeout, poll_interval): per-key locks shared by every worker, so that only the
+worker holding the lock for a key does the work for it
+    - acquire_many(keys): returns the set of keys whose lock this call took. Locks expire after 'ttl' seconds,
+    so that a worker that dies while holding them only holds up the others until then
+    - release_many(keys): releases the locks of the keys
+    - held(keys): returns the set of keys whose lock is currently held by any worker
+'''
+
+import uuid
+import threading
+
+from .lazy import lazy_import
+
+np = lazy_import('numpy')
+
+DEFAULT_PREFIX = 'color_sorter'
+
+class RedisFeatureCache:
+    def __init__(self, redis, version, prefix=DEFAULT_PREFIX, ttl=None):
+        self.redis = redis
+        self.version = version
+        self.prefix = prefix
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, image_url):
+        # The version is part of the key, so hosts running with other palette settings never share vectors
+        return f'{self.prefix}:features:{self.version}:{image_url}'
+
+    def get_many(self, image_urls):
+        image_urls = list({url for url in image_urls if url})
+        if not image_urls:
+            return {}
+
+        values = self.redis.mget([self._key(url) for url in image_urls])
+        features = {
+            url: np.frombuffer(value, dtype=np.float32).copy()
+            for url, value in zip(image_urls, values) if value is not None
+        }
+
+        with self._lock:
+            self.hits += len(features)
+            self.misses += len(image_urls) - len(features)
+
+        return features
+
+    def put_many(self, features):
+        if not features:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for url, vector in features.items():
+            if url:
+                pipe.set(self._key(url), np.asarray(vector, dtype=np.float32).tobytes(), ex=self.ttl or None)
+        pipe.execute()
+
+    def clear(self):
+        keys = list(self.redis.scan_iter(match=f'{self.prefix}:features:*', count=1000))
+        for i in range(0, len(keys), 1000):
+            self.redis.delete(*keys[i:i + 1000])
+
+
+class TieredFeatureCache:
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self):
+        return self.local.version
+
+    def get_many(self, image_urls):
+        image_urls = list({url for url in image_urls if url})
+        features = self.local.get_many(image_urls)
+
+        missing = [url for url in image_urls if url not in features]
+        if missing:
+            # Vectors computed on other hosts are kept locally too, so later lookups skip the network round trip
+            shared_features = self.shared.get_many(missing)
+            self.local.put_many(shared_features)
+            features.update(shared_features)
+
+        with self._lock:
+            self.hits += len(features)
+            self.misses += len(image_urls) - len(features)
+
+        return features
+
+    def put_many(self, features):
+        self.local.put_many(features)
+        self.shared.put_many(features)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+class SingleFlight:
+    def __init__(self, redis, prefix=DEFAULT_PREFIX, ttl=60, timeout=30, poll_interval=0.1):
+        self.redis = redis
+        self.prefix = prefix
+        self.ttl = ttl
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        # Identifies this worker as the holder of its locks, e.g. when inspecting Redis
+        self.token = uuid.uuid4().hex
+
+    def _key(self, key):
+        return f'{self.prefix}:lock:{key}'
+
+    def acquire_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return set()
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.set(self._key(key), self.token, nx=True, px=int(self.ttl * 1000))
+
+        return {key for key, acquired in zip(keys, pipe.execute()) if acquired}
+
+    def release_many(self, keys):
+        # A plain delete, without checking the holder: if this worker's lock already expired and another took
+        # it over, the worst case is that a third worker computes the same cover again
+        keys = list(keys)
+        if keys:
+            self.redis.delete(*[self._key(key) for key in keys])
+
+    def held(self, keys):
+        keys = list(keys)
+        if not keys:
+            return set()
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(self._key(key))
+
+        return {key for key, exists in zip(keys, pipe.execute()) if exists}
@@ -0,0 +1,134 @@
+'''
+Module: utils
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides persistent storage of the last sorted order of each playlist, along with the color vectors
+of its tracks in that order. Re-sorting a playlist that only gained or lost a few tracks can then start from the
+stored color path, only computing features for the new tracks instead of every track in the playlist, and sorting
+an unchanged playlist with another strategy can reuse the stored features without computing any.
+
+Classes:
+- SortState(playlist_id, snapshot_id, strategy, feature_version, track_ids, features): the stored result of a sort.
+'track_ids' are in sorted order, and row i of the (N x 9) 'features' matrix belongs to track_ids[i]
+
+- SortStateStore(directory): saves and loads one SortState per playlist in 'directory', as a contiguous float32
+(N x 9) features .npy file, a parallel track IDs .npy file, and a small JSON file with the rest
+    - load(playlist_id): returns the stored SortState of the playlist, or None if there is none. Its features are
+    memory-mapped from disk rather than read and copied
+    - save(state): stores the SortState, replacing the previous one for its playlist
+    - delete(playlist_id): removes the stored SortState of the playlist
+'''
+
+import os
+import re
+import json
+import uuid
+import threading
+
+from .lazy import lazy_import
+
+np = lazy_import('numpy')
+
+class SortState:
+    def __init__(self, playlist_id, snapshot_id, strategy, feature_version, track_ids, features):
+        self.playlist_id = playlist_id
+        self.snapshot_id = snapshot_id
+        self.strategy = strategy
+        self.feature_version = feature_version
+        self.track_ids = list(track_ids)
+        self.features = np.asanyarray(features, dtype=np.float32)
+
+
+class SortStateStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _path(self, playlist_id, suffix='json'):
+        # Playlist IDs are base-62, but never trust a path component that came in through a URL
+        safe_id = re.sub(r'[^A-Za-z0-9_-]', '_', playlist_id)
+        return os.path.join(self.directory, f'{safe_id}.{suffix}')
+
+    def _read_meta(self, playlist_id):
+        with open(self._path(playlist_id)) as f:
+            return json.load(f)
+
+    def load(self, playlist_id):
+        path = self._path(playlist_id)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            meta = self._read_meta(playlist_id)
+
+            # Memory-mapped instead of read, so loading costs nothing until rows are used, and the pages of
+            # a playlist sorted again soon after are shared through the OS page cache
+            features = np.load(self._path(playlist_id, f'{meta["generation"]}.features.npy'), mmap_mode='r')
+            track_ids = np.load(self._path(playlist_id, f'{meta["generation"]}.track_ids.npy'), mmap_mode='r')
+
+            return SortState(
+                playlist_id=playlist_id,
+                snapshot_id=meta['snapshot_id'],
+                strategy=meta['strategy'],
+                feature_version=meta['feature_version'],
+                track_ids=track_ids.tolist(),
+                features=features
+            )
+        except (OSError, KeyError, ValueError) as e:
+            print(f'Failed to load sort state for {playlist_id}: {e}')
+            return None
+
+    def save(self, state):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(state.playlist_id)
+
+        # Arrays are written under a new generation, and the JSON file naming the current generation is replaced
+        # last, so that a concurrent load never sees a half-written state or arrays of two different sorts
+        generation = uuid.uuid4().hex
+        np.save(self._path(state.playlist_id, f'{generation}.features.npy'), np.ascontiguousarray(state.features))
+        np.save(self._path(state.playlist_id, f'{generation}.track_ids.npy'), np.array(state.track_ids, dtype=str))
+
+        meta = {
+            'generation': generation,
+            'snapshot_id': state.snapshot_id or '',
+            'strategy': state.strategy,
+            'feature_version': state.feature_version,
+            'num_tracks': len(state.track_ids)
+        }
+
+        tmp_path = f'{path}.{generation}.tmp'
+        with self._lock:
+            previous = self._generation(state.playlist_id)
+
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, path)
+
+            if previous is not None:
+                self._remove_arrays(state.playlist_id, previous)
+
+    def delete(self, playlist_id):
+        with self._lock:
+            generation = self._generation(playlist_id)
+            path = self._path(playlist_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+            if generation is not None:
+                self._remove_arrays(playlist_id, generation)
+
+    def _generation(self, playlist_id):
+        try:
+            return self._read_meta(playlist_id).get('generation')
+        except (OSError, ValueError):
+            return None
+
+    def _remove_arrays(self, playlist_id, generation):
+        # States that are still mapped keep their data until they are closed (where the OS allows removing them)
+        for name in ['features', 'track_ids']:
+            try:
+                os.remove(self._path(playlist_id, f'{generation}.{name}.npy'))
+            except OSError:
+                pass
@@ -0,0 +1,9 @@
+'''
+Module: benchmarks
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+Offline benchmarks of the sorting pipeline, run against a local stand-in for the Spotify Web API and album cover
+CDN so that timings do not depend on the network or a Spotify account. See run_benchmarks.py for usage.
+'''
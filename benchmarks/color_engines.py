@@ -0,0 +1,139 @@
+'''
+Module: benchmarks
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file compares the dominant color engines in app/utils/image_processing.py on synthetic album covers, timing
+each one and measuring how closely it agrees with the original 'adaptive' engine, so that a faster engine can be
+picked without making the sorted playlists visibly worse. Run it from the repository root:
+
+    python -m benchmarks.color_engines --num-covers 500 --output color_engines.json
+
+Half of the covers are flat blocks of color (like mock_spotify.py serves), and half are noisy gradients, closer to
+photographs. For every engine, the results report:
+- ms_per_cover: average time to decode a cover and extract its color vector
+- mean_delta_e: average LAB distance between the engine's dominant colors and the adaptive engine's, with the colors
+of each cover matched up in whichever order is closest (so two engines swapping the 2nd and 3rd color still agree)
+- top_color_delta_e: average LAB distance between the single most dominant colors of the two engines
+- path_ratio: length of the color path through the covers when ordered by the engine's vectors, measured on the
+adaptive vectors, relative to ordering by the adaptive vectors themselves. 1.0 means an equally smooth playlist
+
+Functions:
+- make_photo_cover(cover, size): returns the bytes of a synthetic noisy gradient album cover JPEG
+
+- color_agreement(reference_vectors, vectors, top_colors): returns the mean_delta_e and top_color_delta_e of the
+(N x 3 * top_colors) vectors against the reference vectors
+
+- run_color_engines(num_covers, engines, palette_size, top_colors, strategy): returns the JSON-serializable results
+
+- main(): parses the command line arguments, runs the comparison, and prints or writes the results
+'''
+
+import json
+import time
+import argparse
+import platform
+import itertools
+
+import numpy as np
+
+from io import BytesIO
+from PIL import Image
+
+from benchmarks.mock_spotify import make_cover
+
+def make_photo_cover(cover, size=300):
+    # A diagonal gradient between two random colors with per-pixel noise, roughly like a photograph
+    rng = np.random.default_rng(cover)
+    start, end = rng.uniform(0, 255, size=(2, 3))
+
+    t = np.add.outer(np.arange(size), np.arange(size))[:, :, None] / (2 * size - 2)
+    pixels = start + t * (end - start) + rng.normal(0, 12, size=(size, size, 3))
+
+    buffer = BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def color_agreement(reference_vectors, vectors, top_colors=3):
+    reference_colors = np.asarray(reference_vectors, dtype=np.float64).reshape(-1, top_colors, 3)
+    colors = np.asarray(vectors, dtype=np.float64).reshape(-1, top_colors, 3)
+
+    # Mean distance over the best matching of each cover's colors, trying every order of the engine's colors
+    matched_distances = np.min([
+        np.linalg.norm(reference_colors - colors[:, list(permutation)], axis=2).mean(axis=1)
+        for permutation in itertools.permutations(range(top_colors))
+    ], axis=0)
+
+    top_distances = np.linalg.norm(reference_colors[:, 0] - colors[:, 0], axis=1)
+
+    return {
+        'mean_delta_e': round(float(matched_distances.mean()), 3),
+        'top_color_delta_e': round(float(top_distances.mean()), 3)
+    }
+
+
+def run_color_engines(num_covers=500, engines=None, palette_size=16, top_colors=3, strategy='path'):
+    from app.utils.image_processing import DOMINANT_COLOR_ENGINES, get_color_vector_from_bytes
+    from app.utils.ordering import order_features, path_length
+
+    engines = list(engines or DOMINANT_COLOR_ENGINES)
+    covers = [make_cover(i) if i % 2 == 0 else make_photo_cover(i) for i in range(num_covers)]
+
+    vectors = {}
+    seconds = {}
+    for engine in dict.fromkeys(['adaptive'] + engines):
+        start = time.perf_counter()
+        vectors[engine] = np.stack([
+            get_color_vector_from_bytes(data, palette_size=palette_size, top_colors=top_colors, engine=engine)
+            for data in covers
+        ])
+        seconds[engine] = time.perf_counter() - start
+
+    reference = vectors['adaptive']
+    reference_length = path_length(reference, order_features(reference, strategy=strategy))
+
+    results = []
+    for engine in engines:
+        order = order_features(vectors[engine], strategy=strategy)
+        results.append(dict({
+            'engine': engine,
+            'ms_per_cover': round(1000 * seconds[engine] / num_covers, 3),
+            'speedup': round(seconds['adaptive'] / seconds[engine], 2),
+            'path_ratio': round(float(path_length(reference, order) / reference_length), 3)
+        }, **color_agreement(reference, vectors[engine], top_colors=top_colors)))
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'num_covers': num_covers,
+            'palette_size': palette_size,
+            'top_colors': top_colors,
+            'strategy': strategy
+        },
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the dominant color engines against the adaptive engine.')
+    parser.add_argument('--num-covers', type=int, default=500, help='number of synthetic covers')
+    parser.add_argument('--engines', nargs='+', help='engines to compare (default: all of them)')
+    parser.add_argument('--strategy', default='path', help='ordering strategy used for the path ratio')
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    args = parser.parse_args()
+
+    report = run_color_engines(num_covers=args.num_covers, engines=args.engines, strategy=args.strategy)
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+'''
+Module: benchmarks
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file measures the cold start of the app: how long importing the app package and running create_app() takes
+in a fresh Python process, and which heavy modules (NumPy, Pillow, OpenCV) it loads, since every web worker and
+test process pays for them. Run it from the repository root:
+
+    python -m benchmarks.import_time --repeats 10 --output import_time.json
+
+Every repeat runs in a new interpreter (with 'python -X importtime'), so nothing is already imported or cached
+in memory. The results report:
+- create_app_ms: median wall time of 'from app import create_app; create_app()'
+- first_sort_import_ms: median wall time of importing what the first sort loads on top of that
+- top_imports: the modules with the largest cumulative import time, from the last repeat
+- heavy_modules_loaded: which of HEAVY_MODULES were imported by create_app()
+
+Functions:
+- parse_importtime(stderr): returns a dict of module name -> cumulative import time in microseconds from the
+output of 'python -X importtime'
+
+- measure_once(): runs create_app() in a fresh interpreter, and returns its timings and loaded heavy modules
+
+- run_import_time(repeats, top): returns the JSON-serializable results
+
+- main(): parses the command line arguments, runs the measurement, and prints or writes the results
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+from benchmarks.run_benchmarks import git_commit
+
+HEAVY_MODULES = ('numpy', 'PIL.Image', 'cv2')
+
+# Runs in the fresh interpreter. The first sort's imports are triggered by touching the lazily imported modules
+MEASURE_SCRIPT = '''
+import sys, time, json
+start = time.perf_counter()
+from app import create_app
+create_app()
+create_app_seconds = time.perf_counter() - start
+loaded = [name for name in {heavy_modules!r} if name in sys.modules]
+
+start = time.perf_counter()
+from app.utils import image_processing
+image_processing.np.zeros
+image_processing.Image.open
+image_processing.rgb_to_lab_batch([(0, 0, 0)])
+first_sort_seconds = time.perf_counter() - start
+
+print(json.dumps({{'create_app': create_app_seconds, 'first_sort': first_sort_seconds, 'loaded': loaded}}))
+'''
+
+def parse_importtime(stderr):
+    # Lines look like 'import time:   self [us] |  cumulative | imported package', nested imports indented
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports[name.strip()] = int(cumulative)
+
+    return imports
+
+
+def measure_once():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = MEASURE_SCRIPT.format(heavy_modules=HEAVY_MODULES)
+
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=root, capture_output=True, text=True, check=True
+    )
+
+    # The app may print while starting, so the measurement is the last line of its output
+    measurement = json.loads(completed.stdout.strip().splitlines()[-1])
+    measurement['imports'] = parse_importtime(completed.stderr)
+    return measurement
+
+
+def run_import_time(repeats=5, top=15):
+    measurements = [measure_once() for _ in range(repeats)]
+    imports = measurements[-1]['imports']
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'repeats': repeats
+        },
+        'create_app_ms': round(1000 * statistics.median(m['create_app'] for m in measurements), 1),
+        'first_sort_import_ms': round(1000 * statistics.median(m['first_sort'] for m in measurements), 1),
+        'heavy_modules_loaded': measurements[-1]['loaded'],
+        'top_imports': [
+            {'module': name, 'cumulative_ms': round(microseconds / 1000, 1)}
+            for name, microseconds in sorted(imports.items(), key=lambda item: -item[1])[:top]
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the import time and heavy imports of create_app().')
+    parser.add_argument('--repeats', type=int, default=5, help='number of fresh interpreters to measure')
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports to report')
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    args = parser.parse_args()
+
+    report = run_import_time(repeats=args.repeats, top=args.top)
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
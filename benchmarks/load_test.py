@@ -0,0 +1,288 @@
+'''
+Module: benchmarks
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file load tests the app with many users sorting at once, to find how many simultaneous sorters one instance
+can handle before latency falls apart, and how much memory it needs to do so. Run it from the repository root:
+
+    python -m benchmarks.load_test --users 1 4 16 --tracks 200 --latency 0.05 --throttle-rate 0.02
+
+For every number of users, the app is created with create_app() (cold caches, talking to the local Spotify stand-in
+in mock_spotify.py, which adds 'latency' seconds to every API response and throttles a share of them with 429) and
+served over HTTP by a threaded server. Every user logs in ('/callback' with their own authorization code), loads
+'/sorter', and sorts a playlist of their own with '/sort_playlist', polling '/sort_status' until it is done.
+Every user starts at the same time.
+
+The results report, for every number of users:
+- routes: the count, requests per second, and p50/p95/p99 latency in milliseconds of each route, plus 'sort' for
+the whole sort as a user sees it, from clicking sort until '/sort_status' reports it done
+- sorts_per_second: sorts finished per second of the whole run
+- peak_rss_mb and baseline_rss_mb: the largest resident memory of the process during the run, and before it.
+The stand-in runs in the same process, so its covers are generated before the baseline is measured
+- throttled: API requests the stand-in answered with 429
+
+Functions:
+- current_rss_mb(): returns the resident memory of this process in MB, or None if it cannot be read here
+
+- percentiles(values): returns the p50, p95, and p99 of a list of seconds, in milliseconds
+
+- simulate_user(base_url, user_id, playlist_id, strategy, timings, sort_timeout, poll_interval): runs the
+login -> '/sorter' -> '/sort_playlist' flow of one user, appending (route, seconds) to 'timings'.
+Returns whether the user's sort succeeded
+
+- run_level(num_users, num_tracks, ...): runs one load test with 'num_users' users against a new app and stand-in,
+and returns its results
+
+- run_load_test(user_counts, num_tracks, ...): returns the JSON-serializable results of every load test
+
+- main(): parses the command line arguments, runs the load tests, and prints or writes the results
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import threading
+import contextlib
+
+import requests
+import numpy as np
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from benchmarks.mock_spotify import MockSpotify
+from benchmarks.run_benchmarks import create_benchmark_app, git_commit
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_USER_COUNTS = (1, 4, 16)
+
+# How often memory is sampled during a run, and how often users poll a running sort, in seconds
+RSS_SAMPLE_INTERVAL = 0.05
+POLL_INTERVAL = 0.1
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    # Thousands of status polls would otherwise each log a line
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def current_rss_mb():
+    # /proc gives the current resident memory on Linux, elsewhere only the peak so far is known
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+    return None
+
+
+def percentiles(values):
+    if not values:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return {'p50_ms': round(float(p50), 1), 'p95_ms': round(float(p95), 1), 'p99_ms': round(float(p99), 1)}
+
+
+def simulate_user(base_url, user_id, playlist_id, strategy, timings, sort_timeout=300, poll_interval=POLL_INTERVAL):
+    # Each user has their own cookies, like a separate browser
+    http = requests.Session()
+
+    def timed(route, path, **kwargs):
+        start = time.perf_counter()
+        response = http.get(base_url + path, **kwargs)
+        timings.append((route, time.perf_counter() - start))
+        return response
+
+    # Spotify would redirect the browser here with an authorization code, which the stand-in maps to the user
+    response = timed('/callback', f'/callback?code={user_id}', allow_redirects=False)
+    if response.status_code != 302:
+        return False
+
+    if timed('/sorter', '/sorter').status_code != 200:
+        return False
+
+    start_sort = time.perf_counter()
+    params = {'strategy': strategy} if strategy else None
+    response = timed('/sort_playlist', f'/sort_playlist/{playlist_id}', params=params)
+    if response.status_code != 202:
+        return False
+
+    job_id = response.json()['job_id']
+    while time.perf_counter() - start_sort < sort_timeout:
+        job = timed('/sort_status', f'/sort_status/{job_id}').json()
+        if job['status'] in ('succeeded', 'failed'):
+            timings.append(('sort', time.perf_counter() - start_sort))
+            return job['status'] == 'succeeded'
+
+        time.sleep(poll_interval)
+
+    return False
+
+
+def run_level(num_users, num_tracks, tracks_per_cover=1.5, latency=0.0, image_latency=0.0, throttle_rate=0.0,
+              retry_after=1, strategy=None, sort_timeout=300, app_settings=None):
+    with MockSpotify(latency=latency, image_latency=image_latency, throttle_rate=throttle_rate,
+                     retry_after=retry_after) as mock, \
+            tempfile.TemporaryDirectory(prefix='spotify_color_sorter_load_test_') as data_dir:
+        for i in range(num_users):
+            mock.add_playlist(f'load{i}', num_tracks, tracks_per_cover=tracks_per_cover, seed=i, owner=f'user{i}')
+        mock.prepare_covers()
+
+        app = create_benchmark_app(mock, data_dir, **(app_settings or {}))
+        app.config['SECRET_KEY'] = 'load_test_secret_key'
+
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietRequestHandler)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+        # Memory is sampled on its own thread for the whole run, so short peaks between requests are seen too
+        baseline_rss = current_rss_mb()
+        peak_rss = [baseline_rss]
+        done = threading.Event()
+
+        def sample_rss():
+            while not done.wait(RSS_SAMPLE_INTERVAL):
+                rss = current_rss_mb()
+                if rss is not None:
+                    peak_rss[0] = max(peak_rss[0] or 0, rss)
+
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+
+        timings = []
+        succeeded = []
+        start_line = threading.Barrier(num_users)
+
+        def user(i):
+            start_line.wait()
+            try:
+                ok = simulate_user(base_url, f'user{i}', f'load{i}', strategy, timings, sort_timeout=sort_timeout)
+            except requests.RequestException as e:
+                print(f'User {i} failed: {e}', file=sys.stderr)
+                ok = False
+            succeeded.append(ok)
+
+        start = time.perf_counter()
+        users = [threading.Thread(target=user, args=(i,)) for i in range(num_users)]
+        for thread in users:
+            thread.start()
+        for thread in users:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        done.set()
+        sampler.join()
+        server.shutdown()
+        server_thread.join()
+
+        throttled = sum(count for (_, endpoint), count in mock.request_counts.items() if endpoint == 'throttled')
+
+    routes = {}
+    for route in ['/callback', '/sorter', '/sort_playlist', '/sort_status', 'sort']:
+        values = [value for name, value in timings if name == route]
+        routes[route] = dict(
+            {'count': len(values), 'requests_per_second': round(len(values) / seconds, 2)}, **percentiles(values)
+        )
+
+    num_succeeded = sum(succeeded)
+    print(f'{num_users:>4} users  {num_succeeded} sorts in {seconds:.2f}s  '
+          f'sort p95 {routes["sort"]["p95_ms"]} ms  peak RSS {peak_rss[0] or 0:.0f} MB', file=sys.stderr)
+
+    return {
+        'num_users': num_users,
+        'seconds': round(seconds, 3),
+        'succeeded': num_succeeded,
+        'failed': num_users - num_succeeded,
+        'sorts_per_second': round(num_succeeded / seconds, 3),
+        'routes': routes,
+        'baseline_rss_mb': round(baseline_rss, 1) if baseline_rss is not None else None,
+        'peak_rss_mb': round(peak_rss[0], 1) if peak_rss[0] is not None else None,
+        'throttled': throttled
+    }
+
+
+def run_load_test(user_counts=DEFAULT_USER_COUNTS, num_tracks=200, tracks_per_cover=1.5, latency=0.0,
+                  image_latency=0.0, throttle_rate=0.0, retry_after=1, strategy=None, sort_timeout=300,
+                  app_settings=None):
+    # The app logs with print(), which would otherwise end up mixed into the JSON results on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        results = [
+            run_level(
+                num_users, num_tracks, tracks_per_cover=tracks_per_cover, latency=latency,
+                image_latency=image_latency, throttle_rate=throttle_rate, retry_after=retry_after,
+                strategy=strategy, sort_timeout=sort_timeout, app_settings=app_settings
+            )
+            for num_users in user_counts
+        ]
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'num_tracks': num_tracks,
+            'tracks_per_cover': tracks_per_cover,
+            'latency': latency,
+            'image_latency': image_latency,
+            'throttle_rate': throttle_rate,
+            'retry_after': retry_after,
+            'strategy': strategy,
+            'app_settings': app_settings or {}
+        },
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the app with many users sorting at once.')
+    parser.add_argument('--users', type=int, nargs='+', default=list(DEFAULT_USER_COUNTS),
+                        help='numbers of concurrent users to test, one run each')
+    parser.add_argument('--tracks', type=int, default=200, help='number of tracks in each user\'s playlist')
+    parser.add_argument('--tracks-per-cover', type=float, default=1.5, help='average number of tracks sharing an album cover')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every Spotify API response')
+    parser.add_argument('--image-latency', type=float, default=0.02, help='seconds added to every album cover download')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of API requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1, help='Retry-After seconds sent with every 429')
+    parser.add_argument('--strategy', help='ordering strategy of the sorts (default: SORT_STRATEGY)')
+    parser.add_argument('--sort-timeout', type=float, default=300, help='seconds after which a user gives up on a sort')
+    parser.add_argument('--app-setting', action='append', default=[], metavar='NAME=VALUE',
+                        help='setting passed to create_app(), e.g. SORT_JOB_WORKERS=4 (repeatable)')
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    args = parser.parse_args()
+
+    app_settings = dict(setting.split('=', 1) for setting in args.app_setting)
+    report = run_load_test(
+        user_counts=args.users, num_tracks=args.tracks, tracks_per_cover=args.tracks_per_cover,
+        latency=args.latency, image_latency=args.image_latency, throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after, strategy=args.strategy, sort_timeout=args.sort_timeout,
+        app_settings=app_settings
+    )
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+'''
+Module: benchmarks
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file provides a local stand-in for the parts of the Spotify Web API and album cover CDN that the app uses.
+It serves synthetic playlists with paginated track listings, applies reorder/replace/add requests to them the way
+Spotify does (with a new snapshot ID after every change), and serves generated JPEG album covers. For load tests,
+every response can be delayed, and a share of API requests can be throttled with 429 Too Many Requests.
+
+Every playlist belongs to a user. The token endpoint hands out the access token 'mock_token_<code>' for the
+authorization code '<code>', and requests with that token are answered for the user '<code>'. Requests with any
+other token are answered for the single benchmark user USER_ID.
+
+Endpoints (under /v1 unless noted):
+- GET /me, GET /me/playlists: the profile of a single benchmark user, and every playlist as owned by them
+- GET /playlists/<playlist_id>: the playlist's snapshot ID
+- GET /playlists/<playlist_id>/tracks: a page of the playlist's tracks, by 'limit' and 'offset'
+- PUT /playlists/<playlist_id>/tracks: replaces the tracks with 'uris', or moves a range of tracks like Spotify's
+reorder endpoint with 'range_start', 'insert_before', and 'range_length'
+- POST /playlists/<playlist_id>/tracks: adds 'uris' to the end of the playlist
+- GET /images/<cover>-<size>.jpg (not under /v1): a generated 'size' x 'size' JPEG album cover
+- POST /api/token (not under /v1): the tokens for an authorization 'code' (or a 'refresh_token'), like Spotify's
+token endpoint
+
+Functions:
+- make_cover(cover, size): returns the bytes of a synthetic album cover JPEG, the same for the same 'cover' number
+
+Classes:
+- MockSpotify(host, port, latency, image_latency, throttle_rate, retry_after, seed): the stand-in server, running on
+a background thread once started. API responses are delayed by 'latency' seconds and covers by 'image_latency'
+seconds, and a random 'throttle_rate' share of API requests is answered with 429 and a Retry-After of
+'retry_after' seconds
+    - start() / stop(): starts and stops serving, also usable as a context manager
+    - api_url / token_url / image_url(cover, size): the base URL of the API, the URL of the token endpoint, and the
+    URL of a cover image
+    - add_playlist(playlist_id, num_tracks, tracks_per_cover, seed, first_cover, owner): creates a playlist of
+    'num_tracks' tracks in random order owned by the user 'owner', where each album cover is shared by
+    'tracks_per_cover' tracks on average. Covers are numbered from 'first_cover', by default after every cover
+    already in use, so that playlists can share covers
+    - reset_playlist(playlist_id): puts the playlist back in its original order, e.g. between benchmark runs
+    - playlist_track_ids(playlist_id): returns the current order of the playlist's track IDs
+    - prepare_covers(size): generates every cover in advance, so that generating them is not timed as downloading
+    - request_counts: number of requests served per (method, endpoint), e.g. ('PUT', 'playlist_tracks'). Requests
+    answered with 429 are counted under (method, 'throttled') instead
+'''
+
+import re
+import json
+import time
+import random
+import threading
+
+from io import BytesIO
+from collections import Counter
+from urllib.parse import urlparse, parse_qs, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PIL import Image, ImageDraw
+
+# Sizes Spotify usually returns for an album cover, largest first
+COVER_SIZES = (640, 300, 64)
+
+USER_ID = 'benchmark_user'
+
+def make_cover(cover, size=300):
+    # A few overlapping blocks of random colors, roughly like flat album art. Seeded by the cover number,
+    # so that every size of the same cover has the same colors
+    rng = random.Random(cover)
+    image = Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+
+    for _ in range(rng.randint(2, 6)):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = rng.randint(x0, size), rng.randint(y0, size)
+        draw.rectangle([x0, y0, x1, y1], fill=tuple(rng.randrange(256) for _ in range(3)))
+
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class _Playlist:
+    def __init__(self, playlist_id, tracks, owner=USER_ID):
+        self.id = playlist_id
+        self.owner = owner
+        self.original_tracks = list(tracks)
+        self.tracks = list(tracks)
+        self.version = 0
+
+    @property
+    def snapshot_id(self):
+        return f'{self.id}-{self.version}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so that the app's pooled connections are reused like they would be with Spotify
+    protocol_version = 'HTTP/1.1'
+
+    # Headers and body go out in separate writes, which Nagle's algorithm would otherwise hold back ~40ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status_code, body=b'', content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        if status_code == 429:
+            self.send_header('Retry-After', str(self.server.mock.retry_after))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        # The body is always read, even for requests that are throttled before looking at it, since leftover bytes
+        # would otherwise be taken for the start of the next request on the same keep-alive connection
+        length = int(self.headers.get('Content-Length') or 0)
+        request_body = self.rfile.read(length)
+
+        def read_json():
+            return json.loads(request_body or b'{}')
+
+        def read_form():
+            return dict(parse_qsl(request_body.decode()))
+
+        parsed = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        status_code, body, content_type = self.server.mock.handle(
+            method, parsed.path, query, read_json, headers=self.headers, read_form=read_form
+        )
+        self._send(status_code, body, content_type)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+
+class MockSpotify:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, image_latency=0.0, throttle_rate=0.0, retry_after=1,
+                 seed=0):
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self._thread = None
+
+        self.latency = latency
+        self.image_latency = image_latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+
+        self._playlists = {}
+        self._cover_of_track = {}
+        self._covers = {}
+        self._lock = threading.Lock()
+
+        self.request_counts = Counter()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self):
+        return f'{self.base_url}/v1'
+
+    @property
+    def token_url(self):
+        return f'{self.base_url}/api/token'
+
+    def image_url(self, cover, size=300):
+        return f'{self.base_url}/images/{cover}-{size}.jpg'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # ---- PLAYLISTS -----------------------------------------------------
+    def add_playlist(self, playlist_id, num_tracks, tracks_per_cover=1.5, seed=0, first_cover=None, owner=USER_ID):
+        rng = random.Random(seed)
+        num_covers = max(1, round(num_tracks / tracks_per_cover))
+        if first_cover is None:
+            first_cover = len(self._covers_in_use())
+
+        track_ids = [f'{playlist_id}t{i}' for i in range(num_tracks)]
+        with self._lock:
+            for i, track_id in enumerate(track_ids):
+                # Every cover is used at least once, and the rest of the tracks share random covers
+                cover = i if i < num_covers else rng.randrange(num_covers)
+                self._cover_of_track[track_id] = first_cover + cover
+
+            rng.shuffle(track_ids)
+            self._playlists[playlist_id] = _Playlist(playlist_id, track_ids, owner=owner)
+
+        return track_ids
+
+    def reset_playlist(self, playlist_id):
+        with self._lock:
+            playlist = self._playlists[playlist_id]
+            playlist.tracks = list(playlist.original_tracks)
+            playlist.version += 1
+
+    def playlist_track_ids(self, playlist_id):
+        with self._lock:
+            return list(self._playlists[playlist_id].tracks)
+
+    def _covers_in_use(self):
+        return set(self._cover_of_track.values())
+
+    # ---- COVERS --------------------------------------------------------
+    def prepare_covers(self, size=300):
+        for cover in self._covers_in_use():
+            self._cover(cover, size)
+
+    def _cover(self, cover, size):
+        key = (cover, size)
+        if key not in self._covers:
+            self._covers[key] = make_cover(cover, size)
+
+        return self._covers[key]
+
+    # ---- REQUESTS ------------------------------------------------------
+    def _user_of(self, headers):
+        authorization = (headers or {}).get('Authorization', '')
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else ''
+        return token[len('mock_token_'):] if token.startswith('mock_token_') else USER_ID
+
+    def _throttled(self):
+        if not self.throttle_rate:
+            return False
+
+        with self._lock:
+            return self._rng.random() < self.throttle_rate
+
+    def handle(self, method, path, query, read_json, headers=None, read_form=None):
+        '''Return the (status code, body, content type) of the response to a request.'''
+        match = re.fullmatch(r'/images/(\d+)-(\d+)\.jpg', path)
+        if match and method == 'GET':
+            if self.image_latency:
+                time.sleep(self.image_latency)
+
+            self.request_counts[(method, 'image')] += 1
+            return 200, self._cover(int(match.group(1)), int(match.group(2))), 'image/jpeg'
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        # Only the Web API is throttled, like Spotify's, and the request is not handled
+        if self._throttled():
+            self.request_counts[(method, 'throttled')] += 1
+            return (*self._error(429, 'API rate limit exceeded'), 'application/json')
+
+        if path == '/api/token' and method == 'POST':
+            self.request_counts[(method, 'token')] += 1
+            return (*self._post_token(read_form() if read_form else {}), 'application/json')
+
+        routes = [
+            (r'/v1/me', 'me'),
+            (r'/v1/me/playlists', 'playlists'),
+            (r'/v1/playlists/([^/]+)', 'playlist'),
+            (r'/v1/playlists/([^/]+)/tracks', 'playlist_tracks'),
+        ]
+
+        for pattern, endpoint in routes:
+            match = re.fullmatch(pattern, path)
+            if match:
+                self.request_counts[(method, endpoint)] += 1
+                handler = getattr(self, f'_{method.lower()}_{endpoint}', None)
+                if handler is None:
+                    break
+
+                status_code, body = handler(*match.groups(), query=query, read_json=read_json, user=self._user_of(headers))
+                return status_code, body, 'application/json'
+
+        return 404, {'error': {'status': 404, 'message': 'Not found'}}, 'application/json'
+
+    def _error(self, status_code, message):
+        return status_code, {'error': {'status': status_code, 'message': message}}
+
+    def _page(self, items, query, default_limit):
+        limit = int(query.get('limit', default_limit))
+        offset = int(query.get('offset', 0))
+        return {'items': items[offset:offset + limit], 'total': len(items), 'limit': limit, 'offset': offset}
+
+    def _post_token(self, form):
+        # Renewed tokens keep the user of the refresh token, which is 'mock_refresh_<code>'
+        code = form.get('code') or form.get('refresh_token', '')[len('mock_refresh_'):]
+        if not code:
+            return self._error(400, 'invalid_grant')
+
+        return 200, {
+            'access_token': f'mock_token_{code}',
+            'refresh_token': f'mock_refresh_{code}',
+            'token_type': 'Bearer',
+            'expires_in': 3600
+        }
+
+    def _get_me(self, query, read_json, user=USER_ID):
+        return 200, {'id': user, 'display_name': 'Benchmark User' if user == USER_ID else user}
+
+    def _get_playlists(self, query, read_json, user=USER_ID):
+        with self._lock:
+            items = [{
+                'id': playlist.id,
+                'name': playlist.id,
+                'owner': {'id': playlist.owner},
+                'images': [],
+                'tracks': {'total': len(playlist.tracks)},
+                'snapshot_id': playlist.snapshot_id
+            } for playlist in self._playlists.values() if playlist.owner == user]
+
+        return 200, self._page(items, query, default_limit=20)
+
+    def _get_playlist(self, playlist_id, query, read_json, user=USER_ID):
+        with self._lock:
+            playlist = self._playlists.get(playlist_id)
+            if playlist is None:
+                return self._error(404, 'Playlist not found')
+
+            return 200, {'id': playlist.id, 'snapshot_id': playlist.snapshot_id}
+
+    def _get_playlist_tracks(self, playlist_id, query, read_json, user=USER_ID):
+        with self._lock:
+            playlist = self._playlists.get(playlist_id)
+            if playlist is None:
+                return self._error(404, 'Playlist not found')
+
+            page = self._page(playlist.tracks, query, default_limit=100)
+
+        page['items'] = [{
+            'track': {
+                'id': track_id,
+                'album': {'images': [
+                    {'url': self.image_url(self._cover_of_track[track_id], size), 'width': size, 'height': size}
+                    for size in COVER_SIZES
+                ]}
+            }
+        } for track_id in page['items']]
+
+        return 200, page
+
+    def _put_playlist_tracks(self, playlist_id, query, read_json, user=USER_ID):
+        data = read_json()
+
+        with self._lock:
+            playlist = self._playlists.get(playlist_id)
+            if playlist is None:
+                return self._error(404, 'Playlist not found')
+
+            if 'uris' in data:
+                playlist.tracks = [uri.rsplit(':', 1)[-1] for uri in data['uris']]
+            else:
+                range_start = data['range_start']
+                insert_before = data['insert_before']
+                range_length = data.get('range_length', 1)
+
+                if data.get('snapshot_id') not in (None, playlist.snapshot_id):
+                    return self._error(400, 'Snapshot ID does not match the playlist')
+
+                block = playlist.tracks[range_start:range_start + range_length]
+                del playlist.tracks[range_start:range_start + range_length]
+                if insert_before > range_start:
+                    insert_before -= range_length
+                playlist.tracks[insert_before:insert_before] = block
+
+            playlist.version += 1
+            return 200, {'snapshot_id': playlist.snapshot_id}
+
+    def _post_playlist_tracks(self, playlist_id, query, read_json, user=USER_ID):
+        data = read_json()
+
+        with self._lock:
+            playlist = self._playlists.get(playlist_id)
+            if playlist is None:
+                return self._error(404, 'Playlist not found')
+
+            playlist.tracks += [uri.rsplit(':', 1)[-1] for uri in data.get('uris', [])]
+            playlist.version += 1
+            return 201, {'snapshot_id': playlist.snapshot_id}
@@ -0,0 +1,229 @@
+'''
+Module: benchmarks
+Author: Elliot H. Ha
+Created on: Oct 17, 2026
+
+Description:
+This file times each stage of sorting a playlist against the local Spotify stand-in in mock_spotify.py,
+for playlists of 100, 1k, and 10k tracks by default, and writes the timings as JSON so they can be compared
+between commits to catch regressions. Run it from the repository root:
+
+    python -m benchmarks.run_benchmarks --sizes 100 1000 10000 --output benchmark_results.json
+
+Stages, each timed on its own for a cold start (empty feature cache, nothing from an earlier run reused):
+- listing: fetching every page of the playlist's tracks
+- download: downloading every distinct album cover
+- quantize: decoding each cover and extracting its dominant colors with the COLOR_ENGINE engine
+- lab: converting the dominant colors of every cover to LAB
+- ordering: ordering the tracks' feature matrix, once per ordering strategy, along with the smoothness of the
+order (total LAB distance between adjacent tracks, lower is smoother)
+- write_back: writing the sorted order back to the shuffled playlist (reordering, or replacing if that takes too many moves)
+- end_to_end: a whole sorting job as started by the '/sort_playlist' route, including all of the above
+
+Functions:
+- time_stage(results, num_tracks, stage, func, **extra): runs func(), appending its timing to results, and returns its result
+
+- benchmark_playlist(app, mock, num_tracks, strategies, results): times every stage for one playlist size
+
+- create_benchmark_app(mock, data_dir, **overrides): returns the app configured to talk to the local stand-in, with its
+feature cache and sort states in 'data_dir'. Without a 'data_dir', a temporary directory is created for them and
+removed when the process exits. Keyword arguments override further settings of create_app(), e.g. SORT_JOB_WORKERS='4'
+
+- run_benchmarks(sizes, strategies, tracks_per_cover): returns the JSON-serializable results of every benchmark
+
+- main(): parses the command line arguments, runs the benchmarks, and prints or writes the results
+'''
+
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+from benchmarks.mock_spotify import MockSpotify
+
+DEFAULT_SIZES = (100, 1000, 10000)
+ACCESS_TOKEN = 'benchmark_access_token'
+
+def time_stage(results, num_tracks, stage, func, **extra):
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+
+    results.append(dict({'num_tracks': num_tracks, 'stage': stage, 'seconds': round(seconds, 6)}, **extra))
+    print(f'{num_tracks:>6} tracks  {stage:<20} {seconds:9.3f}s', file=sys.stderr)
+    return value
+
+
+def benchmark_playlist(app, mock, num_tracks, strategies, results, tracks_per_cover=1.5):
+    from app.api.spotify import get_playlist_tracks, build_track_info
+    from app.routes.sorting import (
+        group_tracks_by_image, reorder_playlist, write_back_playlist, max_reorder_moves, run_sort_job
+    )
+    from app.utils.image_processing import download_images, rgb_to_lab_batch, DOMINANT_COLOR_ENGINES
+    from app.utils.ordering import order_features, path_length
+    from app.utils.jobs import Job
+
+    playlist_id = f'benchmark{num_tracks}'
+    mock.add_playlist(playlist_id, num_tracks, tracks_per_cover=tracks_per_cover)
+    mock.prepare_covers(size=app.config['IMAGE_MIN_SIZE'])
+
+    palette_size = app.config['PALETTE_SIZE']
+    top_colors = app.config['TOP_COLORS']
+    get_dominant_colors = DOMINANT_COLOR_ENGINES[app.config['COLOR_ENGINE']]
+
+    with app.app_context():
+        playlist_tracks = time_stage(results, num_tracks, 'listing', lambda: get_playlist_tracks(
+            ACCESS_TOKEN, playlist_id, min_image_size=app.config['IMAGE_MIN_SIZE']
+        ))
+        current_track_ids = [track_id for track_id, _ in playlist_tracks]
+        track_info = build_track_info(playlist_tracks)
+        image_urls = [image_url for image_url in group_tracks_by_image(track_info) if image_url]
+
+        images = time_stage(results, num_tracks, 'download', lambda: download_images(
+            image_urls, max_workers=app.config['DOWNLOAD_WORKERS']
+        ), num_covers=len(image_urls))
+
+        # Covers are decoded lazily, so decoding is part of this stage rather than the download
+        dominant_colors = time_stage(results, num_tracks, 'quantize', lambda: [
+            get_dominant_colors(img, palette_size=palette_size, top_colors=top_colors) for img in images
+        ], num_covers=len(image_urls), engine=app.config['COLOR_ENGINE'])
+
+        # Padded the way get_color_vector() does, then converted in one call for every cover
+        padded_colors = [colors + [colors[-1]] * (top_colors - len(colors)) for colors in dominant_colors]
+        lab_colors = time_stage(results, num_tracks, 'lab', lambda: rgb_to_lab_batch(
+            np.array(padded_colors).reshape(-1, 3)
+        ), num_covers=len(image_urls))
+
+        features_by_image = dict(zip(image_urls, lab_colors.astype(np.float32).reshape(len(image_urls), -1)))
+        feature_matrix = np.stack([features_by_image[image_url] for image_url in track_info.values()])
+        track_ids = list(track_info)
+
+        sorted_indices = None
+        for strategy in strategies:
+            sorted_indices = time_stage(results, num_tracks, 'ordering', lambda: order_features(
+                feature_matrix, strategy=strategy, time_budget=app.config['SORT_TIME_BUDGET']
+            ), strategy=strategy)
+            results[-1]['smoothness'] = round(path_length(feature_matrix, sorted_indices), 1)
+
+        sorted_track_ids = [track_ids[i] for i in sorted_indices]
+
+        def write_back():
+            mock.request_counts.clear()
+            result = reorder_playlist(
+                ACCESS_TOKEN, playlist_id, current_track_ids, sorted_track_ids,
+                max_moves=max_reorder_moves(len(sorted_track_ids))
+            )
+            if result is not None:
+                return 'reorder'
+
+            write_back_playlist(ACCESS_TOKEN, playlist_id, sorted_track_ids)
+            return 'replace'
+
+        mode = time_stage(results, num_tracks, 'write_back', write_back)
+        results[-1].update({'mode': mode, 'num_requests': sum(mock.request_counts.values())})
+
+        mock.reset_playlist(playlist_id)
+        job = Job(f'benchmark{num_tracks}', playlist_id)
+        result = time_stage(results, num_tracks, 'end_to_end', lambda: run_sort_job(
+            job, ACCESS_TOKEN, playlist_id, strategy=strategies[-1]
+        ), strategy=strategies[-1])
+        results[-1]['status'] = result['status']
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_benchmark_app(mock, data_dir=None, **overrides):
+    from app import create_app
+
+    if data_dir is None:
+        data_dir = tempfile.mkdtemp(prefix='spotify_color_sorter_benchmark_')
+        atexit.register(shutil.rmtree, data_dir, ignore_errors=True)
+
+    # Nothing from a real instance is reused, and the local server is never throttled by the client.
+    # The app reads its settings from the environment, which is restored once the app has been created
+    settings = {
+        'SPOTIFY_API_URL': mock.api_url,
+        'SPOTIFY_TOKEN_URL': mock.token_url,
+        'FEATURE_CACHE_PATH': os.path.join(data_dir, 'feature_cache.sqlite3'),
+        'SORT_STATE_DIR': os.path.join(data_dir, 'sort_state'),
+        'HTTP_RATE_LIMIT': '100000',
+        'HTTP_IMAGE_RATE_LIMIT': '100000'
+    }
+    settings.update({name: str(value) for name, value in overrides.items()})
+
+    environ = dict(os.environ)
+    try:
+        os.environ.update(settings)
+        return create_app()
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, strategies=None, tracks_per_cover=1.5):
+    from app.utils.ordering import ORDERING_STRATEGIES
+
+    strategies = list(strategies or sorted(ORDERING_STRATEGIES))
+    results = []
+
+    # The app logs with print(), which would otherwise end up mixed into the JSON results on stdout
+    with MockSpotify() as mock, tempfile.TemporaryDirectory(prefix='spotify_color_sorter_benchmark_') as data_dir, \
+            contextlib.redirect_stdout(sys.stderr):
+        app = create_benchmark_app(mock, data_dir)
+
+        for num_tracks in sizes:
+            benchmark_playlist(app, mock, num_tracks, strategies, results, tracks_per_cover=tracks_per_cover)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'tracks_per_cover': tracks_per_cover,
+            'config': {key: app.config[key] for key in (
+                'DOWNLOAD_WORKERS', 'API_PAGE_WORKERS', 'PALETTE_SIZE', 'TOP_COLORS',
+                'SORT_TIME_BUDGET', 'WRITE_BACK_MODE', 'REORDER_MOVE_FACTOR', 'REORDER_MAX_MOVES'
+            )}
+        },
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time each stage of sorting against a local Spotify stand-in.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='playlist sizes to benchmark')
+    parser.add_argument('--strategies', nargs='+', help='ordering strategies to time (default: all of them)')
+    parser.add_argument('--tracks-per-cover', type=float, default=1.5, help='average number of tracks sharing an album cover')
+    parser.add_argument('--output', help='file to write the JSON results to (default: stdout)')
+    args = parser.parse_args()
+
+    report = run_benchmarks(sizes=args.sizes, strategies=args.strategies, tracks_per_cover=args.tracks_per_cover)
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()